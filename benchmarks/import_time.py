@@ -0,0 +1,98 @@
+"""Import-time benchmark of the package
+
+Each case is imported in a fresh interpreter. A case fails if it loads one of its forbidden (heavy) modules or if its
+median import time exceeds the budget. The script exits with a non zero status on failure so it can guard against
+import-time regressions in CI:
+
+    python benchmarks/import_time.py --repeat 5 --max-seconds 0.5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Root of the package (parent directory of this script) and package name
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = os.path.basename(PACKAGE_DIR)
+
+HEAVY_MODULES = ["netCDF4", "pandas", "geopandas", "shapely", "folium", "branca", "matplotlib", "plotly"]
+
+# Import statement and forbidden modules of each case
+CASES = [("import {pkg}.io", HEAVY_MODULES),
+         ("import {pkg}.maps", HEAVY_MODULES),
+         ("from {pkg}.io import SwordTopology", HEAVY_MODULES),
+         ("from {pkg}.io import SosNetCDF", ["geopandas", "shapely", "folium", "branca", "matplotlib", "plotly"]),
+         ("from {pkg}.io import OutputH2iVDI", ["pandas", "geopandas", "shapely", "folium", "branca", "matplotlib",
+                                                "plotly"]),
+         ("from {pkg}.io import SwotObservations", ["pandas", "geopandas", "shapely", "folium", "branca",
+                                                    "matplotlib", "plotly"]),
+         ("from {pkg}.plots.discharge import DischargePlot", HEAVY_MODULES)]
+
+_PROBE = """
+import sys, time, json
+sys.path.insert(0, %r)
+t0 = time.perf_counter()
+%s
+elapsed = time.perf_counter() - t0
+print(json.dumps({"elapsed": elapsed, "modules": sorted(set(name.split(".")[0] for name in sys.modules))}))
+"""
+
+
+def run_case(statement, repeat):
+    """Import a statement in fresh interpreters
+
+    Parameters
+    ----------
+    statement : str
+        Import statement
+    repeat : int
+        Number of runs
+
+    Return
+    ------
+    tuple
+        Median import time (seconds) and set of top level modules loaded
+    """
+
+    timings = []
+    modules = set()
+    for _ in range(0, repeat):
+        code = _PROBE % (os.path.dirname(PACKAGE_DIR), statement)
+        output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True,
+                                cwd=os.path.dirname(PACKAGE_DIR)).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result["elapsed"])
+        modules.update(result["modules"])
+
+    return statistics.median(timings), modules
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Import-time benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per case")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Budget for the median import time of a case")
+    args = parser.parse_args()
+
+    failures = 0
+    for statement, forbidden in CASES:
+        statement = statement.format(pkg=PACKAGE_NAME)
+        elapsed, modules = run_case(statement, args.repeat)
+        loaded = [module for module in forbidden if module in modules]
+        status = "ok"
+        if len(loaded) > 0:
+            status = "FAIL (loads %s)" % ", ".join(loaded)
+        elif args.max_seconds is not None and elapsed > args.max_seconds:
+            status = "FAIL (over budget of %.3fs)" % args.max_seconds
+        if status != "ok":
+            failures += 1
+        print("%-60s %8.3fs  %s" % (statement, elapsed, status))
+
+    return 1 if failures > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,53 @@
-from .sos import *
-from .sword import *
-from .swot import *
-from .h2ivdi import *
+import importlib
+
+
+# Public objects and the submodules that define them. Submodules are only imported when one of their objects is
+# accessed (PEP 562), so that importing the package does not load heavy dependencies (netCDF4, pandas, geopandas...)
+_objects_submodules = {"SosNetCDF": "sos",
+                       "SwordShapefile": "sword",
+                       "SwordNetCDF": "sword",
+                       "SwotObservations": "swot",
+                       "SwotObservationsCollection": "swot",
+                       "QualityFilter": "quality",
+                       "OutputH2iVDI": "h2ivdi",
+                       "OutputH2iVDICollection": "h2ivdi",
+                       "DISCHARGE_VARIABLES": "results_summary",
+                       "ResultsSummary": "results_summary",
+                       "ResultsNetCDF": "results_summary",
+                       "read_discharge": "results_summary",
+                       "ResultsComparison": "compare",
+                       "align": "alignment",
+                       "align_results": "alignment",
+                       "days_since_2000_to_datetime": "alignment",
+                       "time_grid": "alignment",
+                       "DtypePolicy": "dtypes",
+                       "memory_report": "dtypes",
+                       "SwordTopology": "topology",
+                       "FilterExpression": "filters",
+                       "RaggedArray": "ragged",
+                       "CONTINENT_CODES": "mosaic",
+                       "continent_digits": "mosaic",
+                       "SosMosaic": "mosaic",
+                       "SharedDataset": "shared",
+                       "DiskCache": "cache",
+                       "configure_cache": "cache",
+                       "get_cache": "cache",
+                       "load_sos_sword_table": "merged",
+                       "NetCDFHandlePool": "pool",
+                       "get_pool": "pool",
+                       "set_max_handles": "pool"}
+
+__all__ = list(_objects_submodules.keys())
+
+
+def __getattr__(name):
+    if name in _objects_submodules:
+        module = importlib.import_module(".%s" % _objects_submodules[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__))
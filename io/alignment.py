@@ -0,0 +1,259 @@
+import numpy as np
+
+from .ragged import RaggedArray
+
+
+# Reference epoch of the 'days_since_2000' time units
+EPOCH_2000 = np.datetime64("2000-01-01T00:00:00", "ns")
+
+
+def days_since_2000_to_datetime(days):
+    """Convert times in days since 2000-01-01 (possibly fractional) to datetimes
+
+    Parameters
+    ----------
+    days : float or iterable
+        Times in days since 2000-01-01. Masked values and NaN are converted to NaT
+
+    Return
+    ------
+    numpy.datetime64 or numpy.ndarray
+        Datetimes (ns resolution)
+    """
+    days = np.ma.filled(np.ma.asarray(days, dtype=np.float64), np.nan)
+    valid = np.isfinite(days)
+    nanoseconds = np.where(valid, np.round(np.where(valid, days, 0.0) * 86400e9), 0).astype(np.int64)
+    result = np.where(valid, EPOCH_2000 + nanoseconds.astype("timedelta64[ns]"), np.datetime64("NaT", "ns"))
+    if result.ndim == 0:
+        return result[()]
+    return result
+
+
+def time_grid(start, stop, step):
+    """Create a regular time grid
+
+    Parameters
+    ----------
+    start : float or numpy.datetime64
+        First time of the grid
+    stop : float or numpy.datetime64
+        Upper bound of the grid (included if it falls on the grid)
+    step : float or numpy.timedelta64
+        Step of the grid
+
+    Return
+    ------
+    numpy.ndarray
+        Times of the grid
+    """
+    if isinstance(start, np.datetime64) or isinstance(stop, np.datetime64):
+        start = np.datetime64(start, "ns")
+        stop = np.datetime64(stop, "ns")
+        step = np.timedelta64(step).astype("timedelta64[ns]")
+        return np.arange(start, stop + np.timedelta64(1, "ns"), step)
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return start + step * np.arange(count)
+
+
+def align(values, grid, times=None, method="nearest", tolerance=None, how="mean", ids=None):
+    """Map the series of many rows (reaches, gauges...) onto a common time grid in a single vectorized pass
+
+    Parameters
+    ----------
+    values : RaggedArray or numpy.ndarray
+        Series to align: a RaggedArray with times, or a dense array of shape (number of rows, number of times)
+    grid : iterable
+        Common time grid (numbers or datetimes, in the units of the times of the series)
+    times : numpy.ndarray or None
+        Times of dense values, shape (number of times,) or (number of rows, number of times). Ignored for a
+        RaggedArray
+    method : str
+        Matching method:
+          - 'nearest': value of the nearest sample
+          - 'linear': linear interpolation between the samples surrounding each time of the grid
+          - 'window': aggregation (see how) of the samples within tolerance of each time of the grid
+    tolerance : float, numpy.timedelta64 or None
+        For 'nearest', maximum distance to the nearest sample. For 'linear', maximum gap between the interpolated
+        samples. For 'window', half-width of the window (required). Default is None (no limit)
+    how : str
+        Aggregation of the samples for method 'window': 'mean', 'sum', 'count', 'min' or 'max'
+    ids : iterable or None
+        Identifiers of the rows of dense values (unused for a RaggedArray)
+
+    Return
+    ------
+    numpy.ndarray
+        Aligned values, shape (number of rows, size of the grid), NaN where no sample matches
+    """
+
+    if not isinstance(values, RaggedArray):
+        if times is None:
+            raise ValueError("'times' must be set for dense values")
+        values = RaggedArray.from_dense(values, times, ids)
+    if values.times is None:
+        raise ValueError("RaggedArray has no times")
+    if method not in ["nearest", "linear", "window"]:
+        raise ValueError("'method' must be 'nearest', 'linear' or 'window'")
+    if method == "window":
+        if tolerance is None:
+            raise ValueError("'tolerance' must be set for method 'window'")
+        if how not in ["mean", "sum", "count", "min", "max"]:
+            raise ValueError("Unknown aggregation: %s" % how)
+
+    # Numeric times (datetimes are converted to seconds since 2000-01-01)
+    data_times = _numeric_times(values.times)
+    grid_times = _numeric_times(np.asarray(grid))
+    if np.issubdtype(np.asarray(values.times).dtype, np.datetime64) != np.issubdtype(np.asarray(grid).dtype,
+                                                                                        np.datetime64):
+        raise ValueError("Times of the series and of the grid must be both numbers or both datetimes")
+    if tolerance is not None:
+        tolerance = _numeric_duration(tolerance)
+
+    # Samples sorted by row then time (samples with NaN times or values are discarded)
+    data_rows = values.row_indices()
+    data_values = np.asarray(values.values, dtype=np.float64)
+    keep = np.isfinite(data_times) & np.isfinite(data_values)
+    data_rows, data_times, data_values = data_rows[keep], data_times[keep], data_values[keep]
+    order = np.lexsort((data_times, data_rows))
+    data_rows, data_times, data_values = data_rows[order], data_times[order], data_values[order]
+    starts = np.searchsorted(data_rows, np.arange(values.n_rows), side="left")
+    stops = np.searchsorted(data_rows, np.arange(values.n_rows), side="right")
+
+    # Flattened (row, grid time) queries
+    query_rows = np.repeat(np.arange(values.n_rows), grid_times.size)
+    query_times = np.tile(grid_times, values.n_rows)
+    result = np.full(query_rows.size, np.nan)
+    if data_values.size == 0 or query_rows.size == 0:
+        if method == "window" and how == "count":
+            result[:] = 0.0
+        return result.reshape((values.n_rows, grid_times.size))
+
+    if method == "window":
+        first = _merged_positions(data_rows, data_times, query_rows, query_times - tolerance, side="left")
+        last = _merged_positions(data_rows, data_times, query_rows, query_times + tolerance, side="right")
+        count = last - first
+        matched = count > 0
+        if how == "count":
+            result = count.astype(np.float64)
+        elif how in ["mean", "sum"]:
+            cumsum = np.concatenate([[0.0], np.cumsum(data_values)])
+            total = cumsum[last] - cumsum[first]
+            result[matched] = total[matched] if how == "sum" else total[matched] / count[matched]
+        else:
+            # Windows overlap: gather the samples of each window contiguously, then reduce each window
+            function = np.fmin if how == "min" else np.fmax
+            counts = count[matched]
+            window_starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            gathered = np.repeat(first[matched] - window_starts, counts) + np.arange(counts.sum())
+            result[matched] = function.reduceat(data_values[gathered], window_starts)
+        return result.reshape((values.n_rows, grid_times.size))
+
+    # Previous (time <= query) and next (time >= query) samples of the same row
+    previous = _merged_positions(data_rows, data_times, query_rows, query_times, side="right") - 1
+    following = _merged_positions(data_rows, data_times, query_rows, query_times, side="left")
+    has_previous = previous >= starts[query_rows]
+    has_following = following < stops[query_rows]
+    previous = np.where(has_previous, previous, 0)
+    following = np.where(has_following, following, 0)
+
+    if method == "nearest":
+        distance_previous = np.where(has_previous, query_times - data_times[previous], np.inf)
+        distance_following = np.where(has_following, data_times[following] - query_times, np.inf)
+        use_previous = distance_previous <= distance_following
+        nearest = np.where(use_previous, previous, following)
+        distance = np.minimum(distance_previous, distance_following)
+        matched = np.isfinite(distance)
+        if tolerance is not None:
+            matched &= distance <= tolerance
+        result[matched] = data_values[nearest[matched]]
+    else:
+        matched = has_previous & has_following
+        gap = np.where(matched, data_times[following] - data_times[previous], np.inf)
+        if tolerance is not None:
+            matched &= gap <= tolerance
+        weight = np.zeros(query_rows.size)
+        interpolated = matched & (gap > 0)
+        weight[interpolated] = (query_times[interpolated] - data_times[previous[interpolated]]) / gap[interpolated]
+        result[matched] = ((1.0 - weight[matched]) * data_values[previous[matched]] +
+                           weight[matched] * data_values[following[matched]])
+
+    return result.reshape((values.n_rows, grid_times.size))
+
+
+def align_results(results_fname, grid, algorithms=None, reach_ids=None, method="nearest", tolerance=None,
+                  how="mean"):
+    """Align the discharge of several algorithms of a results file on a common time grid
+
+    Parameters
+    ----------
+    results_fname : str
+        Results file
+    grid : iterable
+        Common time grid (in the units of the times of the results file)
+    algorithms : list or None
+        Algorithms to align. Default is None (all the algorithms of DISCHARGE_VARIABLES found in the file)
+    reach_ids : iterable or None
+        Reaches to align. Default is None (all the reaches)
+    method : str
+        Matching method (see align)
+    tolerance : float or None
+        Tolerance (see align)
+    how : str
+        Aggregation for method 'window' (see align)
+
+    Return
+    ------
+    dict
+        Aligned discharge of each algorithm, shape (number of reaches, size of the grid)
+    """
+
+    from .pool import get_pool
+    from .results_summary import DISCHARGE_VARIABLES, read_discharge
+
+    if algorithms is None:
+        with get_pool().dataset(results_fname) as dataset:
+            algorithms = [algorithm for algorithm in DISCHARGE_VARIABLES if algorithm in dataset.groups]
+
+    aligned = {}
+    for algorithm in algorithms:
+        discharge = read_discharge(results_fname, algorithm, reach_ids=reach_ids)
+        aligned[algorithm] = align(discharge, grid, method=method, tolerance=tolerance, how=how)
+    return aligned
+
+
+def _numeric_times(times):
+    """Convert times to float64 (datetimes are converted to seconds since 2000-01-01, NaT to NaN)
+    """
+    times = np.ma.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        times = np.ma.filled(times, np.datetime64("NaT"))
+        nat = np.isnat(times)
+        seconds = (times.astype("datetime64[ns]") - EPOCH_2000).astype(np.int64) / 1e9
+        return np.where(nat, np.nan, seconds)
+    return np.ma.filled(times.astype(np.float64), np.nan)
+
+
+def _numeric_duration(duration):
+    """Convert a duration to float64 (timedeltas are converted to seconds)
+    """
+    if isinstance(duration, np.timedelta64):
+        return duration.astype("timedelta64[ns]").astype(np.int64) / 1e9
+    if hasattr(duration, "total_seconds"):
+        return duration.total_seconds()
+    return float(duration)
+
+
+def _merged_positions(data_rows, data_times, query_rows, query_times, side="left"):
+    """Insertion positions of (row, time) queries in samples sorted by row then time, i.e. a searchsorted within each
+    row computed for all the rows at once by sorting samples and queries together
+    """
+    # Queries are placed before samples with equal keys for side 'left', after them for side 'right'
+    kind = np.concatenate([np.full(data_rows.size, 1 if side == "left" else 0, dtype=np.int8),
+                           np.full(query_rows.size, 0 if side == "left" else 1, dtype=np.int8)])
+    order = np.lexsort((kind, np.concatenate([data_times, query_times]), np.concatenate([data_rows, query_rows])))
+    is_data = order < data_rows.size
+    samples_before = np.cumsum(is_data) - is_data
+    positions = np.empty(query_rows.size, dtype=np.int64)
+    positions[order[~is_data] - data_rows.size] = samples_before[~is_data]
+    return positions
+
@@ -0,0 +1,407 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+import numpy as np
+
+
+# Version of the cache format (part of all the keys, increase it to invalidate existing entries)
+_CACHE_VERSION = 1
+
+# Default size cap of the cache (bytes)
+_DEFAULT_MAX_SIZE = 1024**3
+
+
+class DiskCache:
+    """Object to handle an on-disk, content-addressed cache of expensive derived products (SWORD centerlines, merged
+    SoS/SWORD tables)
+
+    Keys are hashes of the identity of the input files (path, size and modification time), of the content of the
+    input datasets and of the parameters of the operation, so that entries are never used for inputs that have
+    changed. Entries are pickled in the cache directory. When the total size exceeds the size cap, the least recently
+    used entries are removed (the modification time of an entry is updated on each hit, so that eviction does not
+    depend on atime support of the file system).
+
+    Entries are loaded with pickle, so the cache directory must not be writable by other users: directories are
+    created private (mode 0o700) and entries that are not owned by the current user are ignored.
+    """
+
+    def __init__(self, directory=None, max_size=_DEFAULT_MAX_SIZE, enabled=True):
+        """Create a cache
+
+        Parameters
+        ----------
+        directory : str or None
+            Cache directory. Default is None (environment variable SWOTDAWGVIZ_CACHE_DIR if it is set,
+            ~/.cache/swotdawgviz otherwise)
+        max_size : int
+            Maximum total size of the entries (bytes)
+        enabled : bool
+            False to disable the cache (all products are computed)
+        """
+
+        if max_size < 0:
+            raise ValueError("'max_size' must be positive")
+        if directory is None:
+            directory = os.environ.get("SWOTDAWGVIZ_CACHE_DIR",
+                                       os.path.join(os.path.expanduser("~"), ".cache", "swotdawgviz"))
+
+        self._directory = directory
+        self._max_size = max_size
+        self._enabled = enabled
+        self._lock = threading.RLock()
+        self._size = None
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, value):
+        if value < 0:
+            raise ValueError("'max_size' must be positive")
+        with self._lock:
+            self._max_size = value
+            self.__evict__()
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = bool(value)
+
+    @property
+    def stats(self):
+        """Return statistics of the cache
+
+        Return
+        ------
+        dict
+            Hits, misses, writes and evictions since the creation of the object, number of entries and total size
+            (bytes) of the cache directory
+        """
+        with self._lock:
+            entries = self.__list_entries__()
+            self._size = sum(entry[2] for entry in entries)
+            return {"hits": self._hits,
+                    "misses": self._misses,
+                    "writes": self._writes,
+                    "evictions": self._evictions,
+                    "entries": len(entries),
+                    "size": self._size}
+
+    def key(self, operation, files=(), data=(), params=None):
+        """Compute the key of a product
+
+        Parameters
+        ----------
+        operation : str
+            Name of the operation
+        files : iterable
+            Input files (identified by path, size and modification time)
+        data : iterable
+            Input datasets or arrays (identified by a hash of their content, see data_fingerprint)
+        params : dict or None
+            Parameters of the operation (must have a deterministic repr)
+
+        Return
+        ------
+        str
+            Key (hexadecimal SHA-256 digest)
+        """
+
+        digest = hashlib.sha256()
+        digest.update(("%s:%i\0" % (operation, _CACHE_VERSION)).encode())
+        for fname in files:
+            digest.update(repr(file_identity(fname)).encode())
+            digest.update(b"\0")
+        for item in data:
+            digest.update(data_fingerprint(item).encode())
+            digest.update(b"\0")
+        if params is not None:
+            digest.update(json.dumps(params, sort_keys=True, default=repr).encode())
+        return digest.hexdigest()
+
+    def get(self, key, default=None):
+        """Retrieve an entry
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry
+        default : object
+            Value returned if the entry is not in the cache
+
+        Return
+        ------
+        object
+            Cached value (or default)
+        """
+
+        found, value = self.__load__(key)
+        return value if found else default
+
+    def set(self, key, value):
+        """Store an entry (the least recently used entries are evicted if the size cap is exceeded)
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry
+        value : object
+            Value (must be picklable)
+        """
+
+        if not self._enabled:
+            return
+        path = self.__entry_path__(key)
+        os.makedirs(self._directory, mode=0o700, exist_ok=True)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+
+        # Write in a temporary file then rename, so that concurrent readers never see partial entries
+        handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as tmp_file:
+                pickle.dump(value, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._writes += 1
+            if self._size is not None:
+                self._size += os.path.getsize(path)
+            self.__evict__()
+
+    def memoize(self, operation, compute, files=(), data=(), params=None):
+        """Retrieve a product from the cache, computing and storing it if it is not cached
+
+        Parameters
+        ----------
+        operation : str
+            Name of the operation
+        compute : callable
+            Function without arguments that computes the product
+        files : iterable
+            Input files
+        data : iterable
+            Input datasets or arrays
+        params : dict or None
+            Parameters of the operation
+
+        Return
+        ------
+        object
+            Product
+        """
+
+        if not self._enabled:
+            return compute()
+        key = self.key(operation, files, data, params)
+        found, value = self.__load__(key)
+        if found:
+            return value
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def clear(self):
+        """Remove all the entries
+        """
+        with self._lock:
+            for path, _, _ in self.__list_entries__():
+                _remove(path)
+            self._size = 0
+
+    def __entry_path__(self, key):
+        return os.path.join(self._directory, key[0:2], "%s.pkl" % key)
+
+    def __load__(self, key):
+        if not self._enabled:
+            return False, None
+        path = self.__entry_path__(key)
+        try:
+            with open(path, "rb") as entry_file:
+                if hasattr(os, "getuid") and os.fstat(entry_file.fileno()).st_uid != os.getuid():
+                    # Never unpickle entries written by other users
+                    raise FileNotFoundError(path)
+                value = pickle.load(entry_file)
+        except FileNotFoundError:
+            with self._lock:
+                self._misses += 1
+            return False, None
+        except Exception:
+            # Corrupted or incompatible entry: remove it and recompute
+            _remove(path)
+            with self._lock:
+                self._misses += 1
+            return False, None
+
+        # Mark entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._hits += 1
+        return True, value
+
+    def __list_entries__(self):
+        """List the entries of the cache directory as (path, last use time, size)
+        """
+        entries = []
+        if not os.path.isdir(self._directory):
+            return entries
+        for subdirectory in os.scandir(self._directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.name.endswith(".pkl"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def __evict__(self):
+        """Remove the least recently used entries until the total size is below the size cap
+        """
+        if self._size is not None and self._size <= self._max_size:
+            return
+        entries = self.__list_entries__()
+        self._size = sum(entry[2] for entry in entries)
+        if self._size <= self._max_size:
+            return
+        entries.sort(key=lambda entry: entry[1])
+        for path, _, size in entries:
+            if self._size <= self._max_size:
+                break
+            _remove(path)
+            self._size -= size
+            self._evictions += 1
+
+
+def file_identity(fname):
+    """Retrieve the identity of a file used in cache keys
+
+    Parameters
+    ----------
+    fname : str
+        File
+
+    Return
+    ------
+    tuple
+        Absolute path, size and modification time (ns) of the file
+    """
+    stat = os.stat(fname)
+    return (os.path.abspath(fname), stat.st_size, stat.st_mtime_ns)
+
+
+def data_fingerprint(data):
+    """Compute a hash of the content of a dataset or an array
+
+    Parameters
+    ----------
+    data : pandas.DataFrame, geopandas.GeoDataFrame, pandas.Series, geopandas.GeoSeries, numpy.ndarray or scalar
+        Data
+
+    Return
+    ------
+    str
+        Hexadecimal digest
+    """
+
+    digest = hashlib.sha256()
+    if hasattr(data, "geom_type") and hasattr(data, "crs") and not hasattr(data, "columns"):
+        # GeoSeries: geometries are hashed through their WKB representation
+        import shapely
+        digest.update(repr(data.crs).encode())
+        digest.update(data.index.to_numpy().tobytes() if data.index.dtype.kind in "biuf"
+                      else repr(list(data.index)).encode())
+        for wkb in shapely.to_wkb(np.asarray(data.values)):
+            digest.update(b"\0" if wkb is None else wkb)
+    elif hasattr(data, "columns"):
+        import pandas as pd
+        geometry_columns = [column for column in data.columns if hasattr(data[column], "geom_type")]
+        other_columns = [column for column in data.columns if column not in geometry_columns]
+        digest.update(repr([(str(column), str(data[column].dtype)) for column in data.columns]).encode())
+        digest.update(pd.util.hash_pandas_object(data[other_columns], index=True).to_numpy().tobytes())
+        for column in geometry_columns:
+            digest.update(data_fingerprint(data[column]).encode())
+    elif hasattr(data, "index") and hasattr(data, "dtype"):
+        import pandas as pd
+        digest.update(str(data.dtype).encode())
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    elif isinstance(data, np.ndarray):
+        array = data
+        if isinstance(data, np.ma.MaskedArray):
+            digest.update(np.ma.getmaskarray(data).tobytes())
+            array = np.ma.getdata(data)
+        digest.update(("%s%s" % (array.dtype.str, repr(array.shape))).encode())
+        if array.dtype.kind == "O":
+            digest.update(pickle.dumps(array.tolist()))
+        else:
+            digest.update(np.ascontiguousarray(array).tobytes())
+    else:
+        digest.update(repr(data).encode())
+    return digest.hexdigest()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# The shared cache is disabled unless SWOTDAWGVIZ_CACHE_DIR is set or configure_cache is called
+_default_cache = DiskCache(enabled="SWOTDAWGVIZ_CACHE_DIR" in os.environ)
+
+
+def get_cache():
+    """Retrieve the cache of derived products shared by the loaders. It is disabled by default: it is enabled by
+    setting the environment variable SWOTDAWGVIZ_CACHE_DIR or by calling configure_cache
+
+    Return
+    ------
+    DiskCache
+        Shared cache
+    """
+    return _default_cache
+
+
+def configure_cache(directory=None, max_size=None, enabled=True):
+    """Configure (and by default enable) the shared cache of derived products
+
+    Parameters
+    ----------
+    directory : str or None
+        Cache directory (private to the user, see DiskCache). Default is None (unchanged)
+    max_size : int or None
+        Maximum total size of the entries (bytes). Default is None (unchanged)
+    enabled : bool
+        True to enable the cache, False to disable it
+    """
+    global _default_cache
+    if directory is not None:
+        _default_cache = DiskCache(directory, _default_cache.max_size, enabled)
+    if max_size is not None:
+        _default_cache.max_size = max_size
+    _default_cache.enabled = enabled
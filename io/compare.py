@@ -0,0 +1,376 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .pool import get_pool
+from .results_summary import DISCHARGE_VARIABLES, find_time_variable
+
+
+# Groups searched for variables in SoS files
+_SOS_GROUPS = ["reaches", "model", "gbpriors/reach"]
+
+
+class ResultsComparison:
+    """Object to compare two runs (results or SoS files) reach by reach
+
+    Reaches are aligned on reach_id, so that files with different sets or orders of reaches can be compared. Values of
+    variables with a time variable (see results_summary.find_time_variable) are aligned on their times, so that runs
+    with different numbers or orders of time steps can be compared; other variables are compared by position. Variables
+    are read by chunks of reaches, so that memory usage does not depend on the size of the files.
+    """
+
+    def __init__(self, old_fname, new_fname, variables=None, rtol=0.0, atol=0.0, chunk_size=10000):
+        """Compare two files
+
+        Parameters
+        ----------
+        old_fname : str
+            Reference file (previous run)
+        new_fname : str
+            New file
+        variables : list or None
+            Variables to compare, as 'group/varname' paths of variables whose first dimension is num_reaches. Default
+            is None (for results files: discharge and parameters of the algorithms of DISCHARGE_VARIABLES, for SoS
+            files: numeric variables of the reaches, model and gbpriors/reach groups, time variables excluded)
+        rtol : float
+            Relative tolerance: values are considered unchanged if |new - old| <= atol + rtol * |old|
+        atol : float
+            Absolute tolerance
+        chunk_size : int
+            Number of reaches read at a time
+        """
+
+        self._old_fname = old_fname
+        self._new_fname = new_fname
+        self._rtol = rtol
+        self._atol = atol
+
+        # Align reaches
+        pool = get_pool()
+        with pool.dataset(old_fname) as dataset:
+            old_reach_id = _read_reach_id(dataset)
+            if variables is None:
+                variables = _default_variables(dataset)
+            old_time_paths = _time_variables(dataset, old_fname, variables)
+        with pool.dataset(new_fname) as dataset:
+            new_reach_id = _read_reach_id(dataset)
+            new_time_paths = _time_variables(dataset, new_fname, variables)
+        self._variables = list(variables)
+
+        # Variables are aligned on times only if both files have the same time variable
+        self._time_paths = {path: old_time_paths[path] if old_time_paths[path] == new_time_paths[path] else None
+                            for path in self._variables}
+
+        common, old_rows, new_rows = np.intersect1d(old_reach_id, new_reach_id, assume_unique=True,
+                                                     return_indices=True)
+        order = np.argsort(old_rows, kind="stable")
+        self._common = common[order]
+        self._old_rows = old_rows[order]
+        self._new_rows = new_rows[order]
+        self._added = np.setdiff1d(new_reach_id, old_reach_id)
+        self._removed = np.setdiff1d(old_reach_id, new_reach_id)
+
+        # Compare variables chunk by chunk
+        columns = {}
+        for path in self._variables:
+            label = path.replace("/", "_")
+            columns["%s_delta" % label] = np.full(self._common.size, np.nan)
+            columns["%s_max_abs_delta" % label] = np.full(self._common.size, np.nan)
+            columns["%s_changed" % label] = np.zeros(self._common.size, dtype=bool)
+        for start in range(0, self._common.size, chunk_size):
+            stop = min(start + chunk_size, self._common.size)
+            with pool.dataset(old_fname) as dataset:
+                old_data = _read_chunk(dataset, self._variables, self._time_paths, self._old_rows[start:stop])
+            with pool.dataset(new_fname) as dataset:
+                new_data = _read_chunk(dataset, self._variables, self._time_paths, self._new_rows[start:stop])
+            for path in self._variables:
+                label = path.replace("/", "_")
+                old_values, new_values = old_data[path], new_data[path]
+                time_path = self._time_paths[path]
+                if time_path is not None:
+                    old_values, new_values = _join_times(old_values, old_data[time_path], new_values,
+                                                         new_data[time_path])
+                delta, max_abs_delta, changed = _compare(old_values, new_values, rtol, atol)
+                columns["%s_delta" % label][start:stop] = delta
+                columns["%s_max_abs_delta" % label][start:stop] = max_abs_delta
+                columns["%s_changed" % label][start:stop] = changed
+
+        deltas = pd.DataFrame(columns, index=pd.Index(self._common, name="reach_id"))
+        changed_columns = ["%s_changed" % path.replace("/", "_") for path in self._variables]
+        if len(changed_columns) > 0:
+            deltas["changed"] = deltas[changed_columns].any(axis=1)
+        else:
+            deltas["changed"] = False
+        self._deltas = deltas.sort_index()
+
+    @property
+    def variables(self):
+        return self._variables
+
+    @property
+    def deltas(self):
+        """Return the per-reach comparison of the reaches found in both files
+
+        Return
+        ------
+        pandas.DataFrame
+            Table indexed by reach_id with, for each variable (label 'group_varname'), the mean difference new - old
+            over the times valid in both files ('<label>_delta'), the maximum absolute difference
+            ('<label>_max_abs_delta') and a change flag ('<label>_changed', also set when the validity of a value
+            changes, e.g. for a time found in only one file), and a global change flag ('changed')
+        """
+        return self._deltas
+
+    @property
+    def added_reaches(self):
+        """Return the reaches found only in the new file
+        """
+        return self._added
+
+    @property
+    def removed_reaches(self):
+        """Return the reaches found only in the reference file
+        """
+        return self._removed
+
+    @property
+    def changed_reaches(self):
+        """Return the reaches found in both files with at least one changed variable
+        """
+        return self._deltas.index[self._deltas["changed"].to_numpy()].to_numpy()
+
+    @property
+    def status(self):
+        """Return the status of all the reaches
+
+        Return
+        ------
+        pandas.Series
+            Status ('unchanged', 'changed', 'added' or 'removed') indexed by reach_id
+        """
+        status = pd.Series(np.where(self._deltas["changed"].to_numpy(), "changed", "unchanged"),
+                           index=self._deltas.index, name="status")
+        status = pd.concat([status,
+                            pd.Series("added", index=pd.Index(self._added, name="reach_id"), name="status"),
+                            pd.Series("removed", index=pd.Index(self._removed, name="reach_id"), name="status")])
+        return status.sort_index()
+
+    def summary(self):
+        """Summarize the comparison by variable
+
+        Return
+        ------
+        pandas.DataFrame
+            Number of changed reaches and maximum absolute difference of each variable
+        """
+        rows = []
+        for path in self._variables:
+            label = path.replace("/", "_")
+            max_abs_delta = self._deltas["%s_max_abs_delta" % label].to_numpy()
+            rows.append({"variable": path,
+                         "n_changed": int(self._deltas["%s_changed" % label].sum()),
+                         "max_abs_delta": np.nanmax(max_abs_delta) if np.any(np.isfinite(max_abs_delta)) else np.nan})
+        return pd.DataFrame(rows).set_index("variable")
+
+    def outdated_outputs(self, pattern, reach_ids=None):
+        """Select the reaches whose outputs (maps, plots...) must be regenerated: changed or added reaches, and
+        reaches whose output file does not exist
+
+        Parameters
+        ----------
+        pattern : str
+            Pattern of the output files, with a '{reach_id}' field (e.g. 'plots/{reach_id}_hydrograph.png')
+        reach_ids : iterable or None
+            Reaches with outputs. Default is None (all the reaches of the new file)
+
+        Return
+        ------
+        pandas.Series
+            Output files to regenerate, indexed by reach_id
+        """
+        if reach_ids is None:
+            reach_ids = np.union1d(self._common, self._added)
+        reach_ids = np.atleast_1d(np.asarray(reach_ids, dtype=np.int64))
+        fnames = np.array([pattern.format(reach_id=reach_id) for reach_id in reach_ids], dtype=object)
+        outdated = np.isin(reach_ids, self.changed_reaches) | np.isin(reach_ids, self._added)
+        outdated |= np.array([not os.path.isfile(fname) for fname in fnames], dtype=bool)
+        return pd.Series(fnames[outdated], index=pd.Index(reach_ids[outdated], name="reach_id"), name="fname")
+
+    def obsolete_outputs(self, pattern):
+        """Select the existing outputs of the reaches removed in the new file
+
+        Parameters
+        ----------
+        pattern : str
+            Pattern of the output files, with a '{reach_id}' field
+
+        Return
+        ------
+        pandas.Series
+            Existing output files of removed reaches, indexed by reach_id
+        """
+        fnames = [pattern.format(reach_id=reach_id) for reach_id in self._removed]
+        exists = np.array([os.path.isfile(fname) for fname in fnames], dtype=bool)
+        return pd.Series(np.array(fnames, dtype=object)[exists] if len(fnames) > 0 else [],
+                         index=pd.Index(self._removed[exists], name="reach_id"), name="fname", dtype=object)
+
+
+def _read_reach_id(dataset):
+    return np.ma.filled(dataset.groups["reaches"].variables["reach_id"][:], 0).astype(np.int64)
+
+
+def _get_variable(dataset, path):
+    root = dataset
+    for group in path.split("/")[:-1]:
+        root = root.groups[group]
+    return root.variables[path.split("/")[-1]]
+
+
+def _has_variable(dataset, path):
+    try:
+        _get_variable(dataset, path)
+    except KeyError:
+        return False
+    return True
+
+
+def _default_variables(dataset):
+    """List the variables compared by default: discharge and parameters of the algorithms (results files) or numeric
+    variables of the SoS groups
+    """
+    algorithms = [algorithm for algorithm in DISCHARGE_VARIABLES if algorithm in dataset.groups]
+    if len(algorithms) > 0:
+        groups = algorithms
+    else:
+        groups = [group for group in _SOS_GROUPS if _has_group(dataset, group)]
+    variables = []
+    for group_path in groups:
+        group = dataset
+        for name in group_path.split("/"):
+            group = group.groups[name]
+        for varname, variable in group.variables.items():
+            if varname == "reach_id" or len(variable.dimensions) == 0:
+                continue
+            if _is_time_variable(dataset, group_path, varname):
+                continue
+            if variable.dimensions[0] == "num_reaches" and variable.dtype != str and variable.dtype.kind in "biuf":
+                variables.append("%s/%s" % (group_path, varname))
+    return variables
+
+
+def _is_time_variable(dataset, group_path, varname):
+    """Check if a variable is the time variable of its group (see results_summary.find_time_variable)
+    """
+    if group_path not in dataset.groups or "reaches" not in dataset.groups:
+        return False
+    return find_time_variable(dataset, group_path) == (group_path, varname)
+
+
+def _time_variables(dataset, fname, variables):
+    """Find the time variables of variables (see _time_variable), checking that all the variables exist
+    """
+    missing = [path for path in variables if not _has_variable(dataset, path)]
+    if len(missing) > 0:
+        raise ValueError("Variables not found in %s: %s" % (fname, ", ".join(missing)))
+    return {path: _time_variable(dataset, path) for path in variables}
+
+
+def _time_variable(dataset, path):
+    """Find the path of the time variable of a variable, None if it has no time variable with the same dimensions
+    """
+    group_path, varname = path.rsplit("/", 1) if "/" in path else ("", path)
+    if group_path not in dataset.groups or "reaches" not in dataset.groups:
+        return None
+    found = find_time_variable(dataset, group_path)
+    if found is None or found == (group_path, varname):
+        return None
+    time_path = "%s/%s" % found
+    if _get_variable(dataset, time_path).dimensions != _get_variable(dataset, path).dimensions:
+        return None
+    return time_path
+
+
+def _has_group(dataset, path):
+    group = dataset
+    for name in path.split("/"):
+        if name not in group.groups:
+            return False
+        group = group.groups[name]
+    return True
+
+
+def _read_rows(variable, rows):
+    """Read rows of a variable (first dimension) as a float array, shape (number of rows, number of columns)
+    """
+    if rows.size == 0:
+        return np.zeros((0, int(np.prod(variable.shape[1:]))))
+    order = np.argsort(rows, kind="stable")
+    sorted_rows = rows[order]
+    first, last = sorted_rows[0], sorted_rows[-1] + 1
+    if last - first <= 4 * rows.size:
+        # Rows are (nearly) contiguous: read a single slice
+        data = variable[first:last]
+        data = np.ma.filled(np.ma.asarray(data, dtype=np.float64), np.nan)[sorted_rows - first]
+    else:
+        data = np.ma.filled(np.ma.asarray(variable[sorted_rows], dtype=np.float64), np.nan)
+    result = np.empty_like(data)
+    result[order] = data
+    return result.reshape((rows.size, -1))
+
+
+def _read_chunk(dataset, variables, time_paths, rows):
+    """Read rows of variables and of their time variables
+    """
+    paths = list(variables) + [time_path for time_path in time_paths.values() if time_path is not None]
+    return {path: _read_rows(_get_variable(dataset, path), rows) for path in dict.fromkeys(paths)}
+
+
+def _join_times(old, old_times, new, new_times):
+    """Align the values of two files on their times (exact matches), shape (number of reaches, maximum number of
+    distinct times of a reach). Values without time are discarded
+    """
+    old_rows, old_columns = np.nonzero(np.isfinite(old_times))
+    new_rows, new_columns = np.nonzero(np.isfinite(new_times))
+
+    # Distinct (reach, time) pairs, sorted by reach then time
+    keys = np.concatenate([np.column_stack([old_rows, old_times[old_rows, old_columns]]),
+                           np.column_stack([new_rows, new_times[new_rows, new_columns]])])
+    unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    key_rows = unique_keys[:, 0].astype(np.int64)
+    first = np.searchsorted(key_rows, np.arange(old.shape[0]), side="left")
+    positions = np.arange(key_rows.size) - first[key_rows]
+    width = int(positions.max()) + 1 if positions.size > 0 else 0
+
+    aligned_old = np.full((old.shape[0], width), np.nan)
+    aligned_new = np.full((new.shape[0], width), np.nan)
+    aligned_old[old_rows, positions[inverse[:old_rows.size]]] = old[old_rows, old_columns]
+    aligned_new[new_rows, positions[inverse[old_rows.size:]]] = new[new_rows, new_columns]
+    return aligned_old, aligned_new
+
+
+def _compare(old, new, rtol, atol):
+    """Compare two arrays of shape (number of reaches, number of columns), possibly with different numbers of columns
+    """
+    width = max(old.shape[1], new.shape[1])
+    if old.shape[1] < width:
+        old = np.pad(old, ((0, 0), (0, width - old.shape[1])), constant_values=np.nan)
+    if new.shape[1] < width:
+        new = np.pad(new, ((0, 0), (0, width - new.shape[1])), constant_values=np.nan)
+
+    old_valid = np.isfinite(old)
+    new_valid = np.isfinite(new)
+    both = old_valid & new_valid
+    difference = np.where(both, new - old, 0.0)
+    n_both = both.sum(axis=1)
+
+    delta = np.full(old.shape[0], np.nan)
+    max_abs_delta = np.full(old.shape[0], np.nan)
+    has_both = n_both > 0
+    delta[has_both] = difference[has_both].sum(axis=1) / n_both[has_both]
+    max_abs_delta[has_both] = np.abs(difference[has_both]).max(axis=1)
+
+    exceeds = both & (np.abs(difference) > atol + rtol * np.abs(np.where(both, old, 0.0)))
+    changed = np.any(exceeds | (old_valid != new_valid), axis=1)
+    return delta, max_abs_delta, changed
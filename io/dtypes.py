@@ -0,0 +1,205 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+
+# Prefixes of the groups of the columns of loaded datasets (see SosNetCDF)
+GROUP_PREFIXES = ["model_", "gbpriors_", "grdc_", "usgs_"]
+
+
+class DtypePolicy:
+    """Policy for compact dtypes of the columns of loaded datasets
+
+    Measurements are stored as float32, identifiers as nullable 64-bit integers (Int64) and names and flags as
+    categoricals. Columns listed in float64_columns (coordinates, distances) keep double precision.
+    """
+
+    def __init__(self, float_dtype="float32", id_dtype="Int64", float64_columns=("x", "y", "lon", "lat", "dist_out"),
+                 flag_names=("flag",), categorical_columns=(), max_category_ratio=0.5, downcast_integers=True):
+        """Create a policy
+
+        Parameters
+        ----------
+        float_dtype : str
+            Dtype of the measurements (floating point columns)
+        id_dtype : str
+            Dtype of the identifiers (columns named '*_id' or 'id')
+        float64_columns : iterable
+            Floating point columns kept in float64
+        flag_names : iterable
+            Substrings of the names of integer flag columns converted to categoricals
+        categorical_columns : iterable
+            Supplementary columns converted to categoricals
+        max_category_ratio : float
+            Text columns are converted to categoricals only if the ratio of the number of unique values to the number
+            of rows is lower than this value
+        downcast_integers : bool
+            True to downcast the other integer columns (counts...) to the smallest integer dtype
+        """
+        self._float_dtype = float_dtype
+        self._id_dtype = id_dtype
+        self._float64_columns = set(float64_columns)
+        self._flag_names = list(flag_names)
+        self._categorical_columns = set(categorical_columns)
+        self._max_category_ratio = max_category_ratio
+        self._downcast_integers = downcast_integers
+
+    def column_kind(self, name, series):
+        """Classify a column
+
+        Parameters
+        ----------
+        name : str
+            Name of the column
+        series : pandas.Series
+            Values of the column
+
+        Return
+        ------
+        str
+            Kind of the column: 'id', 'category', 'measurement', 'integer' or 'other' (kept as is)
+        """
+        dtype = series.dtype
+        if str(dtype) == "geometry":
+            return "other"
+        if name in self._categorical_columns:
+            return "category"
+        if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+            return "other"
+        if name == "id" or name.endswith("_id"):
+            return "id" if pd.api.types.is_numeric_dtype(dtype) else "category"
+        if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+            return "category"
+        if pd.api.types.is_integer_dtype(dtype):
+            if any(flag in name for flag in self._flag_names):
+                return "category"
+            return "integer"
+        if pd.api.types.is_float_dtype(dtype):
+            if name in self._float64_columns:
+                return "other"
+            if any(flag in name for flag in self._flag_names) and _is_integral(series):
+                return "category"
+            return "measurement"
+        return "other"
+
+    def apply(self, dataframe):
+        """Convert the columns of a dataframe in place
+
+        Parameters
+        ----------
+        dataframe : pandas.DataFrame
+            Dataframe (or GeoDataFrame) to convert
+
+        Return
+        ------
+        pandas.DataFrame
+            The converted dataframe
+        """
+        for name in list(dataframe.columns):
+            series = dataframe[name]
+            kind = self.column_kind(name, series)
+            if kind == "measurement":
+                if series.dtype != np.dtype(self._float_dtype):
+                    dataframe[name] = series.to_numpy(dtype=np.float64, na_value=np.nan).astype(self._float_dtype)
+            elif kind == "id":
+                if _is_integral(series):
+                    dataframe[name] = series.astype(self._id_dtype)
+            elif kind == "category":
+                if pd.api.types.is_numeric_dtype(series.dtype) or \
+                   series.nunique(dropna=True) <= self._max_category_ratio * max(series.size, 1):
+                    dataframe[name] = series.astype("category")
+            elif kind == "integer" and self._downcast_integers:
+                dataframe[name] = pd.to_numeric(series, downcast="integer")
+        return dataframe
+
+
+def memory_report(dataframe, group_prefixes=GROUP_PREFIXES, default_group="dataset"):
+    """Break down the memory used by a dataframe by column and group
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+        Dataframe (or GeoDataFrame)
+    group_prefixes : iterable
+        Prefixes of the column names identifying the groups
+    default_group : str
+        Group of the columns without prefix
+
+    Return
+    ------
+    pandas.DataFrame
+        Dtype and bytes of each column, indexed by (group, column) and sorted by decreasing bytes within groups sorted
+        by decreasing bytes. Bytes of geometries are estimated from their number of coordinates. Totals by group are
+        obtained with report.groupby(level="group")["bytes"].sum()
+    """
+
+    usage = dataframe.memory_usage(index=False, deep=True)
+    rows = []
+    for name in dataframe.columns:
+        series = dataframe[name]
+        nbytes = int(usage[name])
+        group = default_group
+        if str(series.dtype) == "geometry":
+            import shapely
+            geometries = np.asarray(series.values, dtype=object)
+            coordinates = shapely.get_num_coordinates(geometries).sum()
+            nbytes += int(coordinates * 8 * (3 if shapely.has_z(geometries).any() else 2))
+            group = "geometry"
+        else:
+            for prefix in group_prefixes:
+                if name.startswith(prefix):
+                    group = prefix[:-1] if prefix.endswith("_") else prefix
+                    break
+        rows.append({"group": group, "column": name, "dtype": str(series.dtype), "bytes": nbytes})
+
+    report = pd.DataFrame(rows, columns=["group", "column", "dtype", "bytes"])
+    if report.shape[0] == 0:
+        return report.set_index(["group", "column"])
+    totals = report.groupby("group")["bytes"].transform("sum")
+    report = report.assign(_total=totals).sort_values(["_total", "group", "bytes"], ascending=[False, True, False])
+    return report.drop(columns="_total").set_index(["group", "column"])
+
+
+def assign_by_key(dataframe, other, left_on, right_on):
+    """Left-join the columns of a dataframe into another one in place (index-based assignment instead of a merge that
+    copies the whole dataframe). Keys of other must be unique: unlike a merge, which would duplicate the rows of
+    dataframe, only the first row of other with a given key is used, the other ones are dropped with a warning
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+        Dataframe receiving the columns
+    other : pandas.DataFrame
+        Dataframe providing the columns
+    left_on : str
+        Key column of dataframe
+    right_on : str
+        Key column of other
+
+    Return
+    ------
+    pandas.DataFrame
+        The dataframe with the added columns
+    """
+    duplicated = other[right_on].duplicated(keep="first").to_numpy()
+    if np.any(duplicated):
+        logging.getLogger("swotviz").warning("%i rows with duplicated %s dropped (first occurrence kept)" %
+                                             (np.count_nonzero(duplicated), right_on))
+        other = other[~duplicated]
+    aligned = other.set_index(other[right_on].to_numpy(), drop=False).reindex(dataframe[left_on].to_numpy())
+    for name in aligned.columns:
+        dataframe[name] = aligned[name].to_numpy()
+    return dataframe
+
+
+def _is_integral(series):
+    """Check that the non-null values of a numeric series are integers
+    """
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return True
+    if not pd.api.types.is_float_dtype(series.dtype):
+        return False
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    values = values[np.isfinite(values)]
+    return bool(np.all(values == np.round(values)) and np.all(np.abs(values) < 2**63))
@@ -0,0 +1,212 @@
+import ast
+
+import numpy as np
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+
+# Syntax elements allowed in filter expressions
+_ALLOWED_NODES = (ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Name, ast.Load, ast.Constant,
+                  ast.And, ast.Or, ast.Not, ast.BitAnd, ast.BitOr, ast.Invert, ast.USub, ast.UAdd,
+                  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+                  ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+
+class FilterExpression:
+    """Object to handle declarative filter expressions on dataset variables, such as
+    "width > 100 and n_good_obs > 10 and reach_id // 1e7 == 7426"
+
+    Expressions may use variables, numbers, arithmetic operators, comparisons (possibly chained) and the logical
+    operators and/or/not (or &, |, ~). They are evaluated in a vectorized way, using numexpr when it is available.
+    """
+
+    def __init__(self, expression):
+        """Parse a filter expression
+
+        Parameters
+        ----------
+        expression : str
+            Filter expression
+        """
+
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as error:
+            raise ValueError("Invalid filter expression '%s': %s" % (expression, error.msg))
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise ValueError("Invalid filter expression '%s': %s not allowed" % (expression,
+                                                                                     type(node).__name__))
+
+        self._expression = expression
+        self._names = sorted(set(node.id for node in ast.walk(tree) if isinstance(node, ast.Name)))
+
+        # Vectorized form: logical operators are replaced by bitwise operators
+        self._vectorized_tree = ast.fix_missing_locations(_VectorizeTransformer().visit(tree))
+        self._vectorized_expression = ast.unparse(self._vectorized_tree)
+
+    @property
+    def expression(self):
+        return self._expression
+
+    @property
+    def names(self):
+        """Return the names of the variables referenced in the expression
+        """
+        return self._names
+
+    def evaluate(self, columns):
+        """Evaluate the expression
+
+        Parameters
+        ----------
+        columns : dict
+            Dictionary variable name -> numpy.ndarray (all arrays with the same size)
+
+        Return
+        ------
+        numpy.ndarray
+            Boolean array, True for rows that satisfy the expression
+        """
+
+        missing = [name for name in self._names if name not in columns]
+        if len(missing) > 0:
+            raise ValueError("Variables not found for filter expression: %s" % ", ".join(missing))
+        local_dict = {name: columns[name] for name in self._names}
+
+        result = None
+        if numexpr is not None:
+            try:
+                result = numexpr.evaluate(self._vectorized_expression, local_dict=local_dict, global_dict={})
+            except Exception:
+                # Operators not supported by numexpr (e.g. floor division): fall back to numpy
+                result = None
+        if result is None:
+            code = compile(self._vectorized_tree, "<filter>", "eval")
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result = eval(code, {"__builtins__": {}}, local_dict)
+
+        result = np.asarray(result)
+        if result.dtype != bool:
+            raise ValueError("Filter expression '%s' does not evaluate to a boolean" % self._expression)
+        return result
+
+    def __repr__(self):
+        return "FilterExpression(%s)" % repr(self._expression)
+
+
+class _VectorizeTransformer(ast.NodeTransformer):
+    """Replace logical operators and chained comparisons by their elementwise (bitwise) equivalents
+    """
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        operator = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        result = node.values[0]
+        for value in node.values[1:]:
+            result = ast.BinOp(left=result, op=operator, right=value)
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        left = node.left
+        result = None
+        for operator, right in zip(node.ops, node.comparators):
+            comparison = ast.Compare(left=left, ops=[operator], comparators=[right])
+            result = comparison if result is None else ast.BinOp(left=result, op=ast.BitAnd(), right=comparison)
+            left = right
+        return result
+
+
+def read_filter_columns(expression, groups, dimension, mask=None):
+    """Read the variables referenced by a filter expression in netCDF groups
+
+    Parameters
+    ----------
+    expression : FilterExpression
+        Filter expression
+    groups : dict
+        Dictionary prefix -> netCDF4.Group. A variable named prefix + varname in the expression is read as varname in
+        the group of the prefix (the longest matching prefix is used, '' for unprefixed variables)
+    dimension : str
+        Dimension of the variables (only variables with dimensions (dimension,) can be used)
+    mask : numpy.ndarray or None
+        Boolean mask of the rows to read. Default is None (read all rows)
+
+    Return
+    ------
+    dict
+        Dictionary variable name -> numpy.ndarray (masked values are set to NaN)
+    """
+
+    prefixes = sorted(groups.keys(), key=len, reverse=True)
+    columns = {}
+    for name in expression.names:
+        variable = None
+        for prefix in prefixes:
+            if name.startswith(prefix) and name[len(prefix):] in groups[prefix].variables:
+                variable = groups[prefix].variables[name[len(prefix):]]
+                break
+        if variable is None or variable.dimensions != (dimension,):
+            raise ValueError("Variable %s of filter expression not found (or not of dimension %s)" % (name,
+                                                                                                    dimension))
+        if mask is None:
+            array = variable[:]
+        elif not np.any(mask):
+            array = np.zeros(0, dtype=variable.dtype)
+        else:
+            array = variable[mask]
+        if isinstance(array, np.ma.core.MaskedArray):
+            if np.ma.is_masked(array):
+                array = array.astype(np.float64).filled(np.nan)
+            else:
+                array = array.data
+        columns[name] = np.asarray(array)
+
+    return columns
+
+
+def apply_filter_expression(expression, groups, dimension, mask=None):
+    """Evaluate a filter expression on netCDF groups, reading only the referenced variables
+
+    Parameters
+    ----------
+    expression : str or FilterExpression
+        Filter expression
+    groups : dict
+        Dictionary prefix -> netCDF4.Group (see read_filter_columns)
+    dimension : str
+        Dimension of the variables
+    mask : numpy.ndarray or None
+        Boolean mask of the rows already selected. Default is None (all rows)
+
+    Return
+    ------
+    numpy.ndarray
+        Boolean mask of the rows that are selected and satisfy the expression
+    """
+
+    if not isinstance(expression, FilterExpression):
+        expression = FilterExpression(expression)
+
+    columns = read_filter_columns(expression, groups, dimension, mask)
+    if len(columns) == 0:
+        raise ValueError("Filter expression '%s' does not reference any variable" % expression.expression)
+    selected = expression.evaluate(columns)
+
+    if mask is None:
+        return selected
+    new_mask = np.zeros(mask.shape, dtype=bool)
+    new_mask[mask] = selected
+    return new_mask
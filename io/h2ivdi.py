@@ -1,7 +1,10 @@
-import geopandas as gpd
-import netCDF4 as nc
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import os
+
 import numpy as np
-from shapely.geometry import LineString
+
+from .pool import get_pool
 
 
 class OutputH2iVDI:
@@ -15,29 +18,30 @@ class OutputH2iVDI:
             Sword file
         """
         
-        self._nc_dataset = nc.Dataset(fname, "r")
-        
-        
-        # Retrieve status attributes
-        self._status = self._nc_dataset.status
-        self._vda_status = self._nc_dataset.VDA_status
+        # All the data is loaded at once so the dataset is released as soon as it is read
+        with get_pool().dataset(fname) as nc_dataset:
         
-        # Retrieve results
-        self._t = self._nc_dataset.variables["nt"][:]
-        group = self._nc_dataset.groups["reach"]
-        self._A0 = group.variables["A0"][:]
+            # Retrieve status attributes
+            self._status = nc_dataset.status
+            self._vda_status = nc_dataset.VDA_status
+            
+            # Retrieve results
+            self._t = nc_dataset.variables["nt"][:]
+            group = nc_dataset.groups["reach"]
+            self._A0 = group.variables["A0"][:]
+            self._alpha = group.variables["alpha"][:]
+            self._beta = group.variables["beta"][:]
+            self._Q = group.variables["Q"][:]
+            
         if isinstance(self._A0, np.ma.core.MaskedArray):
             self._A0 = self._A0.filled(fill_value=np.nan)
         self._A0 = float(self._A0)
-        self._alpha = group.variables["alpha"][:]
         if isinstance(self._alpha, np.ma.core.MaskedArray):
             self._alpha = self._alpha.filled(fill_value=np.nan)
         self._alpha = float(self._alpha)
-        self._beta = group.variables["beta"][:]
         if isinstance(self._beta, np.ma.core.MaskedArray):
             self._beta = self._beta.filled(fill_value=np.nan)
         self._beta = float(self._beta)
-        self._Q = group.variables["Q"][:]
         if isinstance(self._Q, np.ma.core.MaskedArray):
             self._Q = self._Q.filled(fill_value=np.nan)
             
@@ -70,3 +74,159 @@ class OutputH2iVDI:
     @property
     def discharge(self):
         return self._Q
+
+
+class OutputH2iVDICollection:
+    """Object to handle the collection of outputs of a H2iVDI run (one file per reach)
+    """
+    
+    def __init__(self, dirname, pattern="*_h2ivdi.nc", max_workers=None):
+        """List the output files of a H2iVDI run. Files are read (in parallel processes) on first access to the
+        results
+        
+        Parameters
+        ----------
+        dirname : str
+            Path to the directory containing H2iVDI output files
+        pattern : str
+            Pattern of the output files. The reach identifier is the prefix of the basename (before the first '_')
+        max_workers : int or None
+            Maximum number of worker processes (netCDF reads are serialized within a process, see NetCDFHandlePool)
+        """
+        
+        # Store parameters
+        self._dirname = dirname
+        self._max_workers = max_workers
+        
+        # List files in directory
+        fnames = glob.glob(os.path.join(dirname, pattern))
+        fnames.sort()
+        self._fnames = fnames
+        
+        # Results are computed on first access
+        self._summary = None
+        self._times = None
+        self._Q = None
+        
+    @property
+    def files_list(self):
+        return [os.path.basename(fname) for fname in self._fnames]
+        
+    @property
+    def reaches_list(self):
+        return [os.path.basename(fname).split("_")[0] for fname in self._fnames]
+    
+    @property
+    def summary(self):
+        """Return the summary table of the run (one row per reach: status, VDA_status, A0, alpha, beta, number of
+        valid discharge values and error message if the file could not be read)
+        
+        Return
+        ------
+        pandas.DataFrame
+            Summary table indexed by reach_id
+        """
+        self.load()
+        return self._summary
+    
+    @property
+    def times(self):
+        """Return the times of the columns of the discharge array (union of the times of all the outputs)
+        """
+        self.load()
+        return self._times
+    
+    @property
+    def Q(self):
+        """Return the discharge array, shape (number of reaches, number of times), in the order of the summary table.
+        Missing values are set to NaN
+        """
+        self.load()
+        return self._Q
+    
+    @property
+    def discharge(self):
+        return self.Q
+    
+    def load(self, reload=False):
+        """Read all the output files in parallel processes. Results are cached, so files are only read once
+        
+        Parameters
+        ----------
+        reload : bool
+            True to read the files again
+        """
+        
+        if self._summary is not None and not reload:
+            return
+        
+        import pandas as pd
+        
+        if len(self._fnames) > 1:
+            with ProcessPoolExecutor(max_workers=self._max_workers) as executor:
+                chunksize = max(1, len(self._fnames) // (4 * (self._max_workers or os.cpu_count() or 1)))
+                outputs = list(executor.map(_read_h2ivdi_output, self._fnames, chunksize=chunksize))
+        else:
+            outputs = [_read_h2ivdi_output(fname) for fname in self._fnames]
+        
+        # Build summary table
+        summary = pd.DataFrame({"reach_id": self.reaches_list,
+                                "fname": self.files_list,
+                                "status": [output["status"] for output in outputs],
+                                "VDA_status": [output["VDA_status"] for output in outputs],
+                                "A0": np.array([output["A0"] for output in outputs], dtype=np.float64),
+                                "alpha": np.array([output["alpha"] for output in outputs], dtype=np.float64),
+                                "beta": np.array([output["beta"] for output in outputs], dtype=np.float64),
+                                "error": [output["error"] for output in outputs]})
+        summary["reach_id"] = pd.to_numeric(summary["reach_id"], errors="coerce").astype("Int64")
+        
+        # Build discharge array on the union of the times (files with mismatching t and Q are reported as errors and
+        # contribute no discharge, see _read_h2ivdi_output)
+        t_list = [output["t"] for output in outputs]
+        Q_list = [output["Q"] for output in outputs]
+        sizes = np.array([t.size for t in t_list])
+        if sizes.sum() > 0:
+            t_all = np.concatenate(t_list)
+            times = np.unique(t_all[np.isfinite(t_all)])
+            rows = np.repeat(np.arange(len(outputs)), sizes)
+            values = np.concatenate(Q_list)
+            valid = np.isfinite(t_all)
+            Q = np.full((len(outputs), times.size), np.nan)
+            Q[rows[valid], np.searchsorted(times, t_all[valid])] = values[valid]
+        else:
+            times = np.zeros(0)
+            Q = np.full((len(outputs), 0), np.nan)
+        summary["n_valid_Q"] = np.sum(np.isfinite(Q), axis=1)
+        
+        self._summary = summary.set_index("reach_id")
+        self._times = times
+        self._Q = Q
+
+
+def _read_h2ivdi_output(fname):
+    """Read the content of a H2iVDI output file as a dictionary of plain values (picklable for process pools)
+    """
+    
+    try:
+        output = OutputH2iVDI(fname)
+        t = np.asarray(np.ma.filled(output.t, np.nan), dtype=np.float64).ravel()
+        Q = np.asarray(np.ma.filled(output.Q, np.nan), dtype=np.float64).ravel()
+        if t.size != Q.size:
+            raise ValueError("Sizes of t (%i) and Q (%i) differ in %s" % (t.size, Q.size, fname))
+        return {"status": output.status(),
+                "VDA_status": output.status(which="vda"),
+                "A0": output.A0,
+                "alpha": output.alpha,
+                "beta": output.beta,
+                "t": t,
+                "Q": Q,
+                "error": None}
+    except Exception as error:
+        return {"status": None,
+                "VDA_status": None,
+                "A0": np.nan,
+                "alpha": np.nan,
+                "beta": np.nan,
+                "t": np.zeros(0),
+                "Q": np.zeros(0),
+                "error": "%s: %s" % (type(error).__name__, str(error))}
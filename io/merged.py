@@ -0,0 +1,53 @@
+import numpy as np
+
+from .cache import get_cache
+
+
+def load_sos_sword_table(sos_fname, sword_fname, level="reaches", reaches_list=None, load_geometry=False,
+                         filter_expr=None):
+    """Load the merged table of SoS and SWORD data (cached on disk, keyed on both files and the parameters)
+
+    Parameters
+    ----------
+    sos_fname : str
+        SoS netCDF file
+    sword_fname : str
+        SWORD netCDF file
+    level : str
+        Data level, must be 'reaches' or 'nodes'
+    reaches_list : list or None
+        List of reaches to keep. Default is None (keep all the reaches of the SWORD file)
+    load_geometry : bool
+        True to load the centerlines
+    filter_expr : str or None
+        Filter expression on the SWORD variables (see SwordNetCDF). Default is None (no filter)
+
+    Return
+    ------
+    geopandas.GeoDataFrame
+        SWORD data merged with SoS data on reach_id (SoS columns with the same name as SWORD columns are suffixed with
+        '_sos')
+    """
+
+    from .sos import SosNetCDF
+    from .sword import SwordNetCDF
+
+    def compute():
+        sword = SwordNetCDF(sword_fname, level=level, reaches_list=reaches_list, load_geometry=load_geometry,
+                            filter_expr=filter_expr)
+        try:
+            table = sword.dataset
+        finally:
+            sword.close()
+        sos = SosNetCDF(sos_fname, level=level, reaches_list=table["reach_id"].to_numpy(), verbose=False)
+        try:
+            sos_dataset = sos.dataset
+        finally:
+            sos.close()
+        return table.merge(sos_dataset, on="reach_id", how="left", suffixes=("", "_sos"))
+
+    params = {"level": level,
+              "reaches_list": None if reaches_list is None else np.sort(np.asarray(reaches_list)).tolist(),
+              "load_geometry": load_geometry,
+              "filter_expr": None if filter_expr is None else str(filter_expr)}
+    return get_cache().memoize("sos_sword_table", compute, files=[sos_fname, sword_fname], params=params)
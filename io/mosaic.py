@@ -0,0 +1,287 @@
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+from .sos import SosNetCDF
+
+
+# Continent files and the corresponding first digit of SWORD identifiers
+CONTINENT_CODES = {"af": [1], "eu": [2], "as": [3, 4], "oc": [5], "sa": [6], "na": [7, 8, 9]}
+
+
+def continent_digits(ids, level="reaches"):
+    """Retrieve the continent digit (first digit) of SWORD reach or node identifiers
+
+    Parameters
+    ----------
+    ids : int or iterable
+        Reach identifiers (11 digits) or node identifiers (14 digits)
+    level : str
+        Data level, must be 'reaches' or 'nodes'
+
+    Return
+    ------
+    numpy.ndarray
+        Continent digits
+    """
+
+    if level == "reaches":
+        divisor = 10**10
+    elif level == "nodes":
+        divisor = 10**13
+    else:
+        raise ValueError("'level' must be reaches or nodes")
+
+    return np.atleast_1d(np.asarray(ids, dtype=np.int64)) // divisor
+
+
+class SosMosaic:
+    """Object to handle a set of continent files (SoS or results) as one virtual dataset
+
+    Continent files are loaded with a loader class that takes the same arguments as SosNetCDF (fname, level,
+    reaches_list) and provides the same interface (dataset, get_reach): SosNetCDF for SoS files (default) and
+    ResultsNetCDF for results files.
+    """
+
+    def __init__(self, fnames, level="reaches", reaches_list=None, loader=SosNetCDF, max_workers=None,
+                 **loader_kwargs):
+        """Register a set of continent files. Files are only opened when data of the continent is requested
+
+        Parameters
+        ----------
+        fnames : dict, list or str
+            Dictionary continent -> file, list of files or glob pattern. For lists and patterns the continent is
+            retrieved from the prefix of the basename of the files (e.g. na_sword_v16_SOS_priors.nc)
+        level : str
+            Data level, must be 'reaches' or 'nodes'
+        reaches_lists : list or None
+            List of reaches to keep. Default is None (keep all the reaches in the files)
+        loader : class
+            Class used to load one continent file, called as loader(fname, level=level, reaches_list=reaches_list,
+            **loader_kwargs). Default is SosNetCDF. Loaded objects must be picklable to be opened concurrently
+            (see open)
+        max_workers : int or None
+            Maximum number of worker processes used to open files concurrently. Default is None (number of
+            continents to open, up to the number of processors)
+        loader_kwargs : dict
+            Supplementary arguments for the loader (e.g. verbose=False)
+        """
+
+        if isinstance(fnames, str):
+            fnames = sorted(glob.glob(fnames))
+        if not isinstance(fnames, dict):
+            fnames_dict = {}
+            for fname in fnames:
+                continent = os.path.basename(fname)[0:2].lower()
+                if continent not in CONTINENT_CODES:
+                    raise ValueError("Unable to retrieve continent from file name: %s" % fname)
+                fnames_dict[continent] = fname
+            fnames = fnames_dict
+        for continent in fnames:
+            if continent not in CONTINENT_CODES:
+                raise ValueError("Unknown continent: %s" % continent)
+
+        # Store parameters
+        self._fnames = dict(fnames)
+        self._level = level
+        self._loader = loader
+        self._loader_kwargs = loader_kwargs
+        self._max_workers = max_workers
+
+        # Route reaches list to continents
+        self._reaches_lists = {}
+        if reaches_list is not None:
+            reaches_list = np.atleast_1d(np.asarray(reaches_list, dtype=np.int64))
+            digits = continent_digits(reaches_list, level="reaches")
+            for continent in list(self._fnames.keys()):
+                subset = reaches_list[np.isin(digits, CONTINENT_CODES[continent])]
+                if subset.size > 0:
+                    self._reaches_lists[continent] = subset
+                else:
+                    # No requested reach in this continent
+                    del self._fnames[continent]
+        else:
+            for continent in self._fnames:
+                self._reaches_lists[continent] = None
+
+        # Loaded continents
+        self._loaded = {}
+
+    @property
+    def continents(self):
+        return list(self._fnames.keys())
+
+    @property
+    def loaded_continents(self):
+        return list(self._loaded.keys())
+
+    @property
+    def dataset(self):
+        """Return the dataset of all the continents (all continents are loaded)
+
+        Return
+        ------
+        pandas.DataFrame
+            Concatenated dataset
+        """
+        self.open()
+        datasets = [self._loaded[continent].dataset for continent in self.continents]
+        return pd.concat(datasets, ignore_index=True)
+
+    def continent_of(self, reach_id):
+        """Retrieve the continent file that contains a reach
+
+        Parameters
+        ----------
+        reach_id : int
+            Identifier of the reach
+
+        Return
+        ------
+        str
+            Continent code
+        """
+
+        digit = continent_digits(reach_id, level="reaches")[0]
+        for continent in self._fnames:
+            if digit in CONTINENT_CODES[continent]:
+                return continent
+        raise RuntimeError("Reach %i not found (no file for continent digit %i)" % (reach_id, digit))
+
+    def get_continent(self, continent):
+        """Retrieve the loader object of a continent (the file is opened if necessary)
+
+        Parameters
+        ----------
+        continent : str
+            Continent code
+
+        Return
+        ------
+        object
+            Loader object (SosNetCDF by default)
+        """
+
+        if continent not in self._loaded:
+            self._loaded[continent] = self.__load_continent__(continent)
+        return self._loaded[continent]
+
+    def get_reach(self, reach_id):
+        """Retrieve data of a reach, only the continent file containing the reach is opened
+
+        Parameters
+        ----------
+        reach_id : int
+            Identifier of the reach
+
+        Return
+        ------
+        pandas.DataFrame
+            Data of the reach
+        """
+
+        if self._level != "reaches":
+            raise RuntimeError("Cannot extract data for a reach because level is nodes")
+
+        return self.get_continent(self.continent_of(reach_id)).get_reach(reach_id)
+
+    def open(self, continents=None):
+        """Open several continent files concurrently. Files are loaded in worker processes: in a process, reads of
+        netCDF files are serialized by the lock of the shared pool of handles (see NetCDFHandlePool), so threads
+        would not load them faster. Workers are started with the 'spawn' method (the state of the HDF5 library must
+        not be inherited), so scripts that open mosaics must be protected by if __name__ == "__main__"
+
+        Parameters
+        ----------
+        continents : list or None
+            List of continents to open. Default is None (open all the continents)
+        """
+
+        if continents is None:
+            continents = self.continents
+        continents = [continent for continent in continents if continent not in self._loaded]
+
+        max_workers = self._max_workers
+        if max_workers is None:
+            max_workers = min(len(continents), os.cpu_count() or 1)
+        if len(continents) == 1 or max_workers <= 1:
+            for continent in continents:
+                self.get_continent(continent)
+        else:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+                futures = [executor.submit(_load_continent, self._loader, self._fnames[continent], self._level,
+                                           self._reaches_lists[continent], self._loader_kwargs)
+                           for continent in continents]
+                for continent, future in zip(continents, futures):
+                    self._loaded[continent] = future.result()
+
+    def iter_continents(self, keep=False):
+        """Iterate over continents, loading one continent at a time
+
+        Parameters
+        ----------
+        keep : bool
+            True to keep the continents loaded after iteration. Default is False (each continent that was not
+            already loaded is closed and released before the next one is loaded)
+
+        Yield
+        -----
+        tuple
+            Continent code and loader object
+        """
+
+        for continent in self.continents:
+            already_loaded = continent in self._loaded
+            data = self.get_continent(continent)
+            yield continent, data
+            if not keep and not already_loaded:
+                self.__release_continent__(continent)
+
+    def summarize(self, func):
+        """Compute a global summary continent by continent, so that a single continent is in memory at a time
+
+        Parameters
+        ----------
+        func : callable
+            Function applied to the dataset (pandas.DataFrame) of each continent, must return a pandas object
+
+        Return
+        ------
+        pandas.DataFrame or pandas.Series
+            Concatenation of the summaries of the continents (indexed by continent code)
+        """
+
+        summaries = {}
+        for continent, data in self.iter_continents():
+            summaries[continent] = func(data.dataset)
+        return pd.concat(summaries)
+
+    def close(self):
+        """Close all the opened continent files
+        """
+        for continent in list(self._loaded.keys()):
+            self.__release_continent__(continent)
+
+    def __load_continent__(self, continent):
+        """Load the file of a continent
+        """
+        return _load_continent(self._loader, self._fnames[continent], self._level, self._reaches_lists[continent],
+                               self._loader_kwargs)
+
+    def __release_continent__(self, continent):
+        """Close and release the file of a continent
+        """
+        data = self._loaded.pop(continent)
+        if hasattr(data, "close"):
+            data.close()
+
+
+def _load_continent(loader, fname, level, reaches_list, loader_kwargs):
+    """Load the file of a continent (function run in the worker processes of SosMosaic.open)
+    """
+    return loader(fname, level=level, reaches_list=reaches_list, **loader_kwargs)
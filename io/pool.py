@@ -0,0 +1,236 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import threading
+
+
+class NetCDFHandlePool:
+    """Object to handle a pool of open netCDF datasets (read-only) shared by all the loaders
+
+    Open datasets are reused across loaders and kept open after use up to a maximum number of handles. Unused handles
+    are closed in least recently used order when the limit is reached. As the HDF5 library is not thread-safe, all the
+    accesses to the datasets of the pool must be serialized using the 'lock' of the pool.
+
+    The pool exists to reuse handles, not to provide concurrency: the lock is shared by all the files (HDF5 state is
+    global to the library, so a lock per handle would not make concurrent reads safe), hence reading files from
+    several threads is not faster than reading them in sequence. Use processes for parallel reads.
+    """
+
+    def __init__(self, max_handles=64):
+        """Create a pool of netCDF handles
+
+        Parameters
+        ----------
+        max_handles : int
+            Maximum number of open handles
+        """
+
+        if max_handles < 1:
+            raise ValueError("'max_handles' must be greater than 0")
+
+        self._max_handles = max_handles
+        self._handles = OrderedDict()
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def lock(self):
+        """Return the lock used to serialize HDF5 accesses
+        """
+        return self._lock
+
+    @property
+    def max_handles(self):
+        return self._max_handles
+
+    @max_handles.setter
+    def max_handles(self, value):
+        if value < 1:
+            raise ValueError("'max_handles' must be greater than 0")
+        with self._lock:
+            self._max_handles = value
+            self.__evict__()
+
+    @property
+    def open_handles(self):
+        with self._lock:
+            return len(self._handles)
+
+    @property
+    def stats(self):
+        """Return statistics of the pool
+
+        Return
+        ------
+        dict
+            Number of open handles, hits, misses and evictions
+        """
+        with self._lock:
+            return {"open_handles": len(self._handles),
+                    "hits": self._hits,
+                    "misses": self._misses,
+                    "evictions": self._evictions}
+
+    def acquire(self, fname):
+        """Retrieve an open dataset for a file (the file is opened if it is not already in the pool). Each call to
+        acquire must be followed by a call to release
+
+        Parameters
+        ----------
+        fname : str
+            netCDF file
+
+        Return
+        ------
+        netCDF4.Dataset
+            Open dataset
+        """
+
+        key = os.path.abspath(fname)
+        with self._lock:
+            self.__check_process__()
+            # netCDF4 is imported on first use to keep the package import light
+            import netCDF4 as nc
+            if key in self._handles:
+                self._hits += 1
+                self._handles.move_to_end(key)
+                entry = self._handles[key]
+                if not entry[0].isopen():
+                    entry[0] = nc.Dataset(key, "r")
+            else:
+                self._misses += 1
+                entry = [nc.Dataset(key, "r"), 0]
+                self._handles[key] = entry
+            entry[1] += 1
+            self.__evict__()
+
+            return entry[0]
+
+    def release(self, fname):
+        """Release a dataset previously acquired. The dataset stays open in the pool until it is evicted
+
+        Parameters
+        ----------
+        fname : str
+            netCDF file
+        """
+
+        key = os.path.abspath(fname)
+        with self._lock:
+            if key in self._handles:
+                entry = self._handles[key]
+                entry[1] = max(entry[1] - 1, 0)
+                self.__evict__()
+
+    @contextmanager
+    def dataset(self, fname):
+        """Context manager that acquires a dataset and holds the lock of the pool
+
+        Parameters
+        ----------
+        fname : str
+            netCDF file
+
+        Yield
+        -----
+        netCDF4.Dataset
+            Open dataset
+        """
+
+        with self._lock:
+            dataset = self.acquire(fname)
+            try:
+                yield dataset
+            finally:
+                self.release(fname)
+
+    def discard(self, fname):
+        """Close the handle of a file (e.g. before the file is rewritten)
+
+        Parameters
+        ----------
+        fname : str
+            netCDF file
+        """
+
+        key = os.path.abspath(fname)
+        with self._lock:
+            if key in self._handles:
+                if self._handles[key][1] > 0:
+                    raise RuntimeError("File %s is in use" % fname)
+                self.__close_handle__(key)
+
+    def close_all(self):
+        """Close all the unused handles of the pool
+        """
+        with self._lock:
+            for key in list(self._handles.keys()):
+                if self._handles[key][1] == 0:
+                    self.__close_handle__(key)
+
+    def __evict__(self):
+        """Close least recently used unused handles until the limit is satisfied
+        """
+        excess = len(self._handles) - self._max_handles
+        if excess > 0:
+            for key in list(self._handles.keys()):
+                if excess == 0:
+                    break
+                if self._handles[key][1] == 0:
+                    self.__close_handle__(key)
+                    self._evictions += 1
+                    excess -= 1
+
+    def __close_handle__(self, key):
+        """Close and remove a handle
+        """
+        dataset = self._handles.pop(key)[0]
+        if dataset.isopen():
+            dataset.close()
+
+    def __check_process__(self):
+        """Drop handles inherited from a parent process (HDF5 handles must not be shared across fork)
+        """
+        if os.getpid() != self._pid:
+            self._handles = OrderedDict()
+            self._pid = os.getpid()
+
+
+_default_pool = NetCDFHandlePool()
+
+
+def get_pool():
+    """Retrieve the pool of netCDF handles shared by all the loaders
+
+    Return
+    ------
+    NetCDFHandlePool
+        Shared pool
+    """
+    return _default_pool
+
+
+def set_max_handles(max_handles):
+    """Set the maximum number of open handles of the shared pool
+
+    Parameters
+    ----------
+    max_handles : int
+        Maximum number of open handles
+    """
+    _default_pool.max_handles = max_handles
+
+
+def _reset_default_pool():
+    """Reset the shared pool in a child process (handles and lock must not be shared across fork)
+    """
+    _default_pool._lock = threading.RLock()
+    _default_pool._handles = OrderedDict()
+    _default_pool._pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_default_pool)
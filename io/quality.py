@@ -0,0 +1,122 @@
+import logging
+import numpy as np
+
+
+# Comparison operators available in quality rules
+_OPERATORS = {"<": np.less,
+              "<=": np.less_equal,
+              ">": np.greater,
+              ">=": np.greater_equal,
+              "==": np.equal,
+              "!=": np.not_equal,
+              "in": np.isin}
+
+
+class QualityFilter:
+    """Object to handle quality filters applied to SWOT observations while they are loaded
+    """
+
+    def __init__(self, rules):
+        """Create a quality filter from a set of rules. An observation passes the filter if it satisfies all the rules
+
+        Parameters
+        ----------
+        rules : dict
+            Dictionary varname -> (operator, value), with operator in '<', '<=', '>', '>=', '==', '!=' or 'in'. For
+            instance {"reach_q": ("<=", 1), "dark_frac": ("<=", 0.5), "ice_clim_f": ("==", 0)}
+        """
+
+        for varname, rule in rules.items():
+            if len(rule) != 2 or rule[0] not in _OPERATORS:
+                raise ValueError("Wrong rule for variable %s: %s" % (varname, repr(rule)))
+
+        self._rules = dict(rules)
+        self._missing_variables = set()
+
+    @classmethod
+    def default(cls, level="reach"):
+        """Create the default Confluence quality filter (good or suspect observations, moderate dark water fraction,
+        good crossover calibration and no ice)
+
+        Parameters
+        ----------
+        level : str
+            Data level, must be 'reach' or 'node'
+
+        Return
+        ------
+        QualityFilter
+            Quality filter
+        """
+
+        if level == "reach":
+            quality_variable = "reach_q"
+        elif level == "node":
+            quality_variable = "node_q"
+        else:
+            raise ValueError("'level' must be reach or node")
+
+        return cls({quality_variable: ("<=", 1),
+                    "dark_frac": ("<=", 0.5),
+                    "xovr_cal_q": ("<=", 1),
+                    "ice_clim_f": ("==", 0),
+                    "ice_dyn_f": ("==", 0)})
+
+    @property
+    def rules(self):
+        return self._rules
+
+    @property
+    def variables(self):
+        return list(self._rules.keys())
+
+    def evaluate(self, group, indices=None):
+        """Evaluate the filter on a group of a Confluence dataset. Only the quality variables are read
+
+        Parameters
+        ----------
+        group : netCDF4.Group
+            Group containing the quality variables
+        indices : numpy.ndarray or None
+            Indices (along the first dimension) of the observations to evaluate. Default is None (evaluate all)
+
+        Return
+        ------
+        numpy.ndarray or None
+            Boolean array, True for observations that pass the filter. None if none of the quality variables are
+            found in the group (a warning is logged the first time each missing variable is met)
+        """
+
+        mask = None
+        for varname, (operator, value) in self._rules.items():
+
+            if varname not in group.variables:
+                # Warn once per variable (evaluate is called for each block of nodes)
+                if varname not in self._missing_variables:
+                    self._missing_variables.add(varname)
+                    logging.getLogger("swotviz").warning("Quality variable %s not found, rule ignored" % varname)
+                continue
+
+            if indices is None:
+                array = group.variables[varname][:]
+            else:
+                array = group.variables[varname][indices]
+
+            # Masked (fill) values never pass the filter
+            if isinstance(array, np.ma.core.MaskedArray):
+                valid = ~np.ma.getmaskarray(array)
+                array = array.data
+            else:
+                valid = np.ones(array.shape, dtype=bool)
+            rule_mask = valid & _OPERATORS[operator](array, value)
+
+            if mask is None:
+                mask = rule_mask
+            else:
+                mask &= rule_mask
+
+        return mask
+
+    def __repr__(self):
+        return "QualityFilter(%s)" % " and ".join(["%s %s %s" % (varname, operator, repr(value))
+                                                    for varname, (operator, value) in self._rules.items()])
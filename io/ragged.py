@@ -0,0 +1,373 @@
+import numpy as np
+
+
+class RaggedArray:
+    """Object to handle sparse (reach x time) series as contiguous ragged arrays
+
+    The series of all the rows (reaches) are stored one after the other in a single array of values (and times),
+    the series of row i being values[offsets[i]:offsets[i+1]]. Memory is proportional to the number of observations
+    instead of (number of reaches) x (number of times).
+    """
+
+    def __init__(self, values, offsets, times=None, ids=None):
+        """Create a ragged array
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            Values of all the series, shape (number of observations,)
+        offsets : numpy.ndarray
+            Offsets of the series, shape (number of rows + 1,), with offsets[0] = 0 and offsets[-1] = number of
+            observations
+        times : numpy.ndarray or None
+            Times of the observations, shape (number of observations,)
+        ids : numpy.ndarray or None
+            Identifiers of the rows (e.g. reach_id), shape (number of rows,)
+        """
+
+        self._values = np.asarray(values)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        if self._offsets.ndim != 1 or self._offsets.size == 0 or self._offsets[0] != 0 or \
+                self._offsets[-1] != self._values.size or np.any(np.diff(self._offsets) < 0):
+            raise ValueError("'offsets' must be increasing, start at 0 and end at the number of values")
+        if times is not None:
+            times = np.asarray(times)
+            if times.shape != self._values.shape:
+                raise ValueError("'times' must have the same shape as 'values'")
+        self._times = times
+        if ids is not None:
+            ids = np.asarray(ids)
+            if ids.size != self._offsets.size - 1:
+                raise ValueError("'ids' must have one element per row")
+        self._ids = ids
+
+    @classmethod
+    def from_dense(cls, array, times=None, ids=None):
+        """Create a ragged array from a dense (rows x times) array, keeping only finite values
+
+        Parameters
+        ----------
+        array : numpy.ndarray
+            Dense array, shape (number of rows, number of times). Masked values and NaN are discarded
+        times : numpy.ndarray or None
+            Times of the columns, shape (number of times,), or of each value, shape (number of rows, number of times)
+        ids : numpy.ndarray or None
+            Identifiers of the rows
+
+        Return
+        ------
+        RaggedArray
+            Ragged array
+        """
+
+        array = np.ma.filled(np.ma.asarray(array, dtype=np.float64), np.nan)
+        if array.ndim != 2:
+            raise ValueError("'array' must be two-dimensional")
+        valid = np.isfinite(array)
+        offsets = np.zeros(array.shape[0] + 1, dtype=np.int64)
+        np.cumsum(valid.sum(axis=1), out=offsets[1:])
+        if times is not None:
+            times = np.asarray(times)
+            if times.ndim == 1:
+                times = np.broadcast_to(times, array.shape)
+            times = times[valid]
+
+        return cls(array[valid], offsets, times, ids)
+
+    @classmethod
+    def from_lists(cls, values_list, times_list=None, ids=None):
+        """Create a ragged array from lists of series
+
+        Parameters
+        ----------
+        values_list : list
+            List of arrays of values (one per row)
+        times_list : list or None
+            List of arrays of times (one per row)
+        ids : numpy.ndarray or None
+            Identifiers of the rows
+
+        Return
+        ------
+        RaggedArray
+            Ragged array
+        """
+
+        lengths = np.array([np.size(values) for values in values_list], dtype=np.int64)
+        offsets = np.zeros(lengths.size + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if len(values_list) > 0:
+            values = np.concatenate([np.ravel(values) for values in values_list])
+        else:
+            values = np.zeros(0)
+        times = None
+        if times_list is not None:
+            if len(times_list) > 0:
+                times = np.concatenate([np.ravel(times) for times in times_list])
+            else:
+                times = np.zeros(0)
+
+        return cls(values, offsets, times, ids)
+
+    @classmethod
+    def from_dataframe(cls, dataframe, id_column, value_column, time_column=None):
+        """Create a ragged array from a long DataFrame (one row per observation)
+
+        Parameters
+        ----------
+        dataframe : pandas.DataFrame
+            Long DataFrame
+        id_column : str
+            Column of the identifiers of the series
+        value_column : str
+            Column of the values
+        time_column : str or None
+            Column of the times
+
+        Return
+        ------
+        RaggedArray
+            Ragged array (rows sorted by identifier, observations sorted by time)
+        """
+
+        sort_columns = [id_column] if time_column is None else [id_column, time_column]
+        dataframe = dataframe.sort_values(sort_columns, kind="stable")
+        row_ids = dataframe[id_column].to_numpy()
+        ids, starts = np.unique(row_ids, return_index=True)
+        offsets = np.append(starts, row_ids.size).astype(np.int64)
+        times = None if time_column is None else dataframe[time_column].to_numpy()
+
+        return cls(dataframe[value_column].to_numpy(), offsets, times, ids)
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    @property
+    def times(self):
+        return self._times
+
+    @property
+    def ids(self):
+        return self._ids
+
+    @property
+    def n_rows(self):
+        return self._offsets.size - 1
+
+    @property
+    def lengths(self):
+        """Return the number of observations of each row
+        """
+        return np.diff(self._offsets)
+
+    @property
+    def nbytes(self):
+        nbytes = self._values.nbytes + self._offsets.nbytes
+        if self._times is not None:
+            nbytes += self._times.nbytes
+        if self._ids is not None:
+            nbytes += self._ids.nbytes
+        return nbytes
+
+    def __len__(self):
+        return self.n_rows
+
+    def __repr__(self):
+        return "RaggedArray(%i rows, %i values)" % (self.n_rows, self._values.size)
+
+    def row_indices(self):
+        """Return the row index of each observation
+        """
+        return np.repeat(np.arange(self.n_rows), self.lengths)
+
+    def row(self, index):
+        """Retrieve the series of a row
+
+        Parameters
+        ----------
+        index : int
+            Index of the row
+
+        Return
+        ------
+        tuple
+            Times (None if the array has no times) and values of the row
+        """
+
+        start, stop = self._offsets[index], self._offsets[index + 1]
+        times = None if self._times is None else self._times[start:stop]
+        return times, self._values[start:stop]
+
+    def __getitem__(self, key):
+        """Select rows by index (int, slice, array of indices or boolean mask)
+
+        Return
+        ------
+        RaggedArray
+            Ragged array of the selected rows
+        """
+
+        # Normalize the key to an array of (non-negative) row indices
+        key = np.atleast_1d(np.arange(self.n_rows)[key])
+
+        # Gather observations of the selected rows in a vectorized way
+        starts = self._offsets[key]
+        lengths = self._offsets[key + 1] - starts
+        offsets = np.zeros(key.size + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        times = None if self._times is None else self._times[positions]
+        ids = None if self._ids is None else self._ids[key]
+
+        return RaggedArray(self._values[positions], offsets, times, ids)
+
+    def select(self, ids):
+        """Select rows by identifier
+
+        Parameters
+        ----------
+        ids : iterable
+            Identifiers of the rows
+
+        Return
+        ------
+        RaggedArray
+            Ragged array of the selected rows (in the order of ids)
+        """
+
+        if self._ids is None:
+            raise RuntimeError("Ragged array has no identifiers")
+        ids = np.atleast_1d(ids)
+        order = np.argsort(self._ids, kind="stable")
+        pos = np.minimum(np.searchsorted(self._ids, ids, sorter=order), max(order.size - 1, 0))
+        found = self._ids[order[pos]] == ids
+        if not np.all(found):
+            raise RuntimeError("Identifier %s not found" % str(ids[~found][0]))
+        return self[order[pos]]
+
+    def reduce(self, how="mean"):
+        """Compute a reduction of each row (NaN values are ignored)
+
+        Parameters
+        ----------
+        how : str
+            Reduction: 'count', 'sum', 'mean', 'std', 'min', 'max', 'first' or 'last'
+
+        Return
+        ------
+        numpy.ndarray
+            Reduced values, shape (number of rows,). NaN for rows without valid observations (0 for 'count')
+        """
+
+        values = self._values.astype(np.float64)
+        valid = np.isfinite(values)
+        rows = self.row_indices()
+        count = np.bincount(rows[valid], minlength=self.n_rows).astype(np.float64)
+        if how == "count":
+            return count.astype(np.int64)
+
+        result = np.full(self.n_rows, np.nan)
+        has_values = count > 0
+        if how in ["sum", "mean", "std"]:
+            sums = np.bincount(rows[valid], values[valid], minlength=self.n_rows)
+            if how == "sum":
+                result[has_values] = sums[has_values]
+            else:
+                result[has_values] = sums[has_values] / count[has_values]
+                if how == "std":
+                    deviations = (values[valid] - result[rows[valid]])**2
+                    squares = np.bincount(rows[valid], deviations, minlength=self.n_rows)
+                    result[has_values] = np.sqrt(squares[has_values] / count[has_values])
+        elif how in ["min", "max"]:
+            ufunc = np.fmin if how == "min" else np.fmax
+            lengths = self.lengths
+            nonempty = lengths > 0
+            if np.any(nonempty):
+                reduced = ufunc.reduceat(values, self._offsets[:-1][nonempty])
+                result[nonempty] = reduced
+            result[~has_values] = np.nan
+        elif how in ["first", "last"]:
+            positions = np.flatnonzero(valid)
+            if how == "first":
+                selected = np.unique(rows[positions], return_index=True)
+            else:
+                reversed_positions = positions[::-1]
+                selected = np.unique(rows[reversed_positions], return_index=True)
+                positions = reversed_positions
+            result[selected[0]] = values[positions[selected[1]]]
+        else:
+            raise ValueError("Unknown reduction: %s" % how)
+
+        return result
+
+    def count(self):
+        return self.reduce("count")
+
+    def mean(self):
+        return self.reduce("mean")
+
+    def min(self):
+        return self.reduce("min")
+
+    def max(self):
+        return self.reduce("max")
+
+    def to_dense(self, time_grid=None, fill_value=np.nan):
+        """Convert to a dense (rows x times) array
+
+        Parameters
+        ----------
+        time_grid : numpy.ndarray or None
+            Times of the columns. Default is None (sorted unique times of the observations, or position in the row
+            if the array has no times). Observations whose time is not in the grid are discarded
+        fill_value : float
+            Value for missing observations
+
+        Return
+        ------
+        tuple
+            Dense array, shape (number of rows, number of times), and times of the columns
+        """
+
+        rows = self.row_indices()
+        if self._times is None:
+            columns = np.arange(self._values.size) - np.repeat(self._offsets[:-1], self.lengths)
+            time_grid = np.arange(self.lengths.max() if self.n_rows > 0 else 0)
+            valid = np.ones(self._values.size, dtype=bool)
+        else:
+            if time_grid is None:
+                time_grid = np.unique(self._times)
+            time_grid = np.asarray(time_grid)
+            columns = np.minimum(np.searchsorted(time_grid, self._times), max(time_grid.size - 1, 0))
+            valid = time_grid[columns] == self._times if time_grid.size > 0 else np.zeros(rows.size, dtype=bool)
+
+        dense = np.full((self.n_rows, time_grid.size), fill_value, dtype=np.float64)
+        dense[rows[valid], columns[valid]] = self._values[valid]
+        return dense, time_grid
+
+    def to_dataframe(self, id_name="reach_id", time_name="time", value_name="value"):
+        """Convert to a long DataFrame (one row per observation)
+
+        Return
+        ------
+        pandas.DataFrame
+            DataFrame with columns identifier (or row index), time (if any) and value
+        """
+
+        import pandas as pd
+
+        rows = self.row_indices()
+        data = {}
+        if self._ids is not None:
+            data[id_name] = self._ids[rows]
+        else:
+            data["row"] = rows
+        if self._times is not None:
+            data[time_name] = self._times
+        data[value_name] = self._values
+        return pd.DataFrame(data)
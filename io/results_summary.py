@@ -0,0 +1,471 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .pool import get_pool
+from .ragged import RaggedArray
+
+
+# Discharge variable of each algorithm group in the results files
+DISCHARGE_VARIABLES = {"hivdi": "Q",
+                       "momma": "Q",
+                       "sad": "Qa",
+                       "sic4dvar": "Q_da",
+                       "metroman": "allq",
+                       "neobam": "q",
+                       "consensus": "consensus_q"}
+
+
+class ResultsSummary:
+    """Object to handle per-reach, per-algorithm summary statistics of a results file, stored in a small sidecar file
+    """
+
+    def __init__(self, fname):
+        """Load a summary sidecar file
+
+        Parameters
+        ----------
+        fname : str
+            Sidecar file (netCDF) written by ResultsSummary.build
+        """
+
+        self._fname = fname
+
+        with get_pool().dataset(fname) as dataset:
+            self._source = dataset.source
+            self._source_size = int(dataset.source_size)
+            self._source_mtime = float(dataset.source_mtime)
+            variables_dict = {"reach_id": dataset.variables["reach_id"][:]}
+            self._algorithms = []
+            for algorithm in dataset.groups:
+                self._algorithms.append(algorithm)
+                group = dataset.groups[algorithm]
+                for statistic in group.variables:
+                    variables_dict["%s_%s" % (algorithm, statistic)] = group.variables[statistic][:]
+
+        for name in variables_dict:
+            if isinstance(variables_dict[name], np.ma.core.MaskedArray):
+                variables_dict[name] = variables_dict[name].filled(np.nan)
+        self._dataset = pd.DataFrame(data=variables_dict).set_index("reach_id")
+
+    @classmethod
+    def build(cls, results_fname, sidecar_fname=None, algorithms=None, percentiles=(10, 50, 90), chunk_size=10000):
+        """Compute the summary statistics of a results file and write them in a sidecar file. The results file is
+        read by chunks of reaches so that memory usage does not depend on the size of the file
+
+        For each algorithm, the statistics are: number of valid discharge values (finite and strictly positive),
+        availability (1 if at least one valid value, 0 otherwise), mean, min, max and percentiles of the valid values
+
+        Parameters
+        ----------
+        results_fname : str
+            Results file
+        sidecar_fname : str or None
+            Sidecar file. Default is None (results file name with extension .summary.nc)
+        algorithms : dict or None
+            Dictionary algorithm group -> discharge variable. Default is None (algorithms of DISCHARGE_VARIABLES
+            found in the file)
+        percentiles : iterable
+            Percentiles to compute, named 'p' followed by the percentile with '.' replaced by '_' (e.g. 'p2_5')
+        chunk_size : int
+            Number of reaches read at a time
+
+        Return
+        ------
+        ResultsSummary
+            Summary loaded from the sidecar file
+        """
+
+        import netCDF4 as nc
+
+        if sidecar_fname is None:
+            sidecar_fname = default_sidecar_fname(results_fname)
+        names = _percentile_names(percentiles)
+        if len(set(names)) != len(names):
+            raise ValueError("Duplicated percentiles: %s" % ", ".join(names))
+        statistics = ["n_valid", "available", "mean", "min", "max"] + names
+
+        pool = get_pool()
+        with pool.dataset(results_fname) as dataset:
+            reach_id = dataset.groups["reaches"].variables["reach_id"][:]
+            num_reaches = reach_id.size
+            if algorithms is None:
+                algorithms = {algorithm: varname for algorithm, varname in DISCHARGE_VARIABLES.items()
+                              if algorithm in dataset.groups and varname in dataset.groups[algorithm].variables}
+
+        # Compute statistics chunk by chunk
+        summaries = {algorithm: {statistic: np.full(num_reaches, np.nan) for statistic in statistics}
+                     for algorithm in algorithms}
+        for start in range(0, num_reaches, chunk_size):
+            stop = min(start + chunk_size, num_reaches)
+            for algorithm, varname in algorithms.items():
+                with pool.dataset(results_fname) as dataset:
+                    data = dataset.groups[algorithm].variables[varname][start:stop]
+                summary = summaries[algorithm]
+                for statistic, values in _chunk_statistics(data, percentiles).items():
+                    summary[statistic][start:stop] = values
+
+        # Write sidecar file
+        stat = os.stat(results_fname)
+        pool.discard(sidecar_fname)
+        sidecar = nc.Dataset(sidecar_fname, "w")
+        try:
+            sidecar.source = os.path.abspath(results_fname)
+            sidecar.source_size = stat.st_size
+            sidecar.source_mtime = stat.st_mtime
+            sidecar.createDimension("num_reaches", num_reaches)
+            variable = sidecar.createVariable("reach_id", "i8", ("num_reaches",))
+            variable[:] = np.ma.filled(reach_id, 0)
+            for algorithm in algorithms:
+                group = sidecar.createGroup(algorithm)
+                group.discharge_variable = algorithms[algorithm]
+                for statistic in statistics:
+                    if statistic in ["n_valid", "available"]:
+                        variable = group.createVariable(statistic, "i4", ("num_reaches",))
+                    else:
+                        variable = group.createVariable(statistic, "f4", ("num_reaches",), fill_value=np.nan)
+                    variable[:] = summaries[algorithm][statistic]
+        finally:
+            sidecar.close()
+
+        return cls(sidecar_fname)
+
+    @classmethod
+    def open(cls, results_fname, sidecar_fname=None, **kwargs):
+        """Load the sidecar file of a results file, building it if it does not exist or is out of date
+
+        Parameters
+        ----------
+        results_fname : str
+            Results file
+        sidecar_fname : str or None
+            Sidecar file. Default is None (results file name with extension .summary.nc)
+        kwargs : dict
+            Supplementary arguments for ResultsSummary.build
+
+        Return
+        ------
+        ResultsSummary
+            Summary of the results file
+        """
+
+        if sidecar_fname is None:
+            sidecar_fname = default_sidecar_fname(results_fname)
+        if os.path.isfile(sidecar_fname):
+            summary = cls(sidecar_fname)
+            if not summary.is_stale():
+                return summary
+        return cls.build(results_fname, sidecar_fname, **kwargs)
+
+    @property
+    def dataset(self):
+        """Return the summary table (indexed by reach_id, one column per algorithm and statistic)
+        """
+        return self._dataset
+
+    @property
+    def algorithms(self):
+        return self._algorithms
+
+    def is_stale(self):
+        """Check if the results file has changed (or is missing) since the sidecar file was built
+
+        Return
+        ------
+        bool
+            True if the sidecar file is out of date
+        """
+        if not os.path.isfile(self._source):
+            return True
+        stat = os.stat(self._source)
+        return stat.st_size != self._source_size or stat.st_mtime != self._source_mtime
+
+    def get_statistic(self, statistic, algorithms=None):
+        """Retrieve a statistic for several algorithms
+
+        Parameters
+        ----------
+        statistic : str
+            Name of the statistic (n_valid, available, mean, min, max, p10...)
+        algorithms : list or None
+            List of algorithms. Default is None (all algorithms)
+
+        Return
+        ------
+        pandas.DataFrame
+            Table of the statistic indexed by reach_id, one column per algorithm
+        """
+
+        if algorithms is None:
+            algorithms = self._algorithms
+        table = self._dataset[["%s_%s" % (algorithm, statistic) for algorithm in algorithms]]
+        table.columns = algorithms
+        return table
+
+    def availability(self, algorithms=None):
+        """Retrieve the availability of valid discharge for several algorithms
+
+        Parameters
+        ----------
+        algorithms : list or None
+            List of algorithms. Default is None (all algorithms)
+
+        Return
+        ------
+        pandas.DataFrame
+            Table indexed by reach_id with one column (0/1) per algorithm and the number of algorithms with valid
+            discharge in column 'n_algorithms'
+        """
+
+        table = self.get_statistic("available", algorithms)
+        table = table.assign(n_algorithms=table.sum(axis=1))
+        return table
+
+
+class ResultsNetCDF:
+    """Object to handle a results file with the same interface as SosNetCDF (dataset, get_reach), e.g. for the
+    continent files of a mosaic (see SosMosaic)
+
+    The dataset is the summary table of the file (see ResultsSummary, the sidecar file is built if necessary), so that
+    the discharge time series are not loaded: they are read on demand with discharge (see read_discharge)
+    """
+
+    def __init__(self, fname, level="reaches", reaches_list=None, **kwargs):
+        """Load the summary of a results file
+
+        Parameters
+        ----------
+        fname : str
+            Results file
+        level : str
+            Data level, must be 'reaches'
+        reaches_list : list or None
+            List of reaches to keep. Default is None (keep all the reaches in the file)
+        kwargs : dict
+            Supplementary arguments for ResultsSummary.open (e.g. sidecar_fname or algorithms)
+        """
+
+        if level != "reaches":
+            raise ValueError("'level' must be reaches (results files are given by reach)")
+        self._fname = fname
+        self._summary = ResultsSummary.open(fname, **kwargs)
+        dataset = self._summary.dataset.reset_index()
+        if reaches_list is not None:
+            dataset = dataset[np.isin(dataset["reach_id"], reaches_list)].reset_index(drop=True)
+        self._dataset = dataset
+
+    @property
+    def dataset(self):
+        """Return the summary table (one row per reach, column 'reach_id' and one column per algorithm and statistic)
+        """
+        return self._dataset
+
+    @property
+    def summary(self):
+        return self._summary
+
+    @property
+    def algorithms(self):
+        return self._summary.algorithms
+
+    def get_reach(self, reach_id):
+        """Retrieve the summary of a reach
+
+        Parameters
+        ----------
+        reach_id : int
+            Identifier of the reach
+
+        Return
+        ------
+        pandas.DataFrame
+            Summary of the reach
+        """
+
+        reach_dataset = self._dataset[self._dataset["reach_id"] == reach_id]
+        if reach_dataset.shape[0] == 0:
+            raise RuntimeError("Reach %i not found" % reach_id)
+        return reach_dataset
+
+    def discharge(self, algorithm, varname=None, chunk_size=10000):
+        """Read the discharge of an algorithm for the reaches of the dataset
+
+        Parameters
+        ----------
+        algorithm : str
+            Algorithm group
+        varname : str or None
+            Discharge variable. Default is None (variable of the algorithm in DISCHARGE_VARIABLES)
+        chunk_size : int
+            Number of reaches read at a time
+
+        Return
+        ------
+        RaggedArray
+            Discharge, one row per reach of the dataset (see read_discharge)
+        """
+        if self._dataset.shape[0] == self._summary.dataset.shape[0]:
+            reach_ids = None
+        else:
+            reach_ids = self._dataset["reach_id"].to_numpy()
+        return read_discharge(self._fname, algorithm, varname, reach_ids, chunk_size)
+
+
+def read_discharge(results_fname, algorithm, varname=None, reach_ids=None, chunk_size=10000):
+    """Read the discharge of an algorithm in a results file as a ragged array. The file is read by chunks of reaches
+    and only the valid values (finite and strictly positive) are kept
+
+    Parameters
+    ----------
+    results_fname : str
+        Results file
+    algorithm : str
+        Algorithm group
+    varname : str or None
+        Discharge variable. Default is None (variable of the algorithm in DISCHARGE_VARIABLES)
+    reach_ids : iterable or None
+        Identifiers of the reaches to read. Default is None (all reaches)
+    chunk_size : int
+        Number of reaches read at a time
+
+    Return
+    ------
+    RaggedArray
+        Discharge (one row per reach, identifiers are the reach_id). Times are read in the variable 't' or 'time' of
+        the algorithm group (or 'time' of the reaches group) if it exists
+    """
+
+    if varname is None:
+        varname = DISCHARGE_VARIABLES[algorithm]
+
+    pool = get_pool()
+    with pool.dataset(results_fname) as dataset:
+        all_reach_ids = np.ma.filled(dataset.groups["reaches"].variables["reach_id"][:], 0)
+        group = dataset.groups[algorithm]
+        if varname not in group.variables:
+            raise ValueError("Variable %s not found in group %s" % (varname, algorithm))
+        time_variable = find_time_variable(dataset, algorithm)
+
+    # Rows to read (sorted so that chunks are contiguous in the file)
+    if reach_ids is None:
+        rows = np.arange(all_reach_ids.size)
+    else:
+        reach_ids = np.atleast_1d(reach_ids)
+        order = np.argsort(all_reach_ids, kind="stable")
+        pos = np.minimum(np.searchsorted(all_reach_ids, reach_ids, sorter=order), max(order.size - 1, 0))
+        found = all_reach_ids[order[pos]] == reach_ids
+        if not np.all(found):
+            raise ValueError("Reach %i not found in %s" % (reach_ids[~found][0], results_fname))
+        rows = order[pos]
+    sorted_rows = np.unique(rows)
+
+    values_list = []
+    times_list = []
+    lengths = np.zeros(sorted_rows.size, dtype=np.int64)
+    for start in range(0, sorted_rows.size, chunk_size):
+        chunk_rows = sorted_rows[start:start + chunk_size]
+        if chunk_rows[-1] - chunk_rows[0] + 1 == chunk_rows.size:
+            index = slice(chunk_rows[0], chunk_rows[-1] + 1)
+        else:
+            index = chunk_rows
+        with pool.dataset(results_fname) as dataset:
+            data = dataset.groups[algorithm].variables[varname][index]
+            if time_variable is not None:
+                variable = dataset.groups[time_variable[0]].variables[time_variable[1]]
+                times = variable[index] if variable.ndim == 2 else variable[:]
+        data = np.ma.filled(np.ma.asarray(data, dtype=np.float64), np.nan)
+        if data.ndim == 1:
+            data = data[:, np.newaxis]
+        if time_variable is not None:
+            times = np.broadcast_to(np.ma.filled(np.ma.asarray(times, dtype=np.float64), np.nan), data.shape)
+        else:
+            times = np.broadcast_to(np.arange(data.shape[1], dtype=np.float64), data.shape)
+        valid = np.isfinite(data) & (data > 0)
+        values_list.append(data[valid])
+        times_list.append(times[valid])
+        lengths[start:start + chunk_rows.size] = valid.sum(axis=1)
+
+    offsets = np.zeros(sorted_rows.size + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    values = np.concatenate(values_list) if len(values_list) > 0 else np.zeros(0)
+    times = np.concatenate(times_list) if len(times_list) > 0 else np.zeros(0)
+    discharge = RaggedArray(values, offsets, times, all_reach_ids[sorted_rows])
+
+    # Restore the order of the requested reaches
+    if reach_ids is not None:
+        discharge = discharge[np.searchsorted(sorted_rows, rows)]
+    return discharge
+
+
+def find_time_variable(dataset, algorithm):
+    """Find the time variable of an algorithm in a results file: variable 't' or 'time' of the algorithm group, or
+    variable 'time' of the reaches group
+
+    Parameters
+    ----------
+    dataset : netCDF4.Dataset
+        Results dataset
+    algorithm : str
+        Algorithm group
+
+    Return
+    ------
+    tuple or None
+        Group and name of the time variable (None if not found)
+    """
+    for time_group, time_varname in [(algorithm, "t"), (algorithm, "time"), ("reaches", "time")]:
+        if time_varname in dataset.groups[time_group].variables:
+            return (time_group, time_varname)
+    return None
+
+
+def default_sidecar_fname(results_fname):
+    """Retrieve the default sidecar file name of a results file
+
+    Parameters
+    ----------
+    results_fname : str
+        Results file
+
+    Return
+    ------
+    str
+        Sidecar file name
+    """
+    return "%s.summary.nc" % os.path.splitext(results_fname)[0]
+
+
+def _percentile_names(percentiles):
+    """Names of the statistics of percentiles, keeping the fractional part (e.g. 'p2_5' for the 2.5th percentile)
+    """
+    return [("p%g" % p).replace(".", "_") for p in percentiles]
+
+
+def _chunk_statistics(data, percentiles):
+    """Compute the statistics of a chunk of discharge values, shape (number of reaches, number of times)
+    """
+
+    data = np.ma.filled(np.ma.asarray(data, dtype=np.float64), np.nan)
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+
+    valid = np.isfinite(data) & (data > 0)
+    n_valid = valid.sum(axis=1)
+    values = np.where(valid, data, np.nan)
+    has_values = n_valid > 0
+
+    statistics = {"n_valid": n_valid, "available": has_values.astype(np.int32)}
+    for name in ["mean", "min", "max"] + _percentile_names(percentiles):
+        statistics[name] = np.full(data.shape[0], np.nan)
+    if np.any(has_values):
+        values = values[has_values]
+        statistics["mean"][has_values] = np.nanmean(values, axis=1)
+        statistics["min"][has_values] = np.nanmin(values, axis=1)
+        statistics["max"][has_values] = np.nanmax(values, axis=1)
+        if len(percentiles) > 0:
+            results = np.nanpercentile(values, percentiles, axis=1)
+            for index, name in enumerate(_percentile_names(percentiles)):
+                statistics[name][has_values] = results[index]
+
+    return statistics
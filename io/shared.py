@@ -0,0 +1,270 @@
+from multiprocessing import shared_memory
+import os
+import uuid
+
+import numpy as np
+
+
+# Alignment (bytes) of the columns in the shared block
+_ALIGNMENT = 64
+
+
+class SharedDataset:
+    """Object to share the numeric columns of a loaded dataset between processes without copies
+
+    The columns are written once in a single block of shared memory (or a memory-mapped file) by the publishing
+    process. Workers attach to the block by name using a small picklable handle and get read-only numpy views of
+    the columns.
+
+    Example
+    -------
+    >>> shared = SharedDataset.publish(sos.dataset)            # main process
+    >>> pool.map(worker, [(shared.handle, reach_id) for reach_id in reaches])
+    >>> def worker(args):
+    ...     handle, reach_id = args
+    ...     with SharedDataset.attach(handle) as dataset:
+    ...         row = dataset.get_reach(reach_id)
+    >>> shared.unlink()                                         # main process, when workers are done
+    """
+
+    def __init__(self, handle, buffer, owner, storage=None):
+        """Create the object from a handle and a buffer (use SharedDataset.publish or SharedDataset.attach)
+        """
+
+        self._handle = handle
+        self._owner = owner
+        self._storage = storage
+
+        # Build read-only views on the buffer
+        self._arrays = {}
+        for column, dtype, offset, size in handle["layout"]:
+            array = np.ndarray((size,), dtype=np.dtype(dtype), buffer=buffer, offset=offset)
+            array.flags.writeable = False
+            self._arrays[column] = array
+
+    @classmethod
+    def publish(cls, dataset, columns=None, index="reach_id", path=None):
+        """Publish the numeric columns of a dataset
+
+        Parameters
+        ----------
+        dataset : pandas.DataFrame
+            Dataset (e.g. SosNetCDF.dataset or SwordNetCDF.dataset)
+        columns : list or None
+            List of columns to publish. Default is None (all numeric and boolean columns)
+        index : str or None
+            Column used as index for lookups (get_reach). Default is 'reach_id'
+        path : str or None
+            File used as a memory-mapped backend. Default is None (shared memory)
+
+        Return
+        ------
+        SharedDataset
+            Published dataset (owner of the shared block)
+        """
+
+        if columns is None:
+            columns = [column for column in dataset.columns if dataset[column].dtype.kind in "biuf"]
+        arrays = {}
+        for column in columns:
+            series = dataset[column]
+            if not isinstance(series.dtype, np.dtype):
+                # Nullable dtypes (e.g. Int64) and numeric categories are converted to float with NaN for missing
+                # values, whatever the version of pandas (to_numpy may return an object array otherwise)
+                try:
+                    arrays[column] = series.to_numpy(dtype=np.float64, na_value=np.nan)
+                except (TypeError, ValueError):
+                    raise ValueError("Column %s is not numeric (dtype %s)" % (column, series.dtype))
+                continue
+            if series.dtype.kind not in "biuf":
+                raise ValueError("Column %s is not numeric (dtype %s)" % (column, series.dtype))
+            arrays[column] = np.ascontiguousarray(series.to_numpy())
+
+        # Sort order of the index for lookups (computed once in the publishing process)
+        if index is not None:
+            if index not in arrays:
+                raise ValueError("Index column %s must be published" % index)
+            arrays["__order__"] = np.argsort(arrays[index], kind="stable").astype(np.int64)
+
+        # Compute layout
+        layout = []
+        offset = 0
+        for column, array in arrays.items():
+            offset = (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+            layout.append((column, array.dtype.str, offset, array.size))
+            offset += array.nbytes
+        nbytes = max(offset, 1)
+
+        # Allocate block
+        if path is None:
+            storage = shared_memory.SharedMemory(create=True, size=nbytes,
+                                                 name="sdv_%s" % uuid.uuid4().hex[0:16])
+            buffer = storage.buf
+            name = storage.name
+        else:
+            storage = np.memmap(path, dtype=np.uint8, mode="w+", shape=(nbytes,))
+            buffer = storage
+            name = os.path.abspath(path)
+        handle = {"name": name,
+                  "backend": "shm" if path is None else "memmap",
+                  "nbytes": nbytes,
+                  "index": index,
+                  "nrows": dataset.shape[0],
+                  "layout": layout}
+
+        # Copy data
+        for column, dtype, offset, size in layout:
+            target = np.ndarray((size,), dtype=np.dtype(dtype), buffer=buffer, offset=offset)
+            target[:] = arrays[column]
+        if path is not None:
+            storage.flush()
+
+        return cls(handle, buffer, owner=True, storage=storage)
+
+    @classmethod
+    def attach(cls, handle):
+        """Attach to a published dataset (zero-copy)
+
+        Parameters
+        ----------
+        handle : dict
+            Handle of the published dataset (SharedDataset.handle)
+
+        Return
+        ------
+        SharedDataset
+            Attached dataset
+        """
+
+        if handle["backend"] == "shm":
+            try:
+                # Python >= 3.13: the block is not tracked (only the publishing process destroys it)
+                storage = shared_memory.SharedMemory(name=handle["name"], track=False)
+            except TypeError:
+                # Older versions: workers started by multiprocessing share the resource tracker of the publishing
+                # process, so the block is not destroyed when a worker exits
+                storage = shared_memory.SharedMemory(name=handle["name"])
+            buffer = storage.buf
+        else:
+            storage = np.memmap(handle["name"], dtype=np.uint8, mode="r", shape=(handle["nbytes"],))
+            buffer = storage
+
+        return cls(handle, buffer, owner=False, storage=storage)
+
+    @property
+    def handle(self):
+        """Return the picklable handle used by workers to attach to the dataset
+        """
+        return self._handle
+
+    @property
+    def columns(self):
+        return [column for column in self._arrays if column != "__order__"]
+
+    @property
+    def arrays(self):
+        """Return the read-only views of the columns (dictionary column -> numpy.ndarray)
+        """
+        return {column: self._arrays[column] for column in self.columns}
+
+    @property
+    def nbytes(self):
+        return self._handle["nbytes"]
+
+    def __getitem__(self, column):
+        return self._arrays[column]
+
+    def indices(self, reach_ids):
+        """Retrieve the rows of reaches using the index column
+
+        Parameters
+        ----------
+        reach_ids : int or iterable
+            Values of the index column
+
+        Return
+        ------
+        numpy.ndarray
+            Row indices (-1 for values not found)
+        """
+
+        if self._handle["index"] is None:
+            raise RuntimeError("Dataset was published without index")
+        index = self._arrays[self._handle["index"]]
+        order = self._arrays["__order__"]
+        reach_ids = np.atleast_1d(reach_ids)
+        pos = np.searchsorted(index, reach_ids, sorter=order)
+        pos = np.minimum(pos, max(order.size - 1, 0))
+        found = index[order[pos]] == reach_ids
+        return np.where(found, order[pos], -1)
+
+    def get_reach(self, reach_id):
+        """Retrieve the values of all columns for a reach
+
+        Parameters
+        ----------
+        reach_id : int
+            Identifier of the reach
+
+        Return
+        ------
+        dict
+            Dictionary column -> value
+        """
+
+        row = self.indices(reach_id)[0]
+        if row < 0:
+            raise RuntimeError("Reach %i not found" % reach_id)
+        return {column: self._arrays[column][row] for column in self.columns}
+
+    def to_dataframe(self, columns=None):
+        """Build a DataFrame on top of the shared columns (columns are not copied when pandas allows it)
+
+        Parameters
+        ----------
+        columns : list or None
+            List of columns. Default is None (all columns)
+
+        Return
+        ------
+        pandas.DataFrame
+            Dataset
+        """
+
+        import pandas as pd
+
+        if columns is None:
+            columns = self.columns
+        return pd.DataFrame({column: self._arrays[column] for column in columns}, copy=False)
+
+    def close(self):
+        """Detach from the block. All the views of the columns (including DataFrames built with to_dataframe) must be
+        released before
+        """
+        self._arrays = {}
+        if self._storage is not None:
+            if self._handle["backend"] == "shm":
+                self._storage.close()
+            self._storage = None
+
+    def unlink(self):
+        """Close and destroy the block (publishing process only, once all workers are done)
+        """
+        if not self._owner:
+            raise RuntimeError("Only the publishing process can unlink the dataset")
+        storage = self._storage
+        self.close()
+        if self._handle["backend"] == "shm":
+            if storage is not None:
+                storage.unlink()
+            else:
+                shared_memory.SharedMemory(name=self._handle["name"]).unlink()
+        else:
+            if os.path.isfile(self._handle["name"]):
+                os.remove(self._handle["name"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
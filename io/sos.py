@@ -1,14 +1,16 @@
-import netCDF4 as nc
 import numpy as np
 import pandas as pd
-from shapely.geometry import LineString
+
+from .dtypes import assign_by_key, memory_report
+from .filters import apply_filter_expression
+from .pool import get_pool
 
 
 class SosNetCDF:
     """Object to SoS (SWORD of Science) data in netCDF4 format
     """
     
-    def __init__(self, fname, level="reaches", reaches_list=None, verbose=True):
+    def __init__(self, fname, level="reaches", reaches_list=None, filter_expr=None, dtype_policy=None, verbose=True):
         """Load Sos (SWORD of Science) data in the netCDF format
         
         Parameters
@@ -19,16 +21,51 @@ class SosNetCDF:
             Data level, must be 'reaches' or 'nodes'
         reaches_lists : list or None
             List of reaches to keep. Default is None (keep all the reaches in the file)
+        filter_expr : str, FilterExpression or None
+            Filter expression on the variables of the level group, model group (prefix 'model_') and gbpriors group
+            (prefix 'gbpriors_'), e.g. "width > 100 and n_good_obs > 10". Only the referenced variables are read to
+            evaluate it, the other variables are read for the selected rows only. Default is None (no filter)
+        dtype_policy : DtypePolicy or None
+            Policy applied to the columns of the dataset (e.g. DtypePolicy() for float32 measurements, Int64
+            identifiers and categorical names and flags). Default is None (keep the dtypes of the netCDF variables)
         verbose : bool
             True to enable verbose output (info about variables imported)
         """
 
         # Store fname and level
+        if level not in ["reaches", "nodes"]:
+            raise ValueError("'level' must be reaches or nodes")
         self._fname = fname
         self._level = level
         
-        # Open dataset
-        self._nc_dataset = nc.Dataset(fname, "r")
+        # Load dataset (the lock of the pool is held while the dataset is read, then the handle is released so that
+        # it can be evicted from the pool)
+        self._pool = get_pool()
+        with self._pool.dataset(fname) as self._nc_dataset:
+            try:
+                self.__load_dataset__(level, reaches_list, filter_expr, verbose)
+            finally:
+                self._nc_dataset = None
+
+        # Apply dtype policy
+        if dtype_policy is not None:
+            dtype_policy.apply(self._dataset)
+
+    def __load_dataset__(self, level, reaches_list, filter_expr, verbose):
+        """Load the one dimensional variables of the level, model and gbpriors groups and the GRDC and USGS data in the
+        global dataset (pandas.DataFrame)
+        
+        Parameters
+        ----------
+        level : str
+            Data level, must be 'reaches' or 'nodes'
+        reaches_lists : list or None
+            List of reaches to keep
+        filter_expr : str, FilterExpression or None
+            Filter expression (see __init__)
+        verbose : bool
+            True to enable verbose output
+        """
         
         # Select group
         group = self._nc_dataset.groups[level]
@@ -49,6 +86,16 @@ class SosNetCDF:
         else:
             raise ValueError("'level' must be reaches or nodes")
         
+        # Apply filter expression
+        if filter_expr is not None:
+            sublevel = "reach" if level == "reaches" else "node"
+            filter_groups = {"": group,
+                             "model_": self._nc_dataset.groups["model"],
+                             "gbpriors_": self._nc_dataset.groups["gbpriors"].groups[sublevel]}
+            mask = apply_filter_expression(filter_expr, filter_groups, level_dimension, mask)
+            if verbose:
+                print("%i rows selected by filter expression" % np.sum(mask))
+        
         # Initialised unextracted variables
         self._unextracted_variables = {}
         self._unextracted_variables["dataset"] = []
@@ -144,6 +191,16 @@ class SosNetCDF:
     def unextracted_variables(self):
         return self._unextracted_variables
 
+    def memory_report(self):
+        """Break down the memory used by the dataset by column and group (level, model, gbpriors, grdc, usgs)
+
+        Return
+        ------
+        pandas.DataFrame
+            Dtype and bytes of each column, indexed by (group, column) (see dtypes.memory_report)
+        """
+        return memory_report(self._dataset, default_group=self._level)
+
     def get_nc_variable(self, varname, group=None):
         """Direct access to a variable in the NetCDF dataset (may be useful for variable not extracted in the pandas dataframes)
         
@@ -157,34 +214,42 @@ class SosNetCDF:
         Return
         ------
         netCDF4.Variable
-            Extracted variable
+            Extracted variable, from the handle of the shared pool: read it right away (the handle is closed when it
+            is evicted from the pool)
         """
         
 
         if group is not None:
-            root = self._nc_dataset
-            if isinstance(group, list):
-                for i in range(0, len(group)):
-                    root = root.groups[group[i]]
-            elif isinstance(group, str):
-                root = root.groups[group]
-            else:
-                raise ValueError("'group' must be a string or a list of string")
-            
-            self._nc_dataset.close()
-            self._nc_dataset = None
-            
-            return root.variables[varname]
+            with self._pool.dataset(self._fname) as root:
+                if isinstance(group, list):
+                    for i in range(0, len(group)):
+                        root = root.groups[group[i]]
+                elif isinstance(group, str):
+                    root = root.groups[group]
+                else:
+                    raise ValueError("'group' must be a string or a list of string")
+                
+                return root.variables[varname]
         
         else:
             
             raise ValueError("group is None")
         
     def close(self):
-        
-        if self._nc_dataset is not None:
-            self._nc_dataset.close()
-            self._nc_dataset = None
+        """Kept for compatibility: the dataset is released as soon as it is loaded (the handle is kept open in the
+        shared pool until it is evicted)
+        """
+        pass
+
+    def __getstate__(self):
+        # The shared pool is not pickled (objects can be loaded in worker processes, see SosMosaic.open)
+        state = self.__dict__.copy()
+        del state["_pool"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool = get_pool()
     
     def __load_grdc_dataset__(self, reaches_list, verbose=True):
         """Load variables with dimension (num_reaches,) in the grdc group, put it in a dedicated dataset 
@@ -227,9 +292,8 @@ class SosNetCDF:
         # Create dedicated dataset
         self._grdc_dataset = pd.DataFrame(data=variables_dict)
             
-        # Merge GRDC data in global dataset
-        self._dataset = self._dataset.merge(self._grdc_dataset, left_on="reach_id", 
-                                            right_on="grdc_reach_id", how="left")
+        # Add GRDC data to the global dataset (in place, by reach_id)
+        assign_by_key(self._dataset, self._grdc_dataset, "reach_id", "grdc_reach_id")
     
     def __load_usgs_dataset__(self, reaches_list, verbose=True):
         """Load variables with dimension (num_reaches,) in the usgs group, put it in a dedicated dataset 
@@ -270,9 +334,8 @@ class SosNetCDF:
             print("%i variables extracted in usgs group" % len(variables_dict))
 
         # Create dedicated dataset
-        self._grdc_dataset = pd.DataFrame(data=variables_dict)
+        self._usgs_dataset = pd.DataFrame(data=variables_dict)
             
-        # Merge GRDC data in global dataset
-        self._dataset = self._dataset.merge(self._grdc_dataset, left_on="reach_id", 
-                                            right_on="usgs_reach_id", how="left")
+        # Add USGS data to the global dataset (in place, by reach_id)
+        assign_by_key(self._dataset, self._usgs_dataset, "reach_id", "usgs_reach_id")
         
@@ -1,14 +1,19 @@
 import geopandas as gpd
-import netCDF4 as nc
 import numpy as np
 from shapely.geometry import LineString
 
+from .cache import get_cache
+from .dtypes import memory_report
+from .filters import apply_filter_expression
+from .pool import get_pool
+from .topology import SwordTopology
+
 
 class SwordShapefile:
     """Object to handle SWORD data in shapefile format
     """
     
-    def __init__(self, fname, reaches_list=None):
+    def __init__(self, fname, reaches_list=None, dtype_policy=None):
         """Load a SWORD shapefile
         
         Parameters
@@ -17,23 +22,39 @@ class SwordShapefile:
             Sword file
         reaches_lists : list or None
             List of reaches to keep. Default is None (keep all the reaches in the file)
+        dtype_policy : DtypePolicy or None
+            Policy applied to the columns of the dataset. Default is None (keep the dtypes read from the file)
         """
         
         self._dataset = gpd.read_file(fname)
         
         if reaches_list is not None:
-            self._dataset = self._dataset[self._dataset["reach_id"].isin(reaches_list)]
+            self._dataset = self._dataset[self._dataset["reach_id"].isin(reaches_list)].copy()
+
+        if dtype_policy is not None:
+            dtype_policy.apply(self._dataset)
             
     @property
     def dataset(self):
         return self._dataset
+
+    def memory_report(self):
+        """Break down the memory used by the dataset by column
+        
+        Return
+        ------
+        pandas.DataFrame
+            Dtype and bytes of each column, indexed by (group, column) (see dtypes.memory_report)
+        """
+        return memory_report(self._dataset, group_prefixes=[], default_group="reaches")
             
 
 class SwordNetCDF:
     """Object to handle SWORD data in netCDF4 format
     """
     
-    def __init__(self, fname, level="reaches", reaches_list=None, load_geometry=False):
+    def __init__(self, fname, level="reaches", reaches_list=None, load_geometry=False, filter_expr=None,
+                 dtype_policy=None):
         """Load SWORD data in the netCDF format
         
         Parameters
@@ -46,17 +67,54 @@ class SwordNetCDF:
             True to load geometry
         reaches_lists : list or None
             List of reaches to keep. Default is None (keep all the reaches in the file)
+        filter_expr : str, FilterExpression or None
+            Filter expression on the one dimensional variables of the level group, e.g. "width > 100 and
+            reach_id // 1e7 == 7426". Only the referenced variables are read to evaluate it, the other variables are
+            read for the selected rows only. Default is None (no filter)
+        dtype_policy : DtypePolicy or None
+            Policy applied to the columns of the dataset (e.g. DtypePolicy() for float32 measurements, Int64
+            identifiers and categorical names and flags). Default is None (keep the dtypes of the netCDF variables)
         """
 
         # Store fname and level
+        if level not in ["reaches", "nodes"]:
+            raise ValueError("'level' must be reaches or nodes")
         self._fname = fname
         self._level = level
         
-        # Open dataset
-        self._nc_dataset = nc.Dataset(fname, "r")
+        # Load dataset (the lock of the pool is held while the dataset is read, then the handle is released so that
+        # it can be evicted from the pool)
+        self._pool = get_pool()
+        with self._pool.dataset(fname) as self._nc_dataset:
+            try:
+                variables_dict, geometries = self.__load_variables__(level, reaches_list, load_geometry, filter_expr)
+            finally:
+                self._nc_dataset = None
+                    
+        self._dataset = gpd.GeoDataFrame(data=variables_dict, geometry=geometries)
+                #if group.variables[variable].dimensions 
+                #variable_data =  group.variables[variable][:]
+        #self.wse = self.load_xt_variable(group, "wse")
+        #self.width = self.load_xt_variable(group, "width")
+        #self.d_x_area = self.load_xt_variable(group, "d_x_area")
+        #if level == "reach":
+            #self.slope2 = self.load_xt_variable(group, "slope2")
+            #self.slope = self.slope2
+        if dtype_policy is not None:
+            dtype_policy.apply(self._dataset)
+            
+    def __load_variables__(self, level, reaches_list, load_geometry, filter_expr):
+        """Load the one dimensional variables and the centerlines of the selected rows of a group
+
+        Return
+        ------
+        dict, list or None
+            Variables and centerlines (None if load_geometry is False)
+        """
         
-        # Select group
+        # Select group and its dimension
         group = self._nc_dataset.groups[level]
+        dimension = "num_reaches" if level == "reaches" else "num_nodes"
         
         if reaches_list is not None:
             # Retrieve reach_id
@@ -66,6 +124,9 @@ class SwordNetCDF:
         else:
             mask = None
         
+        # Apply filter expression
+        if filter_expr is not None:
+            mask = apply_filter_expression(filter_expr, {"": group}, dimension, mask)
 
         # Load one dimensional variables
         variables_dict = {}
@@ -73,7 +134,7 @@ class SwordNetCDF:
         for variable in group.variables:
             if variable not in hidden_variables:
                 #print("dimensions:", group.variables[variable].dimensions)
-                if group.variables[variable].dimensions == ("num_reaches",):
+                if group.variables[variable].dimensions == (dimension,):
                     print("adding_variable:", variable)
                     if mask is None:
                         variable_data = group.variables[variable][:]
@@ -83,42 +144,50 @@ class SwordNetCDF:
                     
         if load_geometry:
             
-            # Load centerline points
-            cl_group = self._nc_dataset.groups["centerlines"]
-            cl_x = cl_group.variables["x"][:]
-            cl_y = cl_group.variables["y"][:]
-            cl_id = cl_group.variables["cl_id"][:]
+            # Build centerlines (cached on disk, keyed on the file and the selected reaches)
+            geometries = get_cache().memoize("sword_centerlines",
+                                             lambda: self.__load_centerlines__(group, mask),
+                                             files=[self._fname],
+                                             data=[np.zeros(0, dtype=bool) if mask is None else mask],
+                                             params={"level": level})
             
-            # Compute association dict
-            cl_id2idx = {}
-            for i in range(0, cl_id.size):
-                cl_id2idx[cl_id[i]] = i
-            
-            geometries = []
-            cl_ids = group.variables["cl_ids"][:, mask]
-            #print(cl_ids)
-            
-            for index in range(0, cl_ids.shape[1]):
-                min_cl_id = cl_ids[0, index]
-                max_cl_id = cl_ids[1, index]
-                #print("reach %i: %i->%i" % (index, min_cl_id, max_cl_id))
-                coords = [(cl_x[cl_id2idx[i]], cl_y[cl_id2idx[i]]) for i in range(min_cl_id, max_cl_id+1)]
-                geometry = LineString(coords)
-                geometries.append(geometry)
-                
         else:
-            geometry = None
-                    
-        self._dataset = gpd.GeoDataFrame(data=variables_dict, geometry=geometries)
-                #if group.variables[variable].dimensions 
-                #variable_data =  group.variables[variable][:]
-        #self.wse = self.load_xt_variable(group, "wse")
-        #self.width = self.load_xt_variable(group, "width")
-        #self.d_x_area = self.load_xt_variable(group, "d_x_area")
-        #if level == "reach":
-            #self.slope2 = self.load_xt_variable(group, "slope2")
-            #self.slope = self.slope2
-            
+            geometries = None
+
+        return variables_dict, geometries
+
+    def __load_centerlines__(self, group, mask):
+        """Build the centerlines of the selected rows of a group
+        """
+        
+        # Load centerline points
+        cl_group = self._nc_dataset.groups["centerlines"]
+        cl_x = cl_group.variables["x"][:]
+        cl_y = cl_group.variables["y"][:]
+        cl_id = cl_group.variables["cl_id"][:]
+    
+        # Compute association dict
+        cl_id2idx = {}
+        for i in range(0, cl_id.size):
+            cl_id2idx[cl_id[i]] = i
+    
+        geometries = []
+        if mask is None:
+            cl_ids = group.variables["cl_ids"][:]
+        else:
+            cl_ids = group.variables["cl_ids"][:, mask]
+        #print(cl_ids)
+    
+        for index in range(0, cl_ids.shape[1]):
+            min_cl_id = cl_ids[0, index]
+            max_cl_id = cl_ids[1, index]
+            #print("reach %i: %i->%i" % (index, min_cl_id, max_cl_id))
+            coords = [(cl_x[cl_id2idx[i]], cl_y[cl_id2idx[i]]) for i in range(min_cl_id, max_cl_id+1)]
+            geometry = LineString(coords)
+            geometries.append(geometry)
+        
+        return geometries
+    
     @property
     def dataset(self):
         """Return a reference to the internal (netCDF) dataset
@@ -129,8 +198,30 @@ class SwordNetCDF:
             Reference to the internal dataset
         """
         return self._dataset
+
+    def memory_report(self):
+        """Break down the memory used by the dataset by column (geometry reported apart)
+        
+        Return
+        ------
+        pandas.DataFrame
+            Dtype and bytes of each column, indexed by (group, column) (see dtypes.memory_report)
+        """
+        return memory_report(self._dataset, group_prefixes=[], default_group=self._level)
+
+    def get_topology(self):
+        """Build the river network topology (upstream/downstream reaches) of the whole file
+        
+        Return
+        ------
+        SwordTopology
+            Topology graph
+        """
+        with self._pool.dataset(self._fname) as dataset:
+            return SwordTopology.from_group(dataset.groups["reaches"])
     
     def close(self):
-        """Close the dataset
+        """Kept for compatibility: the dataset is released as soon as it is loaded (the handle is kept open in the
+        shared pool until it is evicted)
         """
-        self._dataset.close()
+        pass
@@ -1,14 +1,26 @@
 import glob
-import netCDF4 as nc
+import logging
 import numpy as np
 import os
 
+from .pool import get_pool
+from .quality import QualityFilter
+from .ragged import RaggedArray
+
+
+# Target size (bytes) of the blocks of node x time variables read at a time
+_NODE_BLOCK_BYTES = 4 * 1024**2
+
+# Coordinate variables never set to NaN by the quality filter (in addition to times and identifiers)
+_COORDINATE_VARIABLES = ["lat", "lon", "p_lat", "p_lon", "x", "y"]
+
 
 class SwotObservations:
     """Object to handle SWOT observations data in CONFLUENCE netCDF4 format
     """
     
-    def __init__(self, fname, level="reach", sword=None, extra_variables=[]):
+    def __init__(self, fname, level="reach", sword=None, extra_variables=[], quality_filter=None, compact=False,
+                 nodes_list=None, load_defaults=True):
         """Load SWOT observations in the (netCDF) Confluence format
         
         Parameters
@@ -19,6 +31,21 @@ class SwotObservations:
             Data level, must be 'reach' or 'node'
         extra_variables : list
             List of supplementary variables to load in the file. Default is empty
+        quality_filter : QualityFilter, dict, str or None
+            Quality filter evaluated on the quality variables before loading the observations: a QualityFilter, a
+            dictionary of rules (see QualityFilter) or 'default' for the default Confluence filter. Only measurement
+            variables are filtered: times, coordinates and identifiers are kept, and the result of the filter is
+            available in 'mask' (None at node level). Default is None (no filtering)
+        compact : bool
+            True to keep only the observations that pass the quality filter (indices in the time dimension are given
+            by 'time_index'). Default is False (measurements that do not pass the filter are set to NaN). Not
+            available at node level
+        nodes_list : list or None
+            List of nodes to keep (node level only). Default is None (keep all the nodes in the file)
+        load_defaults : bool
+            True to load the default variables (wse, width, d_x_area and slope at reach level). At node level, False
+            avoids materializing all the nodes: variables can then be processed by blocks of nodes with
+            iter_node_chunks or aggregate_to_reaches
         """
 
         # Retrieve logger and append debug messages
@@ -28,31 +55,85 @@ class SwotObservations:
         self._logger = logger
         
         # Store fname and level
+        if level not in ["reach", "node"]:
+            raise ValueError("'level' must be 'reach' or 'node'")
+        if level == "node" and compact:
+            raise ValueError("'compact' is not available at node level")
         self._fname = fname
         self._level = level
         
-        # Open dataset
-        self._dataset = nc.Open(fname, "r")
+        # Set quality filter
+        self._quality_filter = _resolve_quality_filter(quality_filter, level)
+        
+        # Load dataset (the lock of the pool is held while the dataset is read, then the handle is released so that
+        # it can be evicted from the pool)
+        self._pool = get_pool()
+        with self._pool.dataset(fname) as self._dataset:
+            try:
+                self.__load__(level, compact, nodes_list, load_defaults)
+            finally:
+                self._dataset = None
+
+    def __load__(self, level, compact, nodes_list, load_defaults):
+        """Select the nodes, evaluate the quality filter and load the default variables (see __init__)
+        """
         
         # Select group
         group = self._dataset.groups[level]
+        
+        # Select nodes
+        if level == "node":
+            node_id = np.ma.filled(group.variables["node_id"][:], 0).astype(np.int64)
+            if nodes_list is None:
+                self._node_rows = np.arange(node_id.size)
+            else:
+                self._node_rows = np.flatnonzero(np.isin(node_id, nodes_list))
+            self.node_id = node_id[self._node_rows]
+            self.node_reach_id = node_to_reach_id(self.node_id)
+        else:
+            self._node_rows = None
+        
+        # Evaluate quality filter (only the quality variables are read). At node level, the filter is evaluated
+        # by blocks of nodes when variables are read
+        self.mask = None
+        if self._quality_filter is not None and level == "reach":
+            self.mask = self._quality_filter.evaluate(group)
+            if self.mask is not None:
+                self._logger.debug("- %i/%i observations pass the quality filter" % (np.sum(self.mask), self.mask.size))
+        if compact and self.mask is not None:
+            self.time_index = np.flatnonzero(self.mask)
+        else:
+            self.time_index = None
 
         # Load default variables
-        self.wse = self.load_xt_variable(group, "wse")
-        self.width = self.load_xt_variable(group, "width")
-        self.d_x_area = self.load_xt_variable(group, "d_x_area")
-        if level == "reach":
-            self.slope2 = self.load_xt_variable(group, "slope2")
-            self.slope = self.slope2
+        if "time" in group.variables:
+            self.time = self.__load_variable__(group, "time")
+        else:
+            self.time = None
+        if load_defaults:
+            self.wse = self.__load_variable__(group, "wse")
+            self.width = self.__load_variable__(group, "width")
+            self.d_x_area = self.__load_variable__(group, "d_x_area")
+            if level == "reach":
+                self.slope2 = self.__load_variable__(group, "slope2")
+                self.slope = self.slope2
 
+    @property
+    def quality_filter(self):
+        return self._quality_filter
+
+    @property
+    def level(self):
+        return self._level
 
     def load_variable(self, group, varname):
         """Load variable with name 'varname' in a group of the dataset
         
         Parameters
         ----------
-        group : netcdf4.Dataset
-            Group containing the variable
+        group : netcdf4.Group or str
+            Group containing the variable, or its name (e.g. 'reach'). The file is acquired again from the shared
+            pool, as its handle is released after loading
         varname : str
             Name of the variable
             
@@ -61,12 +142,37 @@ class SwotObservations:
         numpy.ndarray
             Array of the variable values
         """
+        
+        group_path = group if isinstance(group, str) else group.path
+        with self._pool.dataset(self._fname) as dataset:
+            return self.__load_variable__(dataset[group_path], varname)
+    
+    def __load_variable__(self, group, varname):
+        """Load a variable of an open group (see load_variable)
+        """
            
         var = group.variables[varname]
         if var.dimensions == ():
             return var[0]
+        elif self._node_rows is not None and len(var.dimensions) == 2 and var.dimensions[1] == u'nt':
+            # Node x time variable: read by blocks of nodes (the quality filter is applied by block)
+            blocks = [arrays[varname] for _, arrays in self.__iter_node_blocks__(group.path, [varname])]
+            if len(blocks) == 0:
+                return np.zeros((0, var.shape[1]), dtype=np.float64)
+            return np.concatenate(blocks)
+        elif self._node_rows is not None and len(var.dimensions) == 1 and var.dimensions[0] != u'nt':
+            # Node variable
+            array = np.ma.filled(np.ma.asarray(var[:], dtype=np.float64), np.nan)
+            return array[self._node_rows]
         elif var.dimensions == (u'nt',):
-            array = var[:]
+            if self.time_index is not None:
+                # Compact layout: only read the observations that pass the quality filter
+                if self.time_index.size == 0:
+                    array = np.zeros(0, dtype=np.float64)
+                else:
+                    array = var[self.time_index]
+            else:
+                array = var[:]
         else:
             raise RuntimeError("Wrong dimensions: %s" % repr(var.dimensions))
             
@@ -74,13 +180,147 @@ class SwotObservations:
         if isinstance(array, np.ma.core.MaskedArray):
             array = array.filled(fill_value=np.nan)
             
+        # Discard observations that do not pass the quality filter (times, coordinates and identifiers are kept)
+        if self.time_index is None and self.mask is not None and _is_measurement(varname):
+            array = np.where(self.mask, array, np.nan)
+            
         return array
     
     
+    def iter_node_chunks(self, varnames, chunk_size=None):
+        """Iterate over blocks of nodes of node x time variables (node level only). Blocks are aligned on the HDF5
+        chunks of the file and only the blocks that contain selected nodes are read. Observations that do not pass
+        the quality filter are set to NaN (except times, coordinates and identifiers)
+        
+        Parameters
+        ----------
+        varnames : str or list
+            Name(s) of the variables, with dimensions (nx, nt)
+        chunk_size : int or None
+            Number of nodes of the blocks. Default is None (multiple of the HDF5 chunk size of the first variable,
+            about 4 MiB per variable)
+            
+        Return
+        ------
+        generator
+            Generator of (node identifiers, dictionary variable name -> array of shape (number of nodes, nt))
+        """
+        
+        if self._level != "node":
+            raise RuntimeError("Node chunks are only available at node level")
+        if isinstance(varnames, str):
+            varnames = [varnames]
+        position = 0
+        for _, arrays in self.__iter_node_blocks__(self._level, varnames, chunk_size):
+            size = arrays[varnames[0]].shape[0]
+            yield self.node_id[position:position+size], arrays
+            position += size
+    
+    def aggregate_to_reaches(self, varname, how="mean", chunk_size=None):
+        """Aggregate a node x time variable to the reaches of the nodes (node level only), block by block
+        
+        Parameters
+        ----------
+        varname : str
+            Name of the variable, with dimensions (nx, nt)
+        how : str
+            Aggregation of the valid node values at each time: 'mean', 'sum', 'count', 'min' or 'max'
+        chunk_size : int or None
+            Number of nodes of the blocks (see iter_node_chunks)
+            
+        Return
+        ------
+        tuple
+            Reach identifiers (sorted) and aggregated values, shape (number of reaches, nt). NaN where a reach has no
+            valid node value (except for 'count')
+        """
+        
+        if how not in ["mean", "sum", "count", "min", "max"]:
+            raise ValueError("'how' must be 'mean', 'sum', 'count', 'min' or 'max'")
+        reach_ids, reach_index = np.unique(self.node_reach_id, return_inverse=True)
+        with self._pool.dataset(self._fname) as dataset:
+            nt = dataset[self._level].variables[varname].shape[1]
+        size = reach_ids.size * nt
+        
+        count = np.zeros(size)
+        if how in ["mean", "sum"]:
+            result = np.zeros(size)
+        elif how == "min":
+            result = np.full(size, np.inf)
+        elif how == "max":
+            result = np.full(size, -np.inf)
+        position = 0
+        for _, arrays in self.iter_node_chunks(varname, chunk_size):
+            values = arrays[varname]
+            rows = reach_index[position:position+values.shape[0]]
+            position += values.shape[0]
+            
+            # Flattened (reach, time) keys of the valid values
+            keys = (rows[:, np.newaxis] * nt + np.arange(nt)).ravel()
+            values = values.ravel()
+            valid = np.isfinite(values)
+            keys = keys[valid]
+            values = values[valid]
+            count += np.bincount(keys, minlength=size)
+            if how in ["mean", "sum"]:
+                result += np.bincount(keys, values, minlength=size)
+            elif how == "min":
+                np.minimum.at(result, keys, values)
+            elif how == "max":
+                np.maximum.at(result, keys, values)
+        
+        if how == "count":
+            result = count
+        else:
+            if how == "mean":
+                result = np.divide(result, count, out=np.full(size, np.nan), where=count > 0)
+            else:
+                result[count == 0] = np.nan
+        return reach_ids, result.reshape((reach_ids.size, nt))
+    
+    def __iter_node_blocks__(self, group_path, varnames, chunk_size=None):
+        """Read node x time variables of a group by blocks of selected nodes (aligned on the HDF5 chunks). The file is
+        acquired from the shared pool for each block
+        """
+        
+        if chunk_size is None:
+            with self._pool.dataset(self._fname) as dataset:
+                chunk_size = _node_block_size(dataset[group_path].variables[varnames[0]])
+        rows = self._node_rows
+        if rows.size == 0:
+            return
+        
+        # Split the selected rows by block
+        blocks = rows // chunk_size
+        boundaries = np.flatnonzero(np.diff(blocks)) + 1
+        starts = np.concatenate([[0], boundaries])
+        stops = np.concatenate([boundaries, [rows.size]])
+        
+        for start, stop in zip(starts, stops):
+            block_rows = rows[start:stop]
+            first, last = block_rows[0], block_rows[-1] + 1
+            with self._pool.dataset(self._fname) as dataset:
+                group = dataset[group_path]
+                arrays = {}
+                for varname in varnames:
+                    arrays[varname] = np.ma.filled(np.ma.asarray(group.variables[varname][first:last],
+                                                                 dtype=np.float64), np.nan)
+                mask = None
+                if self._quality_filter is not None:
+                    mask = self._quality_filter.evaluate(group, slice(first, last))
+            local_rows = block_rows - first
+            for varname in varnames:
+                array = arrays[varname][local_rows]
+                if mask is not None and _is_measurement(varname):
+                    array = np.where(mask[local_rows], array, np.nan)
+                arrays[varname] = array
+            yield block_rows, arrays
+    
     def close(self):
-        """Close the dataset
+        """Kept for compatibility: the dataset is released as soon as it is loaded (the handle is kept open in the
+        shared pool until it is evicted)
         """
-        self._dataset.close()
+        pass
 
 
 class SwotObservationsCollection:
@@ -119,3 +359,99 @@ class SwotObservationsCollection:
     def reaches_list(self):
         return [fname.split("_")[0] for fname in self._swotfnames]
 
+
+    def load_ragged(self, varname="wse", level="reach", quality_filter=None):
+        """Load a variable for all the files of the collection as a ragged array (only valid observations are kept)
+        
+        Parameters
+        ----------
+        varname : str
+            Name of the variable
+        level : str
+            Data level, must be 'reach' or 'node'
+        quality_filter : QualityFilter, dict, str or None
+            Quality filter (see SwotObservations). Default is None (no filtering)
+            
+        Return
+        ------
+        RaggedArray
+            Observations (one row per file, identifiers are the reach identifiers of the files, times are taken from
+            the 'time' variable if it exists)
+        """
+        
+        quality_filter = _resolve_quality_filter(quality_filter, level)
+        pool = get_pool()
+        values_list = []
+        times_list = []
+        for basename in self._swotfnames:
+            with pool.dataset(os.path.join(self._dirname, basename)) as dataset:
+                with pool.lock:
+                    group = dataset.groups[level]
+                    var = group.variables[varname]
+                    if var.dimensions != (u'nt',):
+                        raise RuntimeError("Wrong dimensions: %s" % repr(var.dimensions))
+                    values = np.ma.filled(np.ma.asarray(var[:], dtype=np.float64), np.nan)
+                    if "time" in group.variables:
+                        times = np.ma.filled(np.ma.asarray(group.variables["time"][:], dtype=np.float64), np.nan)
+                    else:
+                        times = np.arange(values.size, dtype=np.float64)
+                    mask = None
+                    if quality_filter is not None:
+                        mask = quality_filter.evaluate(group)
+            valid = np.isfinite(values)
+            if mask is not None:
+                valid &= mask
+            values_list.append(values[valid])
+            times_list.append(times[valid])
+        
+        ids = np.array([int(reach_id) for reach_id in self.reaches_list], dtype=np.int64)
+        return RaggedArray.from_lists(values_list, times_list, ids)
+
+
+def node_to_reach_id(node_id):
+    """Compute the reach identifiers of nodes (SWORD identifiers: CBBBBBRRRRNNNT for nodes, CBBBBBRRRRT for reaches)
+    
+    Parameters
+    ----------
+    node_id : numpy.ndarray
+        Node identifiers
+        
+    Return
+    ------
+    numpy.ndarray
+        Reach identifiers
+    """
+    node_id = np.asarray(node_id, dtype=np.int64)
+    return (node_id // 10000) * 10 + node_id % 10
+
+
+def _is_measurement(varname):
+    """Check if a variable is a measurement (filtered by the quality filter) rather than a time, a coordinate or an
+    identifier
+    """
+    return not (varname.startswith("time") or varname.endswith("_id") or varname in _COORDINATE_VARIABLES)
+
+
+def _node_block_size(var):
+    """Compute the number of nodes read at a time for a node x time variable: a multiple of the HDF5 chunk size
+    along the node dimension, about _NODE_BLOCK_BYTES per block
+    """
+    row_bytes = max(var.shape[1], 1) * var.dtype.itemsize
+    chunking = var.chunking()
+    if chunking == "contiguous" or chunking is None:
+        return max(1, _NODE_BLOCK_BYTES // row_bytes)
+    chunk_rows = max(int(chunking[0]), 1)
+    return chunk_rows * max(1, _NODE_BLOCK_BYTES // (chunk_rows * row_bytes))
+
+
+def _resolve_quality_filter(quality_filter, level):
+    """Convert a quality filter argument (QualityFilter, dict, 'default' or None) to a QualityFilter (or None)
+    """
+    if isinstance(quality_filter, str):
+        if quality_filter != "default":
+            raise ValueError("'quality_filter' must be a QualityFilter, a dict, 'default' or None")
+        return QualityFilter.default(level)
+    elif isinstance(quality_filter, dict):
+        return QualityFilter(quality_filter)
+    return quality_filter
+
@@ -0,0 +1,389 @@
+import numpy as np
+
+from .pool import get_pool
+
+
+class SwordTopology:
+    """Object to handle the river network topology of SWORD as a compact CSR (Compressed Sparse Row) graph
+    """
+
+    def __init__(self, reach_id, rch_id_up=None, rch_id_dn=None, dist_out=None):
+        """Build the topology graph from SWORD topology variables
+
+        Parameters
+        ----------
+        reach_id : numpy.ndarray
+            Identifiers of the reaches, shape (num_reaches,)
+        rch_id_up : numpy.ndarray or None
+            Identifiers of the upstream reaches, shape (4, num_reaches). Missing neighbours are set to 0
+        rch_id_dn : numpy.ndarray or None
+            Identifiers of the downstream reaches, shape (4, num_reaches). Missing neighbours are set to 0
+        dist_out : numpy.ndarray or None
+            Distance from the outlet of the reaches, shape (num_reaches,)
+        """
+
+        if rch_id_up is None and rch_id_dn is None:
+            raise ValueError("At least one of 'rch_id_up' or 'rch_id_dn' must be provided")
+
+        self._reach_id = _filled(reach_id, 0).astype(np.int64)
+        n = self._reach_id.size
+        if dist_out is not None:
+            self._dist_out = _filled(dist_out, np.nan).astype(np.float64)
+        else:
+            self._dist_out = None
+
+        # Sorted index for reach_id -> index lookups
+        self._sort_order = np.argsort(self._reach_id, kind="stable")
+        self._sorted_reach_id = self._reach_id[self._sort_order]
+
+        # Collect edges (upstream index -> downstream index) from both topology variables
+        src_list = []
+        dst_list = []
+        if rch_id_dn is not None:
+            neighbours = self.__neighbours_indices__(rch_id_dn)
+            rows, cols = np.nonzero(neighbours >= 0)
+            src_list.append(cols)
+            dst_list.append(neighbours[rows, cols])
+        if rch_id_up is not None:
+            neighbours = self.__neighbours_indices__(rch_id_up)
+            rows, cols = np.nonzero(neighbours >= 0)
+            src_list.append(neighbours[rows, cols])
+            dst_list.append(cols)
+        src = np.concatenate(src_list).astype(np.int64)
+        dst = np.concatenate(dst_list).astype(np.int64)
+
+        # Remove duplicated edges and self loops
+        keys = np.unique(src * n + dst)
+        src = keys // n
+        dst = keys % n
+        valid = src != dst
+        src = src[valid]
+        dst = dst[valid]
+
+        # Build CSR arrays in both directions
+        self._dn_indptr, self._dn_indices = _build_csr(src, dst, n)
+        self._up_indptr, self._up_indices = _build_csr(dst, src, n)
+
+        # Topological levels are computed on first use
+        self._levels = None
+
+    @classmethod
+    def from_netcdf(cls, fname):
+        """Load the topology from a SWORD netCDF file
+
+        Parameters
+        ----------
+        fname : str
+            Sword netCDF file
+
+        Return
+        ------
+        SwordTopology
+            Topology graph
+        """
+
+        with get_pool().dataset(fname) as dataset:
+            return cls.from_group(dataset.groups["reaches"])
+
+    @classmethod
+    def from_group(cls, group):
+        """Build the topology from the reaches group of an open SWORD netCDF dataset
+
+        Parameters
+        ----------
+        group : netCDF4.Group
+            Group 'reaches' of the SWORD dataset
+
+        Return
+        ------
+        SwordTopology
+            Topology graph
+        """
+
+        rch_id_up = None
+        rch_id_dn = None
+        dist_out = None
+        if "rch_id_up" in group.variables:
+            rch_id_up = group.variables["rch_id_up"][:]
+        if "rch_id_dn" in group.variables:
+            rch_id_dn = group.variables["rch_id_dn"][:]
+        if "dist_out" in group.variables:
+            dist_out = group.variables["dist_out"][:]
+
+        return cls(group.variables["reach_id"][:], rch_id_up, rch_id_dn, dist_out)
+
+    @property
+    def reach_id(self):
+        return self._reach_id
+
+    @property
+    def dist_out(self):
+        return self._dist_out
+
+    @property
+    def num_reaches(self):
+        return self._reach_id.size
+
+    @property
+    def num_edges(self):
+        return self._dn_indices.size
+
+    @property
+    def downstream_csr(self):
+        """Return the CSR arrays (indptr, indices) of the downstream adjacency (reach index -> downstream reach indices)
+        """
+        return self._dn_indptr, self._dn_indices
+
+    @property
+    def upstream_csr(self):
+        """Return the CSR arrays (indptr, indices) of the upstream adjacency (reach index -> upstream reach indices)
+        """
+        return self._up_indptr, self._up_indices
+
+    def indices(self, reach_ids, missing="raise"):
+        """Convert reach identifiers to indices in the graph
+
+        Parameters
+        ----------
+        reach_ids : int or iterable
+            Reach identifiers
+        missing : str
+            Behaviour for identifiers not found in the graph: 'raise' or 'ignore' (index set to -1)
+
+        Return
+        ------
+        numpy.ndarray
+            Indices of the reaches
+        """
+
+        reach_ids = np.atleast_1d(np.asarray(reach_ids, dtype=np.int64))
+        pos = np.searchsorted(self._sorted_reach_id, reach_ids)
+        pos = np.minimum(pos, self._sorted_reach_id.size - 1)
+        found = self._sorted_reach_id[pos] == reach_ids
+        if missing == "raise":
+            if not np.all(found):
+                raise RuntimeError("Reach %i not found" % reach_ids[~found][0])
+        elif missing != "ignore":
+            raise ValueError("'missing' must be 'raise' or 'ignore'")
+
+        return np.where(found, self._sort_order[pos], -1)
+
+    def upstream_reaches(self, reach_ids, include_self=True):
+        """Retrieve all reaches upstream of one or several reaches (e.g. the drainage network of a gauge)
+
+        Parameters
+        ----------
+        reach_ids : int or iterable
+            Reach identifier(s) of the outlet(s)
+        include_self : bool
+            True to include the outlet reach(es) in the result
+
+        Return
+        ------
+        numpy.ndarray
+            Identifiers of the upstream reaches (sorted by index in the graph)
+        """
+
+        visited = self.__traverse__(self._up_indptr, self._up_indices, self.indices(reach_ids), include_self)
+        return self._reach_id[visited]
+
+    def downstream_reaches(self, reach_ids, include_self=True):
+        """Retrieve all reaches downstream of one or several reaches
+
+        Parameters
+        ----------
+        reach_ids : int or iterable
+            Reach identifier(s) of the source(s)
+        include_self : bool
+            True to include the source reach(es) in the result
+
+        Return
+        ------
+        numpy.ndarray
+            Identifiers of the downstream reaches (sorted by index in the graph)
+        """
+
+        visited = self.__traverse__(self._dn_indptr, self._dn_indices, self.indices(reach_ids), include_self)
+        return self._reach_id[visited]
+
+    def main_stem_path(self, reach_id_from, reach_id_to):
+        """Retrieve the path between two reaches, ordered from upstream to downstream
+
+        The path is the shortest (in number of reaches) downstream path between the two reaches. The order of the two
+        reaches does not matter.
+
+        Parameters
+        ----------
+        reach_id_from : int
+            Identifier of the first reach
+        reach_id_to : int
+            Identifier of the second reach
+
+        Return
+        ------
+        numpy.ndarray
+            Identifiers of the reaches of the path (both ends included)
+        """
+
+        index_from, index_to = self.indices([reach_id_from, reach_id_to])
+        path = self.__shortest_path__(index_from, index_to)
+        if path is None:
+            path = self.__shortest_path__(index_to, index_from)
+        if path is None:
+            raise RuntimeError("No downstream path between reaches %i and %i" % (reach_id_from, reach_id_to))
+
+        return self._reach_id[path]
+
+    def accumulate(self, values, split="even"):
+        """Accumulate a variable over the network (sum of the values of each reach and of all its upstream reaches)
+
+        Reaches that belong to a cycle in the topology are not propagated downstream.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            Values of the variable, shape (num_reaches,) in the order of the 'reach_id' property
+        split : str
+            Behaviour at bifurcations: 'even' to split the accumulated value evenly between the downstream reaches or
+            'all' to pass the full accumulated value to each downstream reach
+
+        Return
+        ------
+        numpy.ndarray
+            Accumulated values
+        """
+
+        values = np.asarray(_filled(values, np.nan), dtype=np.float64)
+        if values.shape != self._reach_id.shape:
+            raise ValueError("'values' must have shape (%i,)" % self._reach_id.size)
+
+        # Weights of the outgoing edges
+        n_down = np.diff(self._dn_indptr)
+        if split == "even":
+            weights = 1.0 / np.repeat(n_down, n_down)
+        elif split == "all":
+            weights = np.ones(self._dn_indices.size)
+        else:
+            raise ValueError("'split' must be 'even' or 'all'")
+
+        accumulated = np.nan_to_num(values, nan=0.0)
+        for level in self.topological_levels():
+            src, edges = _expand_edges(self._dn_indptr, level)
+            if edges.size > 0:
+                np.add.at(accumulated, self._dn_indices[edges], accumulated[src] * weights[edges])
+
+        return accumulated
+
+    def topological_levels(self):
+        """Compute the topological levels of the graph: each level only contains reaches whose upstream reaches
+        belong to previous levels
+
+        Return
+        ------
+        list
+            List of arrays of reach indices
+        """
+
+        if self._levels is None:
+
+            indegree = np.diff(self._up_indptr).copy()
+            frontier = np.flatnonzero(indegree == 0)
+            levels = []
+            while frontier.size > 0:
+                levels.append(frontier)
+                _, edges = _expand_edges(self._dn_indptr, frontier)
+                targets = self._dn_indices[edges]
+                np.subtract.at(indegree, targets, 1)
+                targets = np.unique(targets)
+                frontier = targets[indegree[targets] == 0]
+            self._levels = levels
+
+        return self._levels
+
+    def __neighbours_indices__(self, neighbours_ids):
+        """Convert a (4, num_reaches) array of neighbour identifiers to graph indices (-1 where no neighbour)
+        """
+
+        neighbours_ids = _filled(neighbours_ids, 0).astype(np.int64)
+        if neighbours_ids.ndim == 1:
+            neighbours_ids = neighbours_ids[np.newaxis, :]
+        if neighbours_ids.shape[1] != self._reach_id.size and neighbours_ids.shape[0] == self._reach_id.size:
+            neighbours_ids = neighbours_ids.T
+        flat = self.indices(neighbours_ids.ravel(), missing="ignore")
+        flat[neighbours_ids.ravel() == 0] = -1
+
+        return flat.reshape(neighbours_ids.shape)
+
+    def __traverse__(self, indptr, indices, seeds, include_self):
+        """Breadth first traversal processing a whole frontier at once
+        """
+
+        visited = np.zeros(self._reach_id.size, dtype=bool)
+        visited[seeds] = True
+        frontier = np.unique(seeds)
+        while frontier.size > 0:
+            _, edges = _expand_edges(indptr, frontier)
+            frontier = np.unique(indices[edges])
+            frontier = frontier[~visited[frontier]]
+            visited[frontier] = True
+        if not include_self:
+            visited[seeds] = False
+
+        return np.flatnonzero(visited)
+
+    def __shortest_path__(self, index_from, index_to):
+        """Shortest downstream path between two indices (None if index_to is not downstream of index_from)
+        """
+
+        parent = np.full(self._reach_id.size, -1, dtype=np.int64)
+        visited = np.zeros(self._reach_id.size, dtype=bool)
+        visited[index_from] = True
+        frontier = np.array([index_from])
+        while frontier.size > 0 and not visited[index_to]:
+            src, edges = _expand_edges(self._dn_indptr, frontier)
+            dst = self._dn_indices[edges]
+            new = ~visited[dst]
+            dst, first = np.unique(dst[new], return_index=True)
+            parent[dst] = src[new][first]
+            visited[dst] = True
+            frontier = dst
+        if not visited[index_to]:
+            return None
+
+        path = [index_to]
+        while path[-1] != index_from:
+            path.append(parent[path[-1]])
+
+        return np.array(path[::-1], dtype=np.int64)
+
+
+def _filled(array, fill_value):
+    """Convert a (possibly masked) array to a regular numpy array
+    """
+    if isinstance(array, np.ma.core.MaskedArray):
+        return array.filled(fill_value=fill_value)
+    return np.asarray(array)
+
+
+def _build_csr(src, dst, n):
+    """Build CSR arrays (indptr, indices) from a list of edges
+    """
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[order]
+
+
+def _expand_edges(indptr, rows):
+    """Retrieve the edges of a set of rows of a CSR graph
+
+    Return
+    ------
+    tuple
+        Arrays of (source row, edge index) for all the edges of the rows
+    """
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    total = counts.sum()
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(rows, counts), np.repeat(starts, counts) + offsets
@@ -1,3 +1,30 @@
-from .gages_maps import *
-from .reaches_maps import *
-from .nodes_maps import *
+import importlib
+
+
+# Public objects and the submodules that define them. Submodules are only imported when one of their objects is
+# accessed (PEP 562), so that importing the package does not load heavy dependencies (folium, branca...)
+_objects_submodules = {"GagesMap": "gages_maps",
+                       "ReachesMap": "reaches_maps",
+                       "NodesMap": "nodes_maps",
+                       "ColormapStyleFunction": "style_functions",
+                       "render_static_map": "static_maps",
+                       "DeltaTimeSliderLayer": "time_slider",
+                       "GageClustersLayer": "gage_clusters",
+                       "ReachTimeseriesSource": "explorer",
+                       "ReachExplorer": "explorer",
+                       "GagesExplorer": "explorer"}
+
+__all__ = list(_objects_submodules.keys())
+
+
+def __getattr__(name):
+    if name in _objects_submodules:
+        module = importlib.import_module(".%s" % _objects_submodules[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__))
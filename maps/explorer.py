@@ -0,0 +1,588 @@
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import threading
+from urllib.parse import urlparse
+
+from branca.element import MacroElement
+from jinja2 import Template
+import numpy as np
+
+from ..io.pool import get_pool
+from ..io.results_summary import DISCHARGE_VARIABLES, find_time_variable
+
+
+class ReachTimeseriesSource:
+    """Object to read the time series of single reaches on demand, through indexed slices of a results file (and
+    optionally of a SoS file for priors). Recently read reaches are kept in a LRU cache
+    """
+
+    def __init__(self, results_fname, algorithms=None, sos_fname=None, prior_variables=None, cache_size=128):
+        """Create a time series source
+
+        Parameters
+        ----------
+        results_fname : str
+            Results file
+        algorithms : dict or None
+            Dictionary algorithm group -> discharge variable. Default is None (algorithms of DISCHARGE_VARIABLES
+            found in the file)
+        sos_fname : str or None
+            SoS file used for priors. Default is None (no priors)
+        prior_variables : list or None
+            Prior variables of the SoS file, as 'group/varname' paths with dimension num_reaches. Default is None
+            (model/mean_q)
+        cache_size : int
+            Maximum number of reaches kept in the cache
+        """
+
+        self._results_fname = results_fname
+        self._sos_fname = sos_fname
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+        pool = get_pool()
+        with pool.dataset(results_fname) as dataset:
+            reach_id = np.ma.filled(dataset.groups["reaches"].variables["reach_id"][:], 0).astype(np.int64)
+            if algorithms is None:
+                algorithms = {algorithm: varname for algorithm, varname in DISCHARGE_VARIABLES.items()
+                              if algorithm in dataset.groups and varname in dataset.groups[algorithm].variables}
+            self._time_variables = {algorithm: find_time_variable(dataset, algorithm) for algorithm in algorithms}
+        self._algorithms = algorithms
+        self._results_index = (reach_id, np.argsort(reach_id, kind="stable"))
+
+        self._prior_variables = []
+        self._sos_index = None
+        if sos_fname is not None:
+            if prior_variables is None:
+                prior_variables = ["model/mean_q"]
+            with pool.dataset(sos_fname) as dataset:
+                reach_id = np.ma.filled(dataset.groups["reaches"].variables["reach_id"][:], 0).astype(np.int64)
+                for path in prior_variables:
+                    root = dataset
+                    for group in path.split("/")[:-1]:
+                        root = root.groups[group]
+                    if root.variables[path.split("/")[-1]].dimensions != ("num_reaches",):
+                        raise ValueError("Prior variable %s must have dimension num_reaches" % path)
+                    self._prior_variables.append(path)
+            self._sos_index = (reach_id, np.argsort(reach_id, kind="stable"))
+
+    @property
+    def algorithms(self):
+        return self._algorithms
+
+    @property
+    def cache_info(self):
+        """Return statistics of the cache
+
+        Return
+        ------
+        dict
+            Hits, misses and number of cached reaches
+        """
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses, "size": len(self._cache)}
+
+    def get(self, reach_id):
+        """Retrieve the time series of a reach
+
+        Parameters
+        ----------
+        reach_id : int
+            Identifier of the reach
+
+        Return
+        ------
+        dict
+            Dictionary with keys 'reach_id', 'series' (list of dictionaries with keys 'label', 'times' and 'values',
+            one per algorithm, valid values only) and 'priors' (list of dictionaries with keys 'label' and 'value')
+        """
+
+        reach_id = int(reach_id)
+        with self._lock:
+            if reach_id in self._cache:
+                self._cache.move_to_end(reach_id)
+                self._hits += 1
+                return self._cache[reach_id]
+            self._misses += 1
+
+        data = self.__read__(reach_id)
+
+        with self._lock:
+            self._cache[reach_id] = data
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return data
+
+    def __read__(self, reach_id):
+        """Read the time series of a reach in the files (single row of each variable)
+        """
+
+        row = _find_row(self._results_index, reach_id)
+        if row < 0:
+            raise RuntimeError("Reach %i not found" % reach_id)
+
+        series = []
+        pool = get_pool()
+        with pool.dataset(self._results_fname) as dataset:
+            for algorithm, varname in self._algorithms.items():
+                values = np.ma.filled(np.ma.asarray(dataset.groups[algorithm].variables[varname][row],
+                                                    dtype=np.float64), np.nan)
+                values = np.atleast_1d(values)
+                time_variable = self._time_variables[algorithm]
+                if time_variable is not None:
+                    variable = dataset.groups[time_variable[0]].variables[time_variable[1]]
+                    times = variable[row] if variable.ndim == 2 else variable[:]
+                    times = np.ma.filled(np.ma.asarray(times, dtype=np.float64), np.nan)
+                else:
+                    times = np.arange(values.size, dtype=np.float64)
+                valid = np.isfinite(values) & (values > 0) & np.isfinite(times)
+                order = np.argsort(times[valid], kind="stable")
+                series.append({"label": algorithm,
+                               "times": times[valid][order].tolist(),
+                               "values": values[valid][order].tolist()})
+
+        priors = []
+        if self._sos_index is not None:
+            sos_row = _find_row(self._sos_index, reach_id)
+            if sos_row >= 0:
+                with pool.dataset(self._sos_fname) as dataset:
+                    for path in self._prior_variables:
+                        root = dataset
+                        for group in path.split("/")[:-1]:
+                            root = root.groups[group]
+                        value = root.variables[path.split("/")[-1]][sos_row]
+                        if not np.ma.is_masked(value) and np.isfinite(value):
+                            priors.append({"label": path.split("/")[-1], "value": float(value)})
+
+        return {"reach_id": reach_id, "series": series, "priors": priors}
+
+
+class _MapServer:
+    """Base object of the maps served by a local lightweight HTTP server: '/' returns the map (built by build_map) and
+    the other paths are answered in JSON by __respond__
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self._host = host
+        self._port = port
+        self._html = None
+        self._server = None
+        self._thread = None
+        self._logger = logging.getLogger("swotviz")
+
+    @property
+    def url(self):
+        if self._server is None:
+            return None
+        return "http://%s:%i/" % (self._host, self._server.server_address[1])
+
+    def build_map(self):
+        raise NotImplementedError()
+
+    def start(self):
+        """Start the server in a background thread
+        """
+        if self._server is not None:
+            return
+        self._html = self.build_map().get_root().render().encode("utf-8")
+        handler = type("ExplorerRequestHandler", (_ExplorerRequestHandler,), {"explorer": self})
+        self._server = ThreadingHTTPServer((self._host, self._port), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self._logger.info("Explorer served at %s" % self.url)
+
+    def stop(self):
+        """Stop the server
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def display(self, width="100%", height=600):
+        """Display the explorer in a notebook (the server is started if needed)
+
+        Return
+        ------
+        IPython.display.IFrame
+            Frame showing the explorer
+        """
+        from IPython.display import IFrame
+
+        self.start()
+        return IFrame(self.url, width=width, height=height)
+
+    def __respond__(self, path):
+        """Answer a request (other than the map)
+
+        Parameters
+        ----------
+        path : str
+            Path of the request
+
+        Return
+        ------
+        tuple
+            HTTP status code and content (dictionary sent as JSON)
+        """
+        return 404, {"error": "Not found: %s" % path}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class ReachExplorer(_MapServer):
+    """Object to handle a linked map and hydrograph explorer served by a local lightweight HTTP server
+
+    The map is sent without any time series. Clicking a reach fetches its time series from the server (see
+    ReachTimeseriesSource) and draws the hydrograph in a panel of the map.
+
+    Example
+    -------
+    >>> source = ReachTimeseriesSource("na_results.nc", sos_fname="na_sos.nc")
+    >>> explorer = ReachExplorer(sword.dataset, source)
+    >>> explorer.start()
+    >>> print(explorer.url)
+    """
+
+    def __init__(self, dataset, source, varname=None, cmap=None, tiles="cartodbpositron", time_units=None,
+                 host="127.0.0.1", port=0):
+        """Create an explorer
+
+        Parameters
+        ----------
+        dataset : geopandas.GeoDataFrame or ReachesMap
+            Reaches to display (with a 'reach_id' column)
+        source : ReachTimeseriesSource
+            Source of the time series
+        varname : str or None
+            Name of the variable used for coloring the reaches. Default is None (no coloring)
+        cmap : branca.Colormap or None
+            Colormap used for coloring
+        tiles : str
+            Identifier of the tiles for the background map
+        time_units : str or None
+            Units of the times of the time series, 'seconds_since_2000' or 'days_since_2000' to display dates.
+            Default is None (raw values)
+        host : str
+            Host of the server
+        port : int
+            Port of the server. Default is 0 (free port chosen by the system)
+        """
+
+        from .reaches_maps import ReachesMap
+
+        if time_units not in [None, "seconds_since_2000", "days_since_2000"]:
+            raise ValueError("'time_units' must be None, 'seconds_since_2000' or 'days_since_2000'")
+        super(ReachExplorer, self).__init__(host, port)
+        if not isinstance(dataset, ReachesMap):
+            dataset = ReachesMap(dataset, tiles=tiles)
+        self._reaches_map = dataset
+        self._source = source
+        self._varname = varname
+        self._cmap = cmap
+        self._time_units = time_units
+
+    @property
+    def source(self):
+        return self._source
+
+    def build_map(self):
+        """Build the map of the explorer
+
+        Return
+        ------
+        folium.Map
+            Map with click handlers on the reaches
+        """
+        new_map = self._reaches_map.get_centerlines_map(varname=self._varname, cmap=self._cmap)
+        _ReachClickHandler(time_units=self._time_units).add_to(new_map)
+        return new_map
+
+    def __respond__(self, path):
+        """Answer the requests '/reach/<reach_id>' with the time series of the reach
+        """
+        if not path.startswith("/reach/"):
+            return super(ReachExplorer, self).__respond__(path)
+        text = path[len("/reach/"):]
+        if not _is_index(text):
+            return 400, {"error": "Invalid reach identifier: %s" % text}
+        try:
+            return 200, self._source.get(int(text))
+        except RuntimeError as error:
+            return 404, {"error": str(error)}
+
+
+class GagesExplorer(_MapServer):
+    """Object to handle a map of clustered gauges served by a local lightweight HTTP server
+
+    The map is sent with the centroids and counts of the clusters only. Clicking a cluster fetches the labels of its
+    gauges from the server (see GageClustersLayer).
+
+    Example
+    -------
+    >>> explorer = GagesExplorer(gauges, varname_id="usgs_id")
+    >>> explorer.start()
+    >>> print(explorer.url)
+    """
+
+    def __init__(self, dataset, varname_id=None, tiles="cartodbpositron", min_zoom=2, max_zoom=12, cell_pixels=60,
+                 host="127.0.0.1", port=0):
+        """Create an explorer
+
+        Parameters
+        ----------
+        dataset : geopandas.GeoDataFrame or GagesMap
+            Gauges to display (points)
+        varname_id : str or None
+            Name of the variable listed in the popups of the clusters (e.g. gauge identifier). Default is None (index
+            of the dataset)
+        tiles : str
+            Identifier of the tiles for the background map
+        min_zoom : int
+            Lowest zoom level with precomputed clusters
+        max_zoom : int
+            Highest zoom level with precomputed clusters
+        cell_pixels : int
+            Size of the cells of the clustering grid in screen pixels
+        host : str
+            Host of the server
+        port : int
+            Port of the server. Default is 0 (free port chosen by the system)
+        """
+
+        from .gages_maps import GagesMap
+
+        super(GagesExplorer, self).__init__(host, port)
+        if not isinstance(dataset, GagesMap):
+            dataset = GagesMap(dataset, tiles=tiles)
+        self._gages_map = dataset
+        self._varname_id = varname_id
+        self._clusters_kwargs = {"min_zoom": min_zoom, "max_zoom": max_zoom, "cell_pixels": cell_pixels}
+        self._layer = None
+
+    def build_map(self):
+        """Build the map of the explorer
+
+        Return
+        ------
+        folium.Map
+            Map with the clusters of gauges, fetching the gauges of a cluster from the server when it is clicked
+        """
+
+        from .gage_clusters import GageClustersLayer
+
+        new_map = self._gages_map.get_map(varname_id=self._varname_id, clustered=True, members_url="clusters/",
+                                          **self._clusters_kwargs)
+        for child in new_map._children.values():
+            if isinstance(child, GageClustersLayer):
+                self._layer = child
+        return new_map
+
+    def __respond__(self, path):
+        """Answer the requests '/clusters/<zoom>/<cluster index>' with the gauges of the cluster
+        """
+        if not path.startswith("/clusters/"):
+            return super(GagesExplorer, self).__respond__(path)
+        parts = path[len("/clusters/"):].split("/")
+        if len(parts) != 2 or not all(_is_index(part) for part in parts):
+            return 400, {"error": "Invalid cluster: %s" % path[len("/clusters/"):]}
+        try:
+            return 200, self._layer.members(int(parts[0]), int(parts[1]))
+        except ValueError as error:
+            return 404, {"error": str(error)}
+
+
+class _ExplorerRequestHandler(BaseHTTPRequestHandler):
+    """Handler of the requests of the explorers: '/' returns the map, the other paths are answered in JSON by the
+    explorer (e.g. '/reach/<reach_id>' returns the time series of a reach, see ReachExplorer)
+    """
+
+    explorer = None
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path in ["/", "/index.html"]:
+            self.__send__(200, "text/html; charset=utf-8", self.explorer._html)
+        else:
+            code, data = self.explorer.__respond__(path)
+            self.__send__(code, "application/json", json.dumps(data).encode("utf-8"))
+
+    def log_message(self, format, *args):
+        logging.getLogger("swotviz").debug("explorer: " + format % args)
+
+    def __send__(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ReachClickHandler(MacroElement):
+    """Element that binds click handlers to the reaches of a map. On click, the time series of the reach are fetched
+    from the server and drawn as a SVG hydrograph in a panel
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var timeUnits = {{ this.time_units|tojson }};
+            var colors = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f"];
+            var container = null;
+            var requested = null;
+
+            var panel = L.control({position: "bottomright"});
+            panel.onAdd = function(map) {
+                container = L.DomUtil.create("div", "leaflet-bar");
+                container.style.background = "white";
+                container.style.padding = "6px";
+                container.style.display = "none";
+                L.DomEvent.disableClickPropagation(container);
+                L.DomEvent.disableScrollPropagation(container);
+                return container;
+            };
+            panel.addTo(map);
+
+            function formatTime(t) {
+                if (timeUnits === "seconds_since_2000") {
+                    return new Date(Date.UTC(2000, 0, 1) + t * 1000).toISOString().slice(0, 10);
+                } else if (timeUnits === "days_since_2000") {
+                    return new Date(Date.UTC(2000, 0, 1) + t * 86400000).toISOString().slice(0, 10);
+                }
+                return String(Math.round(t * 100) / 100);
+            }
+
+            function draw(data) {
+                var width = 460, height = 240, left = 60, right = 10, top = 24, bottom = 36;
+                var xmin = Infinity, xmax = -Infinity, ymin = Infinity, ymax = -Infinity;
+                data.series.forEach(function(series) {
+                    for (var i = 0; i < series.times.length; i++) {
+                        xmin = Math.min(xmin, series.times[i]);
+                        xmax = Math.max(xmax, series.times[i]);
+                        ymin = Math.min(ymin, series.values[i]);
+                        ymax = Math.max(ymax, series.values[i]);
+                    }
+                });
+                var title = "<b>Reach " + data.reach_id + "</b>";
+                if (xmin > xmax) {
+                    container.innerHTML = title + "<br>No valid discharge";
+                    return;
+                }
+                data.priors.forEach(function(prior) {
+                    ymin = Math.min(ymin, prior.value);
+                    ymax = Math.max(ymax, prior.value);
+                });
+                if (xmax == xmin) { xmin -= 1; xmax += 1; }
+                if (ymax == ymin) { ymin -= 1; ymax += 1; }
+                function sx(x) { return left + (x - xmin) / (xmax - xmin) * (width - left - right); }
+                function sy(y) { return height - bottom - (y - ymin) / (ymax - ymin) * (height - top - bottom); }
+
+                var svg = '<svg width="' + width + '" height="' + height + '" style="font: 10px sans-serif">';
+                svg += '<line x1="' + left + '" y1="' + (height - bottom) + '" x2="' + (width - right) + '" y2="' +
+                       (height - bottom) + '" stroke="black"/>';
+                svg += '<line x1="' + left + '" y1="' + top + '" x2="' + left + '" y2="' + (height - bottom) +
+                       '" stroke="black"/>';
+                for (var k = 0; k <= 2; k++) {
+                    var xt = xmin + k * (xmax - xmin) / 2, yt = ymin + k * (ymax - ymin) / 2;
+                    svg += '<text x="' + sx(xt) + '" y="' + (height - bottom + 14) + '" text-anchor="middle">' +
+                           formatTime(xt) + '</text>';
+                    svg += '<text x="' + (left - 4) + '" y="' + sy(yt) + '" text-anchor="end">' +
+                           yt.toPrecision(4) + '</text>';
+                }
+                svg += '<text x="12" y="' + (top + (height - top - bottom) / 2) + '" transform="rotate(-90 12 ' +
+                       (top + (height - top - bottom) / 2) + ')" text-anchor="middle">Discharge (m3/s)</text>';
+                var legend = [];
+                data.series.forEach(function(series, index) {
+                    var color = colors[index % colors.length];
+                    var points = [];
+                    for (var i = 0; i < series.times.length; i++) {
+                        points.push(sx(series.times[i]).toFixed(1) + "," + sy(series.values[i]).toFixed(1));
+                    }
+                    if (points.length > 0) {
+                        svg += '<polyline fill="none" stroke="' + color + '" stroke-width="1.5" points="' +
+                               points.join(" ") + '"/>';
+                        legend.push([series.label, color, ""]);
+                    }
+                });
+                data.priors.forEach(function(prior, index) {
+                    var color = colors[(data.series.length + index) % colors.length];
+                    svg += '<line x1="' + left + '" y1="' + sy(prior.value) + '" x2="' + (width - right) + '" y2="' +
+                           sy(prior.value) + '" stroke="' + color + '" stroke-dasharray="4,3"/>';
+                    legend.push([prior.label, color, "4,3"]);
+                });
+                legend.forEach(function(item, index) {
+                    var x = left + 8 + index * 80;
+                    svg += '<line x1="' + x + '" y1="10" x2="' + (x + 14) + '" y2="10" stroke="' + item[1] +
+                           '" stroke-width="2" stroke-dasharray="' + item[2] + '"/>';
+                    svg += '<text x="' + (x + 18) + '" y="13">' + item[0] + '</text>';
+                });
+                svg += '</svg>';
+                container.innerHTML = title + "<br>" + svg;
+            }
+
+            function load(reachId) {
+                requested = reachId;
+                container.style.display = "block";
+                container.innerHTML = "Loading reach " + reachId + "...";
+                fetch("reach/" + reachId).then(function(response) {
+                    return response.json().then(function(data) {
+                        if (!response.ok) {
+                            throw new Error(data.error);
+                        }
+                        return data;
+                    });
+                }).then(function(data) {
+                    if (requested == reachId) {
+                        draw(data);
+                    }
+                }).catch(function(error) {
+                    if (requested == reachId) {
+                        container.innerHTML = "Error: " + error.message;
+                    }
+                });
+            }
+
+            map.eachLayer(function(layer) {
+                if (layer.feature && layer.feature.properties && layer.feature.properties.reach_id !== undefined) {
+                    layer.on("click", function() {
+                        load(layer.feature.properties.reach_id);
+                    });
+                }
+            });
+        })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, time_units=None):
+        super(_ReachClickHandler, self).__init__()
+        self._name = "ReachClickHandler"
+        self.time_units = time_units
+
+
+def _find_row(index, reach_id):
+    """Retrieve the row of a reach in a (reach_id, sort order) index (-1 if not found)
+    """
+    reach_ids, order = index
+    if order.size == 0:
+        return -1
+    pos = min(np.searchsorted(reach_ids, reach_id, sorter=order), order.size - 1)
+    return int(order[pos]) if reach_ids[order[pos]] == reach_id else -1
+
+
+def _is_index(text):
+    """Check that a path element is a plain non-negative integer (ASCII digits only)
+    """
+    return text.isascii() and text.isdigit()
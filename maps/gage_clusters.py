@@ -0,0 +1,295 @@
+import html
+
+from folium.map import Layer
+from jinja2 import Template
+import numpy as np
+
+from .time_slider import _encode_array
+
+
+class GageClustersLayer(Layer):
+    """Layer of gauges clustered on a grid precomputed for each zoom level
+
+    Only the centroids and counts of the clusters are sent to the page, and only the clusters of the current zoom level
+    are displayed. With a 'members_url', the gauges of a cluster are fetched from a server when the cluster is clicked
+    (see GagesExplorer, which answers with GageClustersLayer.members). Without it, the popups only show the number of
+    gauges, unless 'embed_labels' is True: the labels and the gauges of the clusters (index lists in compressed (CSR)
+    form) are then embedded in the page up front, so its size grows with the number of gauges (small standalone maps
+    only).
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+
+            function decode(b64, ArrayType) {
+                var chars = atob(b64);
+                var bytes = new Uint8Array(chars.length);
+                for (var i = 0; i < chars.length; i++) {
+                    bytes[i] = chars.charCodeAt(i);
+                }
+                return new ArrayType(bytes.buffer);
+            }
+
+            var labels = {{ this.labels|tojson }};
+            var membersUrl = {{ this.members_url|tojson }};
+            var encodedLevels = {{ this.levels|tojson }};
+            var minZoom = {{ this.min_zoom }};
+            var maxZoom = {{ this.max_zoom }};
+            var maxListed = {{ this.max_listed }};
+            var levels = {};
+
+            // Zoom levels are decoded on first display
+            function getLevel(zoom) {
+                zoom = Math.max(minZoom, Math.min(maxZoom, zoom));
+                if (!(zoom in levels)) {
+                    var level = encodedLevels[zoom - minZoom];
+                    levels[zoom] = {zoom: zoom,
+                                    lat: decode(level.lat, Float32Array),
+                                    lon: decode(level.lon, Float32Array),
+                                    count: decode(level.count, Uint32Array)};
+                    if (level.members) {
+                        levels[zoom].members = decode(level.members, Uint32Array);
+                    }
+                    var offsets = new Uint32Array(levels[zoom].count.length + 1);
+                    for (var i = 0; i < levels[zoom].count.length; i++) {
+                        offsets[i + 1] = offsets[i] + levels[zoom].count[i];
+                    }
+                    levels[zoom].offsets = offsets;
+                }
+                return levels[zoom];
+            }
+
+            function escapeHtml(text) {
+                var element = document.createElement("div");
+                element.textContent = text;
+                return element.innerHTML;
+            }
+
+            function listContent(count, lines) {
+                if (count > lines.length) {
+                    lines.push("... and " + (count - lines.length) + " more");
+                }
+                return "<b>" + count + " gauge(s)</b><br>" + lines.join("<br>");
+            }
+
+            function popupContent(level, index) {
+                var start = level.offsets[index], stop = level.offsets[index + 1];
+                if (!labels) {
+                    return "<b>" + (stop - start) + " gauge(s)</b>";
+                }
+                var lines = [];
+                for (var i = start; i < Math.min(stop, start + maxListed); i++) {
+                    lines.push(labels[level.members[i]]);
+                }
+                return listContent(stop - start, lines);
+            }
+
+            // Gauges of a cluster are fetched from the server when its popup is opened
+            function fetchContent(popup, level, index) {
+                fetch(membersUrl + level.zoom + "/" + index).then(function(response) {
+                    return response.json().then(function(data) {
+                        if (!response.ok) {
+                            throw new Error(data.error);
+                        }
+                        return data;
+                    });
+                }).then(function(data) {
+                    popup.setContent(listContent(data.count, data.labels.map(escapeHtml)));
+                }).catch(function(error) {
+                    popup.setContent("Error: " + escapeHtml(error.message));
+                });
+            }
+
+            var layer = L.layerGroup();
+
+            function refresh() {
+                var map = layer._map;
+                if (!map) {
+                    return;
+                }
+                layer.clearLayers();
+                var level = getLevel(map.getZoom());
+                var bounds = map.getBounds().pad(0.2);
+                for (var i = 0; i < level.count.length; i++) {
+                    var latlng = L.latLng(level.lat[i], level.lon[i]);
+                    if (!bounds.contains(latlng)) {
+                        continue;
+                    }
+                    var count = level.count[i];
+                    var marker = L.circleMarker(latlng, {
+                        radius: count > 1 ? 8 + 3 * Math.log(count) : 5,
+                        color: "{{ this.color }}",
+                        fillColor: "{{ this.color }}",
+                        fillOpacity: count > 1 ? 0.6 : 0.9,
+                        weight: 1
+                    });
+                    if (count > 1) {
+                        marker.bindTooltip(String(count), {permanent: true, direction: "center",
+                                                           className: "gage-cluster-label"});
+                    }
+                    (function(index) {
+                        if (membersUrl) {
+                            marker.bindPopup("Loading " + count + " gauge(s)...");
+                            marker.on("popupopen", function(event) {
+                                fetchContent(event.popup, level, index);
+                            });
+                        } else {
+                            marker.bindPopup(function() {
+                                return popupContent(level, index);
+                            });
+                        }
+                    })(i);
+                    layer.addLayer(marker);
+                }
+            }
+
+            layer.on("add", function() {
+                layer._map.on("zoomend moveend", refresh);
+                refresh();
+            });
+            layer.on("remove", function(event) {
+                event.target._map && event.target._map.off("zoomend moveend", refresh);
+            });
+
+            return layer;
+        })();
+        {% if this.show %}
+        {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endif %}
+        {% endmacro %}
+        """)
+
+    def __init__(self, lon, lat, labels=None, min_zoom=2, max_zoom=12, cell_pixels=60, color="#048B9A", max_listed=50,
+                 members_url=None, embed_labels=False, name=None, overlay=True, control=True, show=True):
+        """Create the layer
+
+        Parameters
+        ----------
+        lon : numpy.ndarray
+            Longitudes of the gauges
+        lat : numpy.ndarray
+            Latitudes of the gauges
+        labels : list or None
+            Labels of the gauges (listed in the popups as plain text). Default is None (indices of the gauges)
+        min_zoom : int
+            Lowest zoom level with precomputed clusters (used for lower zoom levels)
+        max_zoom : int
+            Highest zoom level with precomputed clusters (used for higher zoom levels)
+        cell_pixels : int
+            Size of the cells of the clustering grid (screen pixels)
+        color : str
+            Color of the clusters
+        max_listed : int
+            Maximum number of gauges listed in the popup of a cluster
+        members_url : str or None
+            URL prefix from which the gauges of a cluster are fetched, as members_url + '<zoom>/<cluster index>' (see
+            members for the JSON content). Default is None (no request)
+        embed_labels : bool
+            True to embed the labels and the gauges of the clusters in the page when 'members_url' is None
+        """
+
+        super(GageClustersLayer, self).__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "GageClustersLayer"
+
+        if max_zoom < min_zoom:
+            raise ValueError("'max_zoom' must be greater than or equal to 'min_zoom'")
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        if labels is None:
+            labels = [str(index) for index in range(lon.size)]
+        if lon.shape != lat.shape or len(labels) != lon.size:
+            raise ValueError("'lon', 'lat' and 'labels' must have the same size")
+
+        # Labels and gauges of the clusters are kept here to answer the requests (see members), they are only rendered
+        # in the page if they are embedded
+        embedded = embed_labels and members_url is None
+        self._labels = [str(label) for label in labels]
+        self._clusters = []
+        self.labels = [html.escape(label) for label in self._labels] if embedded else None
+        self.members_url = members_url
+        self.min_zoom = int(min_zoom)
+        self.max_zoom = int(max_zoom)
+        self.color = color
+        self.max_listed = int(max_listed)
+        self.levels = []
+        for zoom in range(self.min_zoom, self.max_zoom + 1):
+            clusters = grid_clusters(lon, lat, zoom, cell_pixels)
+            offsets = np.zeros(clusters["count"].size + 1, dtype=np.int64)
+            np.cumsum(clusters["count"], out=offsets[1:])
+            self._clusters.append((offsets, clusters["members"]))
+            level = {"lat": _encode_array(clusters["lat"].astype("<f4")),
+                     "lon": _encode_array(clusters["lon"].astype("<f4")),
+                     "count": _encode_array(clusters["count"].astype("<u4"))}
+            if embedded:
+                level["members"] = _encode_array(clusters["members"].astype("<u4"))
+            self.levels.append(level)
+
+    def members(self, zoom, index):
+        """Retrieve the gauges of a cluster (content of the answers to the requests of the popups)
+
+        Parameters
+        ----------
+        zoom : int
+            Zoom level (between min_zoom and max_zoom)
+        index : int
+            Index of the cluster in the zoom level
+
+        Return
+        ------
+        dict
+            Number of gauges of the cluster ('count') and labels of the first max_listed gauges ('labels')
+        """
+
+        if zoom < self.min_zoom or zoom > self.max_zoom:
+            raise ValueError("Zoom level %i not in [%i, %i]" % (zoom, self.min_zoom, self.max_zoom))
+        offsets, members = self._clusters[zoom - self.min_zoom]
+        if index < 0 or index >= offsets.size - 1:
+            raise ValueError("Cluster %i not found at zoom level %i" % (index, zoom))
+        start, stop = offsets[index], offsets[index + 1]
+        return {"count": int(stop - start),
+                "labels": [self._labels[member] for member in members[start:min(stop, start + self.max_listed)]]}
+
+
+def grid_clusters(lon, lat, zoom, cell_pixels=60):
+    """Cluster points on a grid of square cells in Web Mercator screen coordinates at a zoom level
+
+    Parameters
+    ----------
+    lon : numpy.ndarray
+        Longitudes of the points
+    lat : numpy.ndarray
+        Latitudes of the points
+    zoom : int
+        Zoom level
+    cell_pixels : int
+        Size of the cells (screen pixels)
+
+    Return
+    ------
+    dict
+        Centroids ('lon', 'lat') and number of points ('count') of the clusters, and indices of the points of the
+        clusters ('members', concatenated in the order of the clusters)
+    """
+
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -85.05112878, 85.05112878)
+
+    # Screen coordinates of the points (Web Mercator, 256 pixels tiles)
+    world_size = 256.0 * 2**zoom
+    x = (lon + 180.0) / 360.0 * world_size
+    sin_lat = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1.0 + sin_lat) / (1.0 - sin_lat)) / (4.0 * np.pi)) * world_size
+
+    # Cells of the points
+    n_cells = int(np.ceil(world_size / cell_pixels)) + 1
+    cell_x = np.clip(np.floor(x / cell_pixels).astype(np.int64), 0, n_cells - 1)
+    cell_y = np.clip(np.floor(y / cell_pixels).astype(np.int64), 0, n_cells - 1)
+    keys = cell_x * n_cells + cell_y
+    _, inverse, count = np.unique(keys, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+
+    return {"lon": np.bincount(inverse, lon) / count,
+            "lat": np.bincount(inverse, lat) / count,
+            "count": count,
+            "members": np.argsort(inverse, kind="stable")}
@@ -1,7 +1,9 @@
 import branca
 import folium
 import numpy as np
+import shapely
 
+from .gage_clusters import GageClustersLayer
 from .style_functions import *
 
 
@@ -25,7 +27,34 @@ class GagesMap():
         self._json_dataset = dataset.to_json()
         self._tiles = tiles
             
-    def get_map(self, varname_id=None, shape="marker", add_to_map=None):
+    def get_map(self, varname_id=None, shape="marker", add_to_map=None, clustered=False, min_zoom=2, max_zoom=12,
+                cell_pixels=60, members_url=None, embed_labels=False):
+        """Build a map of the gauges
+        
+        Parameters
+        ----------
+        varname_id : str or None
+            Name of the variable displayed in the popups (e.g. gauge identifier). Default is None (no popup)
+        shape : str
+            Shape of the gauges, 'marker' or 'circle' (not clustered mode)
+        add_to_map : folium.Map or None
+            Map to add the gauges to. Default is None (new map)
+        clustered : bool
+            True to display gauges as clusters precomputed on a grid for each zoom level (only the centroids and
+            counts of the clusters are sent to the page, see GageClustersLayer)
+        min_zoom : int
+            Lowest zoom level with precomputed clusters (clustered mode)
+        max_zoom : int
+            Highest zoom level with precomputed clusters (clustered mode)
+        cell_pixels : int
+            Size of the cells of the clustering grid in screen pixels (clustered mode)
+        members_url : str or None
+            URL prefix from which the gauges of a cluster are fetched when it is clicked (clustered mode, see
+            GagesExplorer). Default is None (no request)
+        embed_labels : bool
+            True to embed the labels of all the gauges in the page when 'members_url' is None (clustered mode, small
+            maps only)
+        """
 
         if add_to_map is None:
             
@@ -41,14 +70,31 @@ class GagesMap():
             
             parent_map = add_to_map
 
+        # Retrieve coordinates and popup labels at once
+        points = np.asarray(self._dataset.geometry.values)
+        lon = shapely.get_x(points)
+        lat = shapely.get_y(points)
+        if varname_id is not None:
+            labels = [str(label) for label in self._dataset[varname_id].to_numpy()]
+        else:
+            labels = None
+
+        if clustered:
+            if labels is None:
+                labels = [str(index) for index in self._dataset.index]
+            GageClustersLayer(lon, lat, labels, min_zoom=min_zoom, max_zoom=max_zoom, cell_pixels=cell_pixels,
+                              members_url=members_url, embed_labels=embed_labels, name="Gauges").add_to(parent_map)
+            if add_to_map is None:
+                return new_map
+            return
+
         # Add layer of circles
-        for index in self._dataset.index:
+        for index in range(0, lon.size):
             
-            coords = self._dataset.geometry.loc[index].coords[0]
-            coords = (coords[1], coords[0])
+            coords = (lat[index], lon[index])
             
-            if varname_id is not None:
-                popup = "%s" % str(self._dataset.loc[index, varname_id].values[0])
+            if labels is not None:
+                popup = labels[index]
             else:
                 popup = None
 
@@ -2,6 +2,7 @@ import branca
 import folium
 import numpy as np
 
+from .static_maps import render_static_map
 from .style_functions import *
 
 
@@ -28,22 +29,7 @@ class NodesMap():
     def get_map(self, varname=None, cmap=None, tooltip_attributes=None, add_to_map=None, varlimits=[None, None]):
 
         
-        if cmap is None and varname is not None:
-            if varlimits[0] is None:
-                varlimits[0]= self._dataset[varname].min()
-            if varlimits[1] is None:
-                varlimits[1]= self._dataset[varname].max()
-            
-            cmap = branca.colormap.linear.YlOrRd_09.scale(varlimits[0],
-                                                          varlimits[1])
-        elif isinstance(cmap, list):
-            if varlimits[0] is None:
-                varlimits[0]= self._dataset[varname].min()
-            if varlimits[1] is None:
-                varlimits[1]= self._dataset[varname].max()
-
-            cmap = branca.colormap.LinearColormap(cmap).scale(varlimits[0],
-                                                              varlimits[1])
+        cmap = build_colormap(self._dataset, varname, cmap, varlimits)
         
 
         if add_to_map is None:
@@ -91,3 +77,29 @@ class NodesMap():
         
         if add_to_map is None:
             return new_map
+
+    def get_static_map(self, varname=None, cmap=None, varlimits=[None, None], fname=None, **kwargs):
+        """Build a static (matplotlib) map with nodes as points colored with values of a variable. Suited for
+        large datasets (continental overviews) and headless environments
+        
+        Parameters
+        ----------
+        varname : str
+            Name of the variable used for coloring
+        cmap : branca.Colormap or list
+            Colormap used for coloring
+        varlimits : list
+            Limits of the colormap
+        fname : str or None
+            Output image file
+        kwargs : dict
+            Supplementary arguments for render_static_map (figsize, dpi, markersize, title...)
+            
+        Return
+        ------
+        matplotlib.figure.Figure
+            Figure of the map
+        """
+        
+        return render_static_map(self._dataset, varname=varname, cmap=cmap, varlimits=varlimits, kind="points",
+                                 fname=fname, **kwargs)
@@ -1,15 +1,20 @@
 import branca
 import folium
+import json
 import numpy as np
+import pandas as pd
 
+from ..io.ragged import RaggedArray
+from .static_maps import render_static_map
 from .style_functions import *
+from .time_slider import DeltaTimeSliderLayer, NO_DATA_CODE
 
 
 class ReachesMap():
     """Object to handle maps of data at the reach level
     """
     
-    def __init__(self, dataset, tiles="cartodbpositron"):
+    def __init__(self, dataset, tiles="cartodbpositron", simplify_tolerance=None):
         """Instanciate a ReachesMap object to create maps that display reaches
         
         Parameters
@@ -18,13 +23,65 @@ class ReachesMap():
             dataset to display
         tiles : str
             Identifier of the tiles for the background map
+        simplify_tolerance : float or None
+            Tolerance used to simplify the centerlines (in the units of the coordinate reference system of the
+            dataset). Default is None (no simplification)
         """
         
-        # Store parameters
+        # Simplify geometries
+        if simplify_tolerance is not None:
+            dataset = dataset.set_geometry(dataset.geometry.simplify(simplify_tolerance))
+        
+        # Store parameters (the GeoJSON is serialized once, add_variables only updates the properties)
         self._dataset = dataset
-        self._json_dataset = dataset.to_json()
+        self._json_dataset = json.loads(dataset.to_json())
         self._tiles = tiles
             
+    def add_variables(self, data, columns=None, fill_value=np.nan, reduction="mean"):
+        """Add variables to the dataset, matching reaches on reach_id (e.g. statistics of a ResultsSummary)
+        
+        Parameters
+        ----------
+        data : pandas.DataFrame, pandas.Series or RaggedArray
+            Data indexed by reach_id, or ragged array with reach identifiers (reduced per reach)
+        columns : list or None
+            List of columns to add. Default is None (all columns). For a RaggedArray, name of the column (default is
+            the reduction)
+        fill_value : float
+            Value for reaches not found in data
+        reduction : str
+            Reduction applied to the rows of a RaggedArray (see RaggedArray.reduce)
+        """
+        
+        if isinstance(data, RaggedArray):
+            if data.ids is None:
+                raise ValueError("RaggedArray must have reach identifiers")
+            name = reduction if columns is None else columns[0]
+            data = pd.Series(data.reduce(reduction), index=data.ids, name=name)
+            columns = None
+        if isinstance(data, pd.Series):
+            data = data.to_frame()
+        if columns is None:
+            columns = list(data.columns)
+        
+        # Vectorized matching of reach identifiers
+        reach_id = self._dataset["reach_id"].to_numpy().astype(np.int64)
+        indices = pd.Index(data.index.to_numpy().astype(np.int64)).get_indexer(reach_id)
+        found = indices >= 0
+        
+        dataset = self._dataset.copy()
+        features = self._json_dataset["features"]
+        for column in columns:
+            values = data[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            dataset[column] = np.where(found, values[np.maximum(indices, 0)], fill_value)
+            
+            # Update the properties of the features (null for NaN, as in GeoDataFrame.to_json)
+            column_values = dataset[column].to_numpy()
+            properties = np.where(np.isfinite(column_values), column_values, None).tolist()
+            for feature, value in zip(features, properties):
+                feature["properties"][column] = value
+        self._dataset = dataset
+            
     def get_centerlines_map(self, varname=None, cmap=None, tooltip_attributes=None, add_to_map=None, varlimits=[None, None]):
         """Build a map width reaches as centerlines colored with values of a variable
         
@@ -41,24 +98,7 @@ class ReachesMap():
         """
         
         # Set default values for unset parameters
-        if cmap is None and varname is not None:
-            if varlimits[0] is None:
-                varlimits[0]= self._dataset[varname].min()
-            if varlimits[1] is None:
-                varlimits[1]= self._dataset[varname].max()
-
-            #cmap = branca.colormap.linear.YlOrRd_09.scale(self._dataset[varname].min(),
-            #                                              self._dataset[varname].max())
-            cmap = branca.colormap.linear.YlOrRd_09.scale(varlimits[0],
-                                                          varlimits[1])
-        elif isinstance(cmap, list):
-            if varlimits[0] is None:
-                varlimits[0]= self._dataset[varname].min()
-            if varlimits[1] is None:
-                varlimits[1]= self._dataset[varname].max()
-
-            cmap = branca.colormap.LinearColormap(cmap).scale(varlimits[0],
-                                                              varlimits[1])
+        cmap = build_colormap(self._dataset, varname, cmap, varlimits)
 
         if tooltip_attributes is None:
             if varname is None:
@@ -106,6 +146,130 @@ class ReachesMap():
         if add_to_map is None:
             return new_map
 
+    def get_static_map(self, varname=None, cmap=None, varlimits=[None, None], fname=None, **kwargs):
+        """Build a static (matplotlib) map with reaches as centerlines colored with values of a variable. Suited for
+        large datasets (continental overviews) and headless environments
+        
+        Parameters
+        ----------
+        varname : str
+            Name of the variable used for coloring
+        cmap : branca.Colormap or list
+            Colormap used for coloring
+        varlimits : list
+            Limits of the colormap
+        fname : str or None
+            Output image file
+        kwargs : dict
+            Supplementary arguments for render_static_map (figsize, dpi, linewidth, title...)
+            
+        Return
+        ------
+        matplotlib.figure.Figure
+            Figure of the map
+        """
+        
+        return render_static_map(self._dataset, varname=varname, cmap=cmap, varlimits=varlimits, kind="lines",
+                                 fname=fname, **kwargs)
+
+    def get_timeslider_map(self, values, times=None, varname="Q", cmap=None, varlimits=[None, None], n_colors=64,
+                           weight=3, keyframe_interval=50, add_to_map=None):
+        """Build an animated map with reaches as centerlines colored with a time-varying variable and a time slider
+        
+        The geometry is sent once, colors are quantized on a palette and only the reaches whose color changes
+        between consecutive frames are encoded, so that long animations remain small.
+        
+        Parameters
+        ----------
+        values : pandas.DataFrame, numpy.ndarray or RaggedArray
+            Values of the variable: a DataFrame indexed by reach_id with one column per time, an array of shape
+            (number of reaches in the dataset, number of times) or a RaggedArray with reach identifiers
+        times : list or None
+            Labels of the times. Default is None (columns of the DataFrame, or unique times of the RaggedArray)
+        varname : str
+            Name of the variable (colorbar caption and tooltip)
+        cmap : branca.Colormap or list
+            Colormap used for coloring
+        varlimits : list
+            Limits of the colormap, unset limits are set to the min/max of the values
+        n_colors : int
+            Number of colors of the palette (at most 254)
+        weight : float
+            Width of the centerlines
+        keyframe_interval : int
+            Number of frames between two full keyframes
+        """
+        
+        # Densify ragged arrays on their time grid
+        if isinstance(values, RaggedArray):
+            if values.ids is None:
+                raise ValueError("RaggedArray must have reach identifiers")
+            array, time_grid = values.to_dense()
+            values = pd.DataFrame(array, index=values.ids, columns=time_grid)
+        
+        # Align values on the reaches of the dataset
+        if isinstance(values, pd.DataFrame):
+            if times is None:
+                times = list(values.columns)
+            reach_id = self._dataset["reach_id"].to_numpy().astype(np.int64)
+            indices = pd.Index(values.index.to_numpy().astype(np.int64)).get_indexer(reach_id)
+            data = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            array = np.full((reach_id.size, data.shape[1]), np.nan)
+            array[indices >= 0] = data[indices[indices >= 0]]
+        else:
+            array = np.ma.filled(np.ma.asarray(values, dtype=np.float64), np.nan)
+            if array.ndim != 2 or array.shape[0] != self._dataset.shape[0]:
+                raise ValueError("'values' must have shape (number of reaches, number of times)")
+            if times is None:
+                raise ValueError("'times' must be set if 'values' is an array")
+        if len(times) != array.shape[1]:
+            raise ValueError("Size of 'times' does not match the number of frames")
+        
+        # Quantize values on a palette
+        varlimits = list(varlimits)
+        if varlimits[0] is None:
+            varlimits[0] = np.nanmin(array)
+        if varlimits[1] is None:
+            varlimits[1] = np.nanmax(array)
+        cmap = build_colormap(None, varname, cmap, varlimits)
+        n_colors = min(n_colors, NO_DATA_CODE - 1)
+        palette_values = np.linspace(cmap.vmin, cmap.vmax, n_colors)
+        palette = [cmap(value) for value in palette_values]
+        if cmap.vmax > cmap.vmin:
+            scaled = (array - cmap.vmin) / (cmap.vmax - cmap.vmin) * (n_colors - 1)
+        else:
+            scaled = np.zeros(array.shape)
+        codes = np.full(array.shape, NO_DATA_CODE, dtype=np.uint8)
+        valid = np.isfinite(array)
+        codes[valid] = np.clip(np.round(scaled[valid]), 0, n_colors - 1).astype(np.uint8)
+        
+        if add_to_map is None:
+        
+            # Retrieve bounding box and center
+            bounds = self._dataset.geometry.total_bounds.tolist()
+            center = (0.5 * (bounds[1] + bounds[3]), 0.5 * (bounds[0] + bounds[2]))
+            
+            # Create map
+            new_map = folium.Map(location=center, tiles=self._tiles, zoom_start=6)
+            parent_map = new_map
+            
+        else:
+            
+            parent_map = add_to_map
+        
+        # Add layer (geometry and reach_id only, values are sent as delta frames)
+        data = json.loads(self._dataset[["reach_id", "geometry"]].to_json())
+        DeltaTimeSliderLayer(data, codes, palette, palette_values, times, varname=varname, weight=weight,
+                             keyframe_interval=keyframe_interval,
+                             name="Time slider map of variable %s" % varname).add_to(parent_map)
+        
+        # Add colorbar
+        colormap = cmap.to_step(n=8)
+        colormap.caption = varname
+        colormap.add_to(parent_map)
+        
+        if add_to_map is None:
+            return new_map
             
     def get_polygons_map(self, varname, width_attribute, cmap=None, tooltip_attributes=None, add_to_map=None):
         """Build a map width reaches as polygons computed using the width, colored with values of a variable
@@ -135,22 +299,10 @@ class ReachesMap():
             else:
                 tooltip_attributes = ["reach_id", varname]
         
-        # Project dataset to EPSG:3857 to get distance in meters (for buffers)
+        # Compute buffers (in EPSG:3857 to get distance in meters) and project them to EPSG:4326
         dataset = self._dataset.to_crs('epsg:3857')
-        
-        # Add buffers
-        polygons = []
-        for index in dataset.index:
-            
-            # Retrieve centerline
-            centerline = dataset.loc[index, "geometry"]
-            
-            # Add buffer
-            polygon = centerline.buffer(dataset.loc[index, width_attribute], cap_style=2)
-            dataset.loc[index, "geometry"] = polygon
-            
-        # Project dataset back to EPSG:4326
-        dataset = dataset.to_crs('epsg:4326')
+        polygons = dataset.geometry.buffer(dataset[width_attribute].to_numpy(dtype=np.float64), cap_style=2)
+        dataset = dataset.set_geometry(polygons).to_crs('epsg:4326')
         
         if add_to_map is None:
         
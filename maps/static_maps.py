@@ -0,0 +1,120 @@
+import numpy as np
+
+from .style_functions import build_colormap, to_matplotlib_colormap
+
+
+def render_static_map(dataset, varname=None, cmap=None, varlimits=[None, None], kind="lines", fname=None,
+                      figsize=(12, 8), dpi=150, linewidth=0.6, markersize=2, title=None, colorbar=True, ax=None):
+    """Render a dataset of reaches (centerlines) or nodes (points) as a static image with matplotlib, without browser
+
+    All the geometries are drawn at once (one LineCollection or one scatter) with colors computed in a vectorized way
+    from the same colormap logic as the interactive maps. Lines are rasterized so that vector outputs (PDF, SVG)
+    remain small.
+
+    Parameters
+    ----------
+    dataset : geopandas.GeoDataFrame
+        Dataset to display (EPSG:4326)
+    varname : str or None
+        Name of the variable used for coloring. Default is None (random colors)
+    cmap : branca.Colormap, list or None
+        Colormap used for coloring (see build_colormap)
+    varlimits : list
+        Limits of the colormap
+    kind : str
+        Type of geometries: 'lines' or 'points'
+    fname : str or None
+        Output image file. Default is None (no output file)
+    figsize : tuple
+        Size of the figure (inches)
+    dpi : int
+        Resolution of the figure
+    linewidth : float
+        Width of the lines
+    markersize : float
+        Size of the points
+    title : str or None
+        Title of the map
+    colorbar : bool
+        True to add a colorbar
+    ax : matplotlib.axes.Axes or None
+        Axis to draw on. Default is None (create a new figure)
+
+    Return
+    ------
+    matplotlib.figure.Figure
+        Figure of the map
+    """
+
+    import shapely
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+
+    if ax is None:
+        # Figure created without pyplot so that no GUI backend is involved
+        fig = Figure(figsize=figsize, dpi=dpi)
+        ax = fig.add_subplot(1, 1, 1)
+    else:
+        fig = ax.figure
+
+    # Colors
+    if varname is not None:
+        cmap = build_colormap(dataset, varname, cmap, varlimits)
+        mpl_cmap, norm = to_matplotlib_colormap(cmap)
+        values = dataset[varname].to_numpy(dtype=np.float64, na_value=np.nan)
+        colors = None
+    else:
+        mpl_cmap = None
+        norm = None
+        values = None
+        colors = np.random.default_rng().random((dataset.shape[0], 3))
+
+    geometries = dataset.geometry.to_numpy()
+    if kind == "lines":
+
+        # Split multi-part geometries and retrieve all coordinates at once
+        parts, part_index = shapely.get_parts(geometries, return_index=True)
+        coords = shapely.get_coordinates(parts)
+        counts = shapely.get_num_coordinates(parts)
+        segments = np.split(coords, np.cumsum(counts)[:-1])
+
+        collection = LineCollection(segments, linewidths=linewidth, rasterized=True)
+        if values is not None:
+            collection.set_array(values[part_index])
+            collection.set_cmap(mpl_cmap)
+            collection.set_norm(norm)
+        else:
+            collection.set_color(colors[part_index])
+        ax.add_collection(collection)
+        mappable = collection
+
+    elif kind == "points":
+
+        coords = shapely.get_coordinates(shapely.centroid(geometries))
+        if values is not None:
+            mappable = ax.scatter(coords[:, 0], coords[:, 1], c=values, cmap=mpl_cmap, norm=norm, s=markersize,
+                                  linewidths=0, rasterized=True)
+        else:
+            mappable = ax.scatter(coords[:, 0], coords[:, 1], c=colors, s=markersize, linewidths=0,
+                                  rasterized=True)
+
+    else:
+        raise ValueError("'kind' must be 'lines' or 'points'")
+
+    # Set bounds and aspect (equirectangular projection at the center of the dataset)
+    bounds = dataset.geometry.total_bounds.tolist()
+    ax.set_xlim(bounds[0], bounds[2])
+    ax.set_ylim(bounds[1], bounds[3])
+    ax.set_aspect(1.0 / max(np.cos(np.deg2rad(0.5 * (bounds[1] + bounds[3]))), 1e-2))
+    ax.set_xlabel("longitude")
+    ax.set_ylabel("latitude")
+    if title is not None:
+        ax.set_title(title)
+
+    if varname is not None and colorbar:
+        fig.colorbar(mappable, ax=ax, label=varname, shrink=0.8)
+
+    if fname is not None:
+        fig.savefig(fname, dpi=dpi, bbox_inches="tight")
+
+    return fig
@@ -1,7 +1,81 @@
-from matplotlib import cm
+import branca
 import numpy as np
 import random
 
+
+def build_colormap(dataset, varname, cmap=None, varlimits=[None, None]):
+    """Build the colormap used to color a variable (shared by all the maps)
+    
+    Parameters
+    ----------
+    dataset : pandas.DataFrame
+        Dataset containing the variable
+    varname : str
+        Name of the variable used for coloring
+    cmap : branca.Colormap, list or None
+        Colormap, list of colors for a linear colormap or None for the default colormap (YlOrRd)
+    varlimits : list
+        Limits of the colormap, unset limits (None) are set to the min/max of the variable
+        
+    Return
+    ------
+    branca.Colormap
+        Colormap scaled to the limits
+    """
+    
+    if cmap is None and varname is not None:
+        varlimits = _complete_varlimits(dataset, varname, varlimits)
+        cmap = branca.colormap.linear.YlOrRd_09.scale(varlimits[0], varlimits[1])
+    elif isinstance(cmap, list):
+        varlimits = _complete_varlimits(dataset, varname, varlimits)
+        cmap = branca.colormap.LinearColormap(cmap).scale(varlimits[0], varlimits[1])
+        
+    return cmap
+
+
+def to_matplotlib_colormap(cmap):
+    """Convert a branca colormap to a matplotlib colormap and normalization, for vectorized coloring
+    
+    Parameters
+    ----------
+    cmap : branca.Colormap
+        Colormap
+        
+    Return
+    ------
+    tuple
+        matplotlib.colors.Colormap and matplotlib.colors.Normalize
+    """
+    
+    from matplotlib.colors import LinearSegmentedColormap, ListedColormap, Normalize
+    
+    vmin = cmap.vmin
+    vmax = cmap.vmax
+    norm = Normalize(vmin=vmin, vmax=vmax)
+    if isinstance(cmap, branca.colormap.StepColormap):
+        mpl_cmap = ListedColormap(cmap.colors)
+    else:
+        if vmax > vmin:
+            positions = [(index - vmin) / (vmax - vmin) for index in cmap.index]
+        else:
+            positions = np.linspace(0.0, 1.0, len(cmap.colors))
+        mpl_cmap = LinearSegmentedColormap.from_list("branca", list(zip(positions, cmap.colors)))
+    mpl_cmap.set_bad(alpha=0.0)
+    
+    return mpl_cmap, norm
+
+
+def _complete_varlimits(dataset, varname, varlimits):
+    """Set unset limits to the min/max of the variable
+    """
+    varlimits = list(varlimits)
+    if varlimits[0] is None:
+        varlimits[0]= dataset[varname].min()
+    if varlimits[1] is None:
+        varlimits[1]= dataset[varname].max()
+    return varlimits
+
+
 class ColormapStyleFunction:
     """Object to handle colormap style functions
     """
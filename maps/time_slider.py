@@ -0,0 +1,211 @@
+import base64
+
+from folium.map import Layer
+from jinja2 import Template
+import numpy as np
+
+
+# Code of the features without value in a frame (hidden)
+NO_DATA_CODE = 255
+
+
+class DeltaTimeSliderLayer(Layer):
+    """Layer of centerlines colored by a time-varying variable, with a time slider
+
+    The geometry is sent once. Colors are encoded as indices in a palette (one byte per feature and frame) and only the
+    features whose color changes between two consecutive frames are encoded (delta frames). Full keyframes are inserted
+    at regular intervals so that seeking backward stays cheap.
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+
+            function decode(b64, ArrayType) {
+                var chars = atob(b64);
+                var bytes = new Uint8Array(chars.length);
+                for (var i = 0; i < chars.length; i++) {
+                    bytes[i] = chars.charCodeAt(i);
+                }
+                return new ArrayType(bytes.buffer);
+            }
+
+            var palette = {{ this.palette|tojson }};
+            var paletteValues = {{ this.palette_values|tojson }};
+            var times = {{ this.times|tojson }};
+            var keyframes = {{ this.keyframes|tojson }};
+            var deltas = {{ this.deltas|tojson }};
+            var keyframeInterval = {{ this.keyframe_interval }};
+            var varname = {{ this.varname|tojson }};
+
+            var features = [];
+            var codes = null;
+            var current = -1;
+
+            function restyle(index) {
+                var code = codes[index];
+                if (code == {{ this.no_data_code }}) {
+                    features[index].setStyle({opacity: 0});
+                } else {
+                    features[index].setStyle({color: palette[code], opacity: 1});
+                }
+            }
+
+            function setFrame(frame) {
+                if (frame < current || current < 0 || frame - current > keyframeInterval) {
+                    // Restart from the closest keyframe
+                    var keyframe = Math.floor(frame / keyframeInterval) * keyframeInterval;
+                    codes = decode(keyframes[keyframe / keyframeInterval], Uint8Array).slice();
+                    for (var i = 0; i < features.length; i++) {
+                        restyle(i);
+                    }
+                    current = keyframe;
+                }
+                while (current < frame) {
+                    current += 1;
+                    var delta = deltas[current];
+                    var indices = decode(delta[0], Uint32Array);
+                    var values = decode(delta[1], Uint8Array);
+                    for (var j = 0; j < indices.length; j++) {
+                        codes[indices[j]] = values[j];
+                        restyle(indices[j]);
+                    }
+                }
+                label.innerHTML = times[frame];
+            }
+
+            var layer = L.geoJson({{ this.data|tojson }}, {
+                style: function(feature) {
+                    return {weight: {{ this.weight }}, opacity: 0};
+                },
+                onEachFeature: function(feature, featureLayer) {
+                    var index = features.length;
+                    features.push(featureLayer);
+                    featureLayer.bindTooltip(function() {
+                        var text = "reach_id: " + feature.properties.reach_id;
+                        if (codes !== null && codes[index] != {{ this.no_data_code }}) {
+                            text += "<br>" + varname + ": " + paletteValues[codes[index]].toPrecision(4);
+                        }
+                        return text;
+                    });
+                }
+            });
+
+            // Slider control
+            var label = null;
+            var slider = L.control({position: "bottomleft"});
+            slider.onAdd = function(map) {
+                var container = L.DomUtil.create("div", "leaflet-bar");
+                container.style.background = "white";
+                container.style.padding = "6px";
+                var input = L.DomUtil.create("input", "", container);
+                input.type = "range";
+                input.min = 0;
+                input.max = times.length - 1;
+                input.value = {{ this.init_frame }};
+                input.style.width = "300px";
+                label = L.DomUtil.create("div", "", container);
+                L.DomEvent.disableClickPropagation(container);
+                L.DomEvent.on(input, "input", function() {
+                    setFrame(parseInt(input.value));
+                });
+                return container;
+            };
+            layer.on("add", function() {
+                slider.addTo(layer._map);
+                setFrame({{ this.init_frame }});
+            });
+            layer.on("remove", function() {
+                slider.remove();
+            });
+
+            return layer;
+        })();
+        {% if this.show %}
+        {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endif %}
+        {% endmacro %}
+        """)
+
+    def __init__(self, data, codes, palette, palette_values, times, varname=None, weight=3, keyframe_interval=50,
+                 init_frame=0, name=None, overlay=True, control=True, show=True):
+        """Create the layer
+
+        Parameters
+        ----------
+        data : dict
+            GeoJSON data (one feature per reach, with a 'reach_id' property)
+        codes : numpy.ndarray
+            Palette indices, shape (number of features, number of frames). NO_DATA_CODE for missing values
+        palette : list
+            List of colors (at most 255 colors)
+        palette_values : list
+            Values corresponding to the colors of the palette
+        times : list
+            Labels of the frames
+        varname : str or None
+            Name of the variable (tooltip)
+        weight : float
+            Width of the centerlines
+        keyframe_interval : int
+            Number of frames between two full keyframes
+        init_frame : int
+            Index of the frame displayed at startup
+        """
+
+        super(DeltaTimeSliderLayer, self).__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "DeltaTimeSliderLayer"
+
+        if len(palette) >= NO_DATA_CODE:
+            raise ValueError("Palette must have less than %i colors" % NO_DATA_CODE)
+        codes = np.asarray(codes, dtype=np.uint8)
+        if codes.ndim != 2 or codes.shape[1] != len(times):
+            raise ValueError("'codes' must have shape (number of features, number of times)")
+
+        self.data = data
+        self.palette = list(palette)
+        self.palette_values = [float(value) for value in palette_values]
+        self.times = [str(time) for time in times]
+        self.varname = varname
+        self.weight = weight
+        self.keyframe_interval = max(int(keyframe_interval), 1)
+        self.init_frame = init_frame
+        self.no_data_code = NO_DATA_CODE
+        self.keyframes, self.deltas = encode_delta_frames(codes, self.keyframe_interval)
+
+
+def encode_delta_frames(codes, keyframe_interval=50):
+    """Encode frames of palette indices as keyframes and deltas
+
+    Parameters
+    ----------
+    codes : numpy.ndarray
+        Palette indices (uint8), shape (number of features, number of frames)
+    keyframe_interval : int
+        Number of frames between two full keyframes
+
+    Return
+    ------
+    tuple
+        List of base64 keyframes (full uint8 arrays) and list of deltas (pairs of base64 uint32 feature indices and
+        base64 uint8 codes, the first delta is empty)
+    """
+
+    codes = np.asarray(codes, dtype=np.uint8)
+
+    keyframes = [_encode_array(codes[:, frame]) for frame in range(0, codes.shape[1], keyframe_interval)]
+
+    # Changes between consecutive frames, computed at once
+    changes = codes[:, 1:] != codes[:, :-1]
+    deltas = [["", ""]]
+    for frame in range(1, codes.shape[1]):
+        indices = np.flatnonzero(changes[:, frame - 1])
+        deltas.append([_encode_array(indices.astype("<u4")), _encode_array(codes[indices, frame])])
+
+    return keyframes, deltas
+
+
+def _encode_array(array):
+    """Encode an array as a base64 string (little endian)
+    """
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode("ascii")
@@ -1,11 +1,7 @@
-import matplotlib.pyplot as plt
 import numpy as np
-try:
-    import plotly.express as px
-    import plotly.graph_objects as go
-except:
-    px = None
-    go = None
+
+from ..io.alignment import days_since_2000_to_datetime
+from ..io.ragged import RaggedArray
 
 
 class DischargePlot:
@@ -53,7 +49,7 @@ class DischargePlot:
         # Convert times
         if times is not None:
             if self._date_units == "days_since_2000":
-                times=np.datetime64("2000-01-01") + np.timedelta64(times, "D")
+                times = days_since_2000_to_datetime(times)
             
         self._priors.append({"times" : times, 
                              "values" : values, 
@@ -68,8 +64,9 @@ class DischargePlot:
         ----------
         label : str
             Label for the legend
-        values : float or iterable
-            Constant or timeseries product discharge
+        values : float, iterable or RaggedArray
+            Constant or timeseries product discharge. A RaggedArray must have a single row (e.g. discharge.select(reach_id))
+            and provides the times if they are not set
         times : float or iterable (or None)
             Times corresponding to the discharge values
         color : str (or other choices, see Matplotlib)
@@ -78,13 +75,20 @@ class DischargePlot:
             Style of the corresponding line (see Matplotlib)
         """
 
+        # Extract series from ragged array
+        if isinstance(values, RaggedArray):
+            if values.n_rows != 1:
+                raise ValueError("RaggedArray must have a single row")
+            ragged_times, values = values.row(0)
+            if times is None:
+                times = ragged_times
+
         # Convert times
         if times is not None:
             if isinstance(times, np.ma.core.MaskedArray):
                 times = times.filled(np.nan)
             if self._date_units == "days_since_2000":
-                dt = np.array([np.timedelta64(days, "D") for days in times])
-                times = np.datetime64("2000-01-01") + dt
+                times = days_since_2000_to_datetime(times)
         
         self._products.append({"times" : times, 
                                "values" : values, 
@@ -104,13 +108,17 @@ class DischargePlot:
             Axis to add plot to
         """
         
+        # Plotting libraries are imported on first rendering to keep the import of the module light
         if backend == "matplotlib":
+            import matplotlib.pyplot as plt
             if fig is None:
                 fig = plt.figure()
             if ax is None:
                 ax = plt.gca()
         elif backend == "plotly":
-            if go is None:
+            try:
+                import plotly.graph_objects as go
+            except ImportError:
                 raise RuntimeError("plotly not found. Please install it or use backend='matplotlib'")
             if fig is None:
                 fig = go.Figure()
@@ -120,8 +128,8 @@ class DischargePlot:
             xmin = self._products[0]["times"][0]
             xmax = self._products[0]["times"][-1]
         else:
-            xmin = np.PINF
-            xmax = np.NINF
+            xmin = np.inf
+            xmax = -np.inf
 
         for product in self._products:
             if backend == "matplotlib":
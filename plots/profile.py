@@ -0,0 +1,301 @@
+import numpy as np
+
+from ..io.ragged import RaggedArray
+from ..io.swot import node_to_reach_id
+
+
+class ProfilePlot:
+    """Object to handle generations of longitudinal profile plots (variables along the distance to the outlet of a
+    main stem)
+    """
+
+    def __init__(self, reach_ids, dist_out, title=None, distance_units="km"):
+        """Create a profile plot for a main stem
+
+        Parameters
+        ----------
+        reach_ids : iterable
+            Identifiers of the reaches of the main stem (e.g. SwordTopology.main_stem_path)
+        dist_out : iterable, pandas.DataFrame or pandas.Series
+            Distance to the outlet (m) of the reaches: an array in the order of reach_ids, a Series indexed by reach_id
+            or a DataFrame with columns reach_id and dist_out (e.g. SwordNetCDF.dataset)
+        title : str or None
+            Title of the plot
+        distance_units : str
+            Units of the distance axis, 'km' or 'm'
+        """
+
+        reach_ids = np.asarray(reach_ids, dtype=np.int64)
+        if hasattr(dist_out, "columns"):
+            dist_out = _join(dist_out["dist_out"].to_numpy(dtype=np.float64),
+                             dist_out["reach_id"].to_numpy().astype(np.int64), reach_ids)
+        elif hasattr(dist_out, "to_numpy"):
+            dist_out = _join(dist_out.to_numpy(dtype=np.float64), dist_out.index.to_numpy().astype(np.int64),
+                             reach_ids)
+        else:
+            dist_out = np.ma.filled(np.ma.asarray(dist_out, dtype=np.float64), np.nan)
+        if dist_out.shape != reach_ids.shape:
+            raise ValueError("'dist_out' must have one value per reach")
+        if np.any(np.isnan(dist_out)):
+            raise ValueError("Distance to the outlet not found for reach %i" % reach_ids[np.isnan(dist_out)][0])
+        if distance_units not in ["km", "m"]:
+            raise ValueError("'distance_units' must be 'km' or 'm'")
+
+        # Store reaches ordered from upstream to downstream
+        order = np.argsort(-dist_out, kind="stable")
+        self._reach_ids = reach_ids[order]
+        self._dist_out = dist_out[order]
+        self._sorter = np.argsort(self._reach_ids, kind="stable")
+
+        self._title = title
+        self._distance_units = distance_units
+        self._variables = []
+
+    @classmethod
+    def from_topology(cls, topology, reach_id_from, reach_id_to, **kwargs):
+        """Create a profile plot for the main stem between two reaches
+
+        Parameters
+        ----------
+        topology : SwordTopology
+            Topology (with distances to the outlet)
+        reach_id_from : int
+            Identifier of the first reach
+        reach_id_to : int
+            Identifier of the second reach
+        kwargs : dict
+            Supplementary arguments for ProfilePlot
+
+        Return
+        ------
+        ProfilePlot
+            Profile plot
+        """
+        if topology.dist_out is None:
+            raise ValueError("Topology has no distances to the outlet")
+        reach_ids = topology.main_stem_path(reach_id_from, reach_id_to)
+        return cls(reach_ids, topology.dist_out[topology.indices(reach_ids)], **kwargs)
+
+    @property
+    def reach_ids(self):
+        return self._reach_ids
+
+    @property
+    def dist_out(self):
+        return self._dist_out
+
+    def reach_indices(self, reach_ids):
+        """Retrieve the positions of reaches in the profile
+
+        Parameters
+        ----------
+        reach_ids : iterable
+            Reach identifiers
+
+        Return
+        ------
+        numpy.ndarray
+            Positions in the profile (-1 for reaches that are not on the main stem)
+        """
+        reach_ids = np.atleast_1d(np.asarray(reach_ids, dtype=np.int64))
+        pos = np.minimum(np.searchsorted(self._reach_ids, reach_ids, sorter=self._sorter), self._sorter.size - 1)
+        found = self._reach_ids[self._sorter[pos]] == reach_ids
+        return np.where(found, self._sorter[pos], -1)
+
+    def add_variable(self, label, values, ids=None, times=None, level="reach", dist_out=None, color=None,
+                     linestyle=None, cmap=None):
+        """Add a variable
+
+        Parameters
+        ----------
+        label : str
+            Label for the legend (or the axis)
+        values : numpy.ndarray, pandas.Series, pandas.DataFrame or RaggedArray
+            Values of the variable: an array of shape (number of rows,) or (number of rows, number of times), a Series
+            or DataFrame (one column per time) indexed by identifiers, or a RaggedArray with identifiers. At reach
+            level without identifiers, rows are the reaches of the profile in the order given at creation
+        ids : iterable or None
+            Identifiers of the rows (reach_id or node_id). Default is None (index or identifiers of values)
+        times : iterable or None
+            Times of the columns. Default is None (columns of the DataFrame or unique times of the RaggedArray)
+        level : str
+            Level of the values, 'reach' or 'node'. Nodes are kept if their reach is on the main stem
+        dist_out : iterable or None
+            Distance to the outlet (m) of the nodes (required at node level)
+        color : str or None
+            Color of the line (single time) or None
+        linestyle : str or None
+            Style of the lines (see Matplotlib)
+        cmap : str or None
+            Colormap used to color the lines by time (several times). Default is None ('viridis')
+        """
+
+        # Convert values to a dense (rows x times) array
+        if isinstance(values, RaggedArray):
+            if ids is None:
+                ids = values.ids
+            values, ragged_times = values.to_dense(times)
+            if times is None:
+                times = ragged_times
+        elif hasattr(values, "columns"):
+            if ids is None:
+                ids = values.index.to_numpy()
+            if times is None:
+                times = list(values.columns)
+            values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        elif hasattr(values, "to_numpy"):
+            if ids is None:
+                ids = values.index.to_numpy()
+            values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        values = np.ma.filled(np.ma.asarray(values, dtype=np.float64), np.nan)
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        if times is not None and len(times) != values.shape[1]:
+            raise ValueError("Size of 'times' does not match the number of columns of 'values'")
+
+        # Join on the reaches of the profile
+        if level == "reach":
+            if ids is None:
+                if values.shape[0] != self._reach_ids.size:
+                    raise ValueError("'values' must have one row per reach of the profile")
+                ids = self._reach_ids
+            positions = self.reach_indices(ids)
+            rows = np.flatnonzero(positions >= 0)
+            distance = self._dist_out[positions[rows]]
+        elif level == "node":
+            if ids is None or dist_out is None:
+                raise ValueError("'ids' and 'dist_out' must be set at node level")
+            ids = np.asarray(ids, dtype=np.int64)
+            reach_ids = node_to_reach_id(ids)
+            rows = np.flatnonzero(self.reach_indices(reach_ids) >= 0)
+            distance = np.ma.filled(np.ma.asarray(dist_out, dtype=np.float64), np.nan)[rows]
+        else:
+            raise ValueError("'level' must be 'reach' or 'node'")
+
+        # Sort from upstream to downstream
+        order = np.argsort(-distance, kind="stable")
+        self._variables.append({"label": label,
+                                "distance": distance[order],
+                                "values": values[rows[order]],
+                                "times": times,
+                                "color": color,
+                                "linestyle": linestyle,
+                                "cmap": cmap})
+
+    def render(self, fig=None, ax=None, backend="matplotlib"):
+        """Render the plot (one panel per variable)
+
+        Parameters
+        ----------
+        fig : matplotlib.Figure or plotly.graph_objects.Figure
+            Figure to add plot to. A plotly figure created with make_subplots gets one row per variable, other plotly
+            figures get all the variables on their single axis
+        ax : matplotlib.Axis or list
+            Axis (or list of axes, one per variable) to add plot to
+
+        Return
+        ------
+        matplotlib.Figure or plotly.graph_objects.Figure
+            Figure
+        """
+
+        if len(self._variables) == 0:
+            raise RuntimeError("No variable to plot")
+        scale = 1e-3 if self._distance_units == "km" else 1.0
+        xlabel = "Distance to outlet (%s)" % self._distance_units
+
+        # Plotting libraries are imported on first rendering to keep the import of the module light
+        if backend == "matplotlib":
+            import matplotlib.pyplot as plt
+            from matplotlib.collections import LineCollection
+            from matplotlib.colors import Normalize
+
+            if ax is None:
+                if fig is None:
+                    fig = plt.figure()
+                axes = fig.subplots(len(self._variables), 1, sharex=True, squeeze=False)[:, 0]
+            else:
+                axes = np.atleast_1d(ax)
+                if fig is None:
+                    fig = axes[0].figure
+
+            for variable, axis in zip(self._variables, axes):
+                x = variable["distance"] * scale
+                values = variable["values"]
+                if values.shape[1] == 1:
+                    axis.plot(x, values[:, 0], c=variable["color"], ls=variable["linestyle"],
+                              label=variable["label"])
+                else:
+                    # One line per time, all drawn in a single collection
+                    segments = np.empty((values.shape[1], x.size, 2))
+                    segments[:, :, 0] = x
+                    segments[:, :, 1] = values.T
+                    norm = Normalize(0, values.shape[1] - 1)
+                    lines = LineCollection(segments, cmap=variable["cmap"] or "viridis", norm=norm,
+                                           linestyles=variable["linestyle"] or "solid")
+                    lines.set_array(np.arange(values.shape[1]))
+                    axis.add_collection(lines)
+                    axis.autoscale_view()
+                    colorbar = fig.colorbar(lines, ax=axis)
+                    if variable["times"] is not None:
+                        ticks = np.linspace(0, values.shape[1] - 1, min(values.shape[1], 6)).round().astype(int)
+                        colorbar.set_ticks(ticks)
+                        colorbar.set_ticklabels([str(variable["times"][tick]) for tick in ticks])
+                axis.set_ylabel(variable["label"])
+            axes[0].invert_xaxis()
+            axes[-1].set_xlabel(xlabel)
+            if self._title is not None:
+                axes[0].set_title(self._title)
+
+        elif backend == "plotly":
+            try:
+                import plotly.graph_objects as go
+                from plotly.subplots import make_subplots
+            except ImportError:
+                raise RuntimeError("plotly not found. Please install it or use backend='matplotlib'")
+
+            if fig is None:
+                fig = make_subplots(rows=len(self._variables), cols=1, shared_xaxes=True)
+            try:
+                fig.get_subplot(1, 1)
+                has_subplots = True
+            except Exception:
+                has_subplots = False
+            for row, variable in enumerate(self._variables):
+                position = {"row": row + 1, "col": 1} if has_subplots else {}
+                x = variable["distance"] * scale
+                values = variable["values"]
+                if values.shape[1] == 1:
+                    fig.add_trace(go.Scatter(x=x, y=values[:, 0], mode="lines", name=variable["label"],
+                                             line={"color": variable["color"], "dash": variable["linestyle"]}),
+                                  **position)
+                else:
+                    # All times in a single trace, separated by gaps
+                    xs = np.append(np.broadcast_to(x, (values.shape[1], x.size)),
+                                   np.full((values.shape[1], 1), np.nan), axis=1).ravel()
+                    ys = np.append(values.T, np.full((values.shape[1], 1), np.nan), axis=1).ravel()
+                    fig.add_trace(go.Scatter(x=xs, y=ys, mode="lines", name=variable["label"],
+                                             line={"color": variable["color"], "width": 1}, opacity=0.5),
+                                  **position)
+                if has_subplots:
+                    fig.update_yaxes(title_text=variable["label"], **position)
+            fig.update_xaxes(autorange="reversed")
+            if has_subplots:
+                fig.update_xaxes(title_text=xlabel, row=len(self._variables), col=1)
+            else:
+                fig.update_xaxes(title_text=xlabel)
+            if self._title is not None:
+                fig.update_layout(title=self._title)
+        else:
+            raise ValueError("'backend' must be 'matplotlib' or 'plotly'")
+
+        return fig
+
+
+def _join(values, ids, target_ids):
+    """Retrieve the values of target identifiers (NaN for identifiers not found)
+    """
+    sorter = np.argsort(ids, kind="stable")
+    pos = np.minimum(np.searchsorted(ids, target_ids, sorter=sorter), max(sorter.size - 1, 0))
+    found = ids[sorter[pos]] == target_ids
+    return np.where(found, values[sorter[pos]], np.nan)
@@ -0,0 +1,120 @@
+"""Shared fixtures of the tests: import of the package and small synthetic netCDF files
+
+The package is imported by the name of its directory (as in benchmarks/import_time.py), so the tests run from a
+source checkout:
+
+    python -m pytest tests
+"""
+import importlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+
+# Root of the package (parent directory of the tests) and package name
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = os.path.basename(PACKAGE_DIR)
+if os.path.dirname(PACKAGE_DIR) not in sys.path:
+    sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+
+FILL_VALUE = -999999999999.0
+
+
+@pytest.fixture
+def swotio():
+    """Subpackage io of the package
+    """
+    return importlib.import_module("%s.io" % PACKAGE_NAME)
+
+
+@pytest.fixture(autouse=True)
+def close_pool():
+    """Close the handles of the shared netCDF pool after each test, so that temporary files can be rewritten
+    """
+    yield
+    pool = importlib.import_module("%s.io.pool" % PACKAGE_NAME)
+    pool.get_pool().close_all()
+
+
+@pytest.fixture
+def make_sword(tmp_path):
+    """Factory of SWORD files with a reaches group holding reach_id, dist_out and the topology variables
+    """
+    import netCDF4 as nc
+
+    def make(reach_id, rch_id_up=None, rch_id_dn=None, dist_out=None, name="sword.nc"):
+        fname = str(tmp_path / name)
+        reach_id = np.asarray(reach_id, dtype=np.int64)
+        with nc.Dataset(fname, "w") as dataset:
+            group = dataset.createGroup("reaches")
+            dataset.createDimension("num_reaches", reach_id.size)
+            dataset.createDimension("num_domains", 4)
+            group.createVariable("reach_id", "i8", ("num_reaches",))[:] = reach_id
+            if dist_out is not None:
+                group.createVariable("dist_out", "f8", ("num_reaches",), fill_value=FILL_VALUE)[:] = dist_out
+            for varname, neighbours in [("rch_id_up", rch_id_up), ("rch_id_dn", rch_id_dn)]:
+                if neighbours is not None:
+                    variable = group.createVariable(varname, "i8", ("num_domains", "num_reaches"))
+                    variable[:] = np.asarray(neighbours, dtype=np.int64)
+        return fname
+
+    return make
+
+
+@pytest.fixture
+def make_results(tmp_path):
+    """Factory of results files: reaches/reach_id and, for each algorithm, a discharge variable, a time variable 't'
+    (shape (num_reaches, nt)) and a parameter A0. NaN values are written as fill values
+    """
+    import netCDF4 as nc
+
+    def make(reach_id, discharge, times=None, a0=None, name="results.nc"):
+        fname = str(tmp_path / name)
+        reach_id = np.asarray(reach_id, dtype=np.int64)
+        with nc.Dataset(fname, "w") as dataset:
+            dataset.createDimension("num_reaches", reach_id.size)
+            dataset.createGroup("reaches").createVariable("reach_id", "i8", ("num_reaches",))[:] = reach_id
+            for (algorithm, varname), values in discharge.items():
+                values = np.asarray(values, dtype=np.float64)
+                dimension = "nt_%s" % algorithm
+                dataset.createDimension(dimension, values.shape[1])
+                group = dataset.createGroup(algorithm)
+                variable = group.createVariable(varname, "f8", ("num_reaches", dimension), fill_value=FILL_VALUE)
+                variable[:] = np.ma.masked_invalid(values)
+                if times is not None:
+                    algorithm_times = np.asarray(times[algorithm], dtype=np.float64)
+                    variable = group.createVariable("t", "f8", ("num_reaches", dimension), fill_value=FILL_VALUE)
+                    variable[:] = np.ma.masked_invalid(np.broadcast_to(algorithm_times, values.shape))
+                if a0 is not None:
+                    variable = group.createVariable("A0", "f8", ("num_reaches",), fill_value=FILL_VALUE)
+                    variable[:] = np.ma.masked_invalid(np.asarray(a0[algorithm], dtype=np.float64))
+        return fname
+
+    return make
+
+
+@pytest.fixture
+def make_sos(tmp_path):
+    """Factory of SoS files: reaches group (reach_id, width), model group (mean_q) and gbpriors/reach group (logA0)
+    """
+    import netCDF4 as nc
+
+    def make(reach_id, width=None, name="sos.nc"):
+        fname = str(tmp_path / name)
+        reach_id = np.asarray(reach_id, dtype=np.int64)
+        if width is None:
+            width = np.arange(reach_id.size) * 10.0 + 50.0
+        with nc.Dataset(fname, "w") as dataset:
+            dataset.createDimension("num_reaches", reach_id.size)
+            reaches = dataset.createGroup("reaches")
+            reaches.createVariable("reach_id", "i8", ("num_reaches",))[:] = reach_id
+            reaches.createVariable("width", "f8", ("num_reaches",))[:] = width
+            model = dataset.createGroup("model")
+            model.createVariable("mean_q", "f8", ("num_reaches",))[:] = np.asarray(width) * 2.0
+            gbpriors = dataset.createGroup("gbpriors").createGroup("reach")
+            gbpriors.createVariable("logA0", "f8", ("num_reaches",))[:] = np.log(np.asarray(width))
+        return fname
+
+    return make
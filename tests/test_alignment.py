@@ -0,0 +1,131 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from conftest import PACKAGE_NAME
+
+
+@pytest.fixture
+def alignment():
+    return importlib.import_module("%s.io.alignment" % PACKAGE_NAME)
+
+
+@pytest.fixture
+def series(swotio):
+    """Ragged series of 4 rows with unsorted times, the last row is empty
+    """
+    rng = np.random.default_rng(0)
+    values_list = [rng.random(12) * 100, rng.random(5) * 100, rng.random(1) * 100, np.zeros(0)]
+    times_list = [rng.permutation(np.arange(12) * 3.0 + 0.5), np.array([0.0, 2.0, 9.0, 20.0, 21.0]), np.array([7.0]),
+                  np.zeros(0)]
+    return swotio.RaggedArray.from_lists(values_list, times_list, ids=[1, 2, 3, 4])
+
+
+def _brute_force(series, grid, method, tolerance=None, how="mean"):
+    """Reference implementation, one row and one time of the grid at a time
+    """
+    result = np.full((series.n_rows, len(grid)), np.nan)
+    for row in range(series.n_rows):
+        start, stop = series.offsets[row], series.offsets[row + 1]
+        times, values = series.times[start:stop], series.values[start:stop]
+        valid = np.isfinite(values)
+        times, values = times[valid], values[valid]
+        order = np.argsort(times, kind="stable")
+        times, values = times[order], values[order]
+        for column, time in enumerate(grid):
+            if method == "nearest" and times.size > 0:
+                distance = np.abs(times - time)
+                if tolerance is None or distance.min() <= tolerance:
+                    result[row, column] = values[np.argmin(distance)]
+            elif method == "linear":
+                before, after = np.flatnonzero(times <= time), np.flatnonzero(times >= time)
+                if before.size > 0 and after.size > 0:
+                    previous, following = before[-1], after[0]
+                    gap = times[following] - times[previous]
+                    if tolerance is None or gap <= tolerance:
+                        weight = 0.0 if gap == 0 else (time - times[previous]) / gap
+                        result[row, column] = (1 - weight) * values[previous] + weight * values[following]
+            elif method == "window":
+                selected = values[np.abs(times - time) <= tolerance]
+                if how == "count":
+                    result[row, column] = selected.size
+                elif selected.size > 0:
+                    result[row, column] = getattr(np, how)(selected)
+    return result
+
+
+@pytest.mark.parametrize("method, tolerance", [("nearest", None), ("nearest", 1.0), ("linear", None),
+                                               ("linear", 4.0)])
+def test_align_interpolation(alignment, series, method, tolerance):
+    grid = alignment.time_grid(-1.0, 25.0, 0.5)
+    aligned = alignment.align(series, grid, method=method, tolerance=tolerance)
+    assert aligned.shape == (4, grid.size)
+    np.testing.assert_allclose(aligned, _brute_force(series, grid, method, tolerance))
+
+
+@pytest.mark.parametrize("how", ["mean", "sum", "count", "min", "max"])
+def test_align_window(alignment, series, how):
+    grid = alignment.time_grid(-1.0, 25.0, 0.5)
+    aligned = alignment.align(series, grid, method="window", tolerance=2.0, how=how)
+    np.testing.assert_allclose(aligned, _brute_force(series, grid, "window", 2.0, how))
+
+
+@pytest.mark.parametrize("method, how", [("nearest", None), ("linear", None), ("window", "mean"),
+                                         ("window", "sum"), ("window", "count"), ("window", "max")])
+def test_align_nan_values(alignment, swotio, method, how):
+    values_list = [np.array([1.0, np.nan, 3.0]), np.array([4.0, 5.0, 6.0]), np.array([np.nan, np.nan])]
+    times_list = [np.array([0.0, 1.0, 2.0]), np.array([0.0, 1.0, 2.0]), np.array([0.0, 1.0])]
+    series = swotio.RaggedArray.from_lists(values_list, times_list)
+    grid = [0.0, 0.9, 2.0]
+    tolerance = 1.0 if method == "window" else None
+    aligned = alignment.align(series, grid, method=method, tolerance=tolerance, how=how or "mean")
+    np.testing.assert_allclose(aligned, _brute_force(series, grid, method, tolerance, how or "mean"))
+    # NaN values of a row affect neither its other samples nor the other rows
+    assert np.all(np.isfinite(aligned[:2]))
+
+
+def test_align_dense(alignment):
+    values = np.array([[1.0, 2.0, np.nan], [4.0, 5.0, 6.0]])
+    aligned = alignment.align(values, [0.0, 1.0, 2.0], times=[0.0, 1.0, 2.0], method="nearest", tolerance=0.0)
+    np.testing.assert_array_equal(aligned, [[1.0, 2.0, np.nan], [4.0, 5.0, 6.0]])
+    times = np.array([[0.0, 1.0, 2.0], [10.0, 11.0, 12.0]])
+    aligned = alignment.align(values, [1.0, 11.0], times=times, method="nearest", tolerance=0.0)
+    np.testing.assert_array_equal(aligned, [[2.0, np.nan], [np.nan, 5.0]])
+
+
+def test_align_datetimes(alignment, swotio):
+    times = alignment.days_since_2000_to_datetime([8000.0, 8001.0, 8002.5])
+    series = swotio.RaggedArray.from_lists([np.array([1.0, 2.0, 3.0])], [times])
+    grid = alignment.time_grid(times[0], times[-1], np.timedelta64(12, "h"))
+    aligned = alignment.align(series, grid, method="linear")
+    np.testing.assert_allclose(aligned, [[1.0, 1.5, 2.0, 7.0 / 3.0, 8.0 / 3.0, 3.0]])
+    aligned = alignment.align(series, grid, method="nearest", tolerance=np.timedelta64(1, "h"))
+    np.testing.assert_array_equal(np.isnan(aligned), [[False, True, False, True, True, False]])
+    with pytest.raises(ValueError):
+        alignment.align(series, [8000.0], method="nearest")
+
+
+def test_align_errors(alignment, series):
+    with pytest.raises(ValueError):
+        alignment.align(np.ones((2, 3)), [0.0])
+    with pytest.raises(ValueError):
+        alignment.align(series, [0.0], method="cubic")
+    with pytest.raises(ValueError):
+        alignment.align(series, [0.0], method="window")
+    with pytest.raises(ValueError):
+        alignment.align(series, [0.0], method="window", tolerance=1.0, how="median")
+
+
+def test_align_results(alignment, make_results):
+    discharge = {("hivdi", "Q"): [[10.0, 20.0, np.nan], [30.0, -1.0, 50.0]],
+                 ("sad", "Qa"): [[1.0, 2.0], [3.0, 4.0]]}
+    times = {"hivdi": [[0.0, 10.0, 20.0], [0.0, 10.0, 20.0]], "sad": [[5.0, 15.0], [5.0, 15.0]]}
+    fname = make_results([11, 21], discharge, times)
+    aligned = alignment.align_results(fname, [0.0, 10.0, 20.0], method="nearest", tolerance=0.0)
+    assert sorted(aligned.keys()) == ["hivdi", "sad"]
+    # Invalid discharge (missing or not strictly positive) is discarded
+    np.testing.assert_array_equal(aligned["hivdi"], [[10.0, 20.0, np.nan], [30.0, np.nan, 50.0]])
+    assert np.all(np.isnan(aligned["sad"]))
+    aligned = alignment.align_results(fname, [10.0], algorithms=["sad"], reach_ids=[21], method="linear")
+    np.testing.assert_allclose(aligned["sad"], [[3.5]])
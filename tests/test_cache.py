@@ -0,0 +1,116 @@
+import importlib
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import PACKAGE_NAME
+
+
+@pytest.fixture
+def cache_module():
+    return importlib.import_module("%s.io.cache" % PACKAGE_NAME)
+
+
+@pytest.fixture
+def cache(cache_module, tmp_path):
+    return cache_module.DiskCache(str(tmp_path / "cache"))
+
+
+def test_get_set(cache):
+    key = cache.key("operation", params={"tolerance": 1.0})
+    assert cache.get(key, "missing") == "missing"
+    cache.set(key, {"values": np.arange(3)})
+    np.testing.assert_array_equal(cache.get(key)["values"], np.arange(3))
+    assert cache.stats["entries"] == 1 and cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+    if hasattr(os, "getuid"):
+        assert os.stat(cache.directory).st_mode & 0o777 == 0o700
+    cache.clear()
+    assert cache.get(key) is None and cache.stats["entries"] == 0
+
+
+def test_memoize(cache, tmp_path):
+    fname = str(tmp_path / "input.txt")
+    with open(fname, "w") as input_file:
+        input_file.write("a")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.memoize("count", compute, files=[fname], params={"level": "reaches"}) == 1
+    assert cache.memoize("count", compute, files=[fname], params={"level": "reaches"}) == 1
+    assert cache.memoize("count", compute, files=[fname], params={"level": "nodes"}) == 2
+
+    # Entries are keyed on the identity of the input files
+    with open(fname, "w") as input_file:
+        input_file.write("ab")
+    assert cache.memoize("count", compute, files=[fname], params={"level": "reaches"}) == 3
+
+
+def test_data_keys(cache_module, cache):
+    dataset = pd.DataFrame({"reach_id": [11, 21], "width": [50.0, 150.0]})
+    key = cache.key("operation", data=[dataset])
+    assert cache.key("operation", data=[dataset.copy()]) == key
+    changed = dataset.copy()
+    changed.loc[1, "width"] = 151.0
+    assert cache.key("operation", data=[changed]) != key
+    assert cache.key("operation", data=[dataset["width"]]) != key
+    array = np.ma.masked_invalid([1.0, np.nan])
+    assert cache_module.data_fingerprint(array) != cache_module.data_fingerprint(np.ma.getdata(array))
+
+
+def test_eviction(cache):
+    payload = b"x" * 1000
+    keys = [cache.key("entry", params={"index": index}) for index in range(4)]
+    for index, key in enumerate(keys):
+        cache.set(key, payload)
+        os.utime(cache.__entry_path__(key), (1000 + index, 1000 + index))
+
+    # The least recently used entries are removed first (a hit marks an entry as used)
+    assert cache.get(keys[0]) == payload
+    cache.max_size = 2500
+    assert [cache.get(key) is not None for key in keys] == [True, False, False, True]
+    assert cache.stats["evictions"] == 2
+    with pytest.raises(ValueError):
+        cache.max_size = -1
+
+
+def test_disabled(cache_module, tmp_path):
+    cache = cache_module.DiskCache(str(tmp_path / "cache"), enabled=False)
+    calls = []
+    assert cache.memoize("operation", lambda: calls.append(1) or len(calls)) == 1
+    assert cache.memoize("operation", lambda: calls.append(1) or len(calls)) == 2
+    cache.set("key", 1)
+    assert not os.path.exists(cache.directory)
+
+
+def test_default_cache(cache_module, monkeypatch, tmp_path):
+    monkeypatch.setattr(cache_module, "_default_cache", cache_module.DiskCache(enabled=False))
+    assert not cache_module.get_cache().enabled
+    cache_module.configure_cache(str(tmp_path / "cache"), max_size=1000)
+    cache = cache_module.get_cache()
+    assert cache.enabled and cache.directory == str(tmp_path / "cache") and cache.max_size == 1000
+    cache_module.configure_cache(enabled=False)
+    assert not cache_module.get_cache().enabled
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="requires os.getuid")
+def test_foreign_entries_ignored(cache, monkeypatch):
+    key = cache.key("operation")
+    cache.set(key, "mine")
+    uid = os.getuid()
+    monkeypatch.setattr(os, "getuid", lambda: uid + 1)
+    assert cache.get(key) is None
+    assert cache.memoize("operation", lambda: "recomputed") == "recomputed"
+
+
+def test_corrupted_entry(cache):
+    key = cache.key("operation")
+    cache.set(key, "value")
+    with open(cache.__entry_path__(key), "wb") as entry_file:
+        entry_file.write(b"not a pickle")
+    assert cache.get(key) is None
+    assert not os.path.exists(cache.__entry_path__(key))
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+
+REACH_ID = np.arange(50) * 10 + 74260000011
+
+
+@pytest.fixture
+def run():
+    """Discharge, times and parameters of a run of 20 time steps on 50 reaches (times differ between reaches)
+    """
+    rng = np.random.default_rng(0)
+    discharge = rng.random((50, 20)) * 100.0 + 1.0
+    discharge[3, 5] = np.nan
+    times = np.sort(rng.random((50, 20)) * 400.0, axis=1) + 8000.0
+    a0 = rng.random(50) * 10.0
+    return discharge, times, a0
+
+
+def _make(make_results, name, discharge, times, a0, reach_id=REACH_ID):
+    return make_results(reach_id, {("hivdi", "Q"): discharge}, {"hivdi": times}, {"hivdi": a0}, name=name)
+
+
+def _pad(array, width):
+    return np.concatenate([array, np.full((array.shape[0], width), np.nan)], axis=1)
+
+
+def test_identical(swotio, make_results, run):
+    old_fname = _make(make_results, "old.nc", *run)
+    comparison = swotio.ResultsComparison(old_fname, old_fname)
+    assert comparison.variables == ["hivdi/Q", "hivdi/A0"]
+    assert comparison.changed_reaches.size == 0
+    assert np.all(comparison.status == "unchanged")
+    np.testing.assert_array_equal(comparison.summary()["n_changed"], [0, 0])
+
+
+def test_time_alignment(swotio, make_results, run):
+    discharge, times, a0 = run
+    old_fname = _make(make_results, "old.nc", discharge, times, a0)
+
+    # 22 time steps, the last two empty: no change
+    new_fname = _make(make_results, "padded.nc", _pad(discharge, 2), _pad(times, 2), a0)
+    assert swotio.ResultsComparison(old_fname, new_fname).changed_reaches.size == 0
+
+    # Time steps in reverse order, one value changed
+    reversed_discharge = _pad(discharge, 2)[:, ::-1].copy()
+    reversed_discharge[7, 10] += 1.0
+    new_fname = _make(make_results, "reversed.nc", reversed_discharge, _pad(times, 2)[:, ::-1], a0)
+    comparison = swotio.ResultsComparison(old_fname, new_fname)
+    np.testing.assert_array_equal(comparison.changed_reaches, [REACH_ID[7]])
+    np.testing.assert_allclose(comparison.deltas.loc[REACH_ID[7], "hivdi_Q_max_abs_delta"], 1.0)
+    np.testing.assert_allclose(comparison.deltas.loc[REACH_ID[7], "hivdi_Q_delta"], 1.0 / 20.0)
+
+    # One more valid time step for a reach
+    extended_discharge, extended_times = _pad(discharge, 1), _pad(times, 1)
+    extended_discharge[9, -1] = 10.0
+    extended_times[9, -1] = 9000.0
+    new_fname = _make(make_results, "extended.nc", extended_discharge, extended_times, a0)
+    np.testing.assert_array_equal(swotio.ResultsComparison(old_fname, new_fname).changed_reaches, [REACH_ID[9]])
+
+
+def test_reaches(swotio, make_results, run):
+    discharge, times, a0 = run
+    old_fname = _make(make_results, "old.nc", discharge, times, a0)
+
+    # Reaches shuffled, first reach removed, one reach added
+    order = np.random.default_rng(1).permutation(np.arange(1, 50))
+    reach_id = np.append(REACH_ID[order], 74269999991)
+    new_a0 = np.append(a0[order], 1.0)
+    new_a0[reach_id == REACH_ID[5]] += 1e-3
+    new_fname = _make(make_results, "new.nc", np.vstack([discharge[order], discharge[:1]]),
+                      np.vstack([times[order], times[:1]]), new_a0, reach_id)
+
+    comparison = swotio.ResultsComparison(old_fname, new_fname, chunk_size=7)
+    np.testing.assert_array_equal(comparison.added_reaches, [74269999991])
+    np.testing.assert_array_equal(comparison.removed_reaches, [REACH_ID[0]])
+    np.testing.assert_array_equal(comparison.changed_reaches, [REACH_ID[5]])
+    assert comparison.status.value_counts().to_dict() == {"unchanged": 48, "changed": 1, "added": 1, "removed": 1}
+
+    # Tolerances
+    assert swotio.ResultsComparison(old_fname, new_fname, atol=1e-2).changed_reaches.size == 0
+    assert swotio.ResultsComparison(old_fname, new_fname, rtol=1.0).changed_reaches.size == 0
+
+
+def test_validity_change(swotio, make_results, run):
+    discharge, times, a0 = run
+    old_fname = _make(make_results, "old.nc", discharge, times, a0)
+    new_discharge = discharge.copy()
+    new_discharge[3, 5] = 50.0
+    new_discharge[4, 0] = np.nan
+    comparison = swotio.ResultsComparison(old_fname, _make(make_results, "new.nc", new_discharge, times, a0))
+    np.testing.assert_array_equal(comparison.changed_reaches, REACH_ID[[3, 4]])
+    np.testing.assert_array_equal(comparison.deltas.loc[REACH_ID[[3, 4]], "hivdi_Q_delta"], [0.0, 0.0])
+
+
+def test_variables(swotio, make_results, run):
+    old_fname = _make(make_results, "old.nc", *run)
+    comparison = swotio.ResultsComparison(old_fname, old_fname, variables=["hivdi/A0"])
+    assert list(comparison.summary().index) == ["hivdi/A0"]
+    with pytest.raises(ValueError):
+        swotio.ResultsComparison(old_fname, old_fname, variables=["hivdi/beta"])
+
+
+def test_outputs(swotio, make_results, run, tmp_path):
+    discharge, times, a0 = run
+    old_fname = _make(make_results, "old.nc", discharge[:3], times[:3], a0[:3], REACH_ID[:3])
+    new_a0 = a0[1:4].copy()
+    new_a0[0] += 1.0
+    new_fname = _make(make_results, "new.nc", discharge[1:4], times[1:4], new_a0, REACH_ID[1:4])
+    for reach_id in REACH_ID[:3]:
+        (tmp_path / ("%i.png" % reach_id)).write_bytes(b"")
+    comparison = swotio.ResultsComparison(old_fname, new_fname)
+
+    pattern = str(tmp_path / "{reach_id}.png")
+    outdated = comparison.outdated_outputs(pattern)
+    np.testing.assert_array_equal(outdated.index, REACH_ID[[1, 3]])
+    assert outdated.iloc[0] == pattern.format(reach_id=REACH_ID[1])
+    obsolete = comparison.obsolete_outputs(pattern)
+    np.testing.assert_array_equal(obsolete.index, REACH_ID[:1])
@@ -0,0 +1,92 @@
+import importlib
+import json
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from conftest import PACKAGE_NAME
+
+
+@pytest.fixture
+def explorer(make_results):
+    import geopandas as gpd
+    import shapely
+
+    explorer_module = importlib.import_module("%s.maps.explorer" % PACKAGE_NAME)
+    fname = make_results([11, 21], {("hivdi", "Q"): [[10.0, 20.0], [30.0, np.nan]]},
+                         {"hivdi": [[0.0, 1.0], [0.0, 1.0]]})
+    dataset = gpd.GeoDataFrame({"reach_id": [11, 21]},
+                               geometry=[shapely.LineString([(0, 0), (1, 1)]), shapely.LineString([(1, 1), (2, 1)])],
+                               crs="epsg:4326")
+    source = explorer_module.ReachTimeseriesSource(fname)
+    explorer = explorer_module.ReachExplorer(dataset, source, tiles="openstreetmap")
+    with explorer:
+        yield explorer
+
+
+@pytest.fixture
+def gages_explorer():
+    import geopandas as gpd
+    import shapely
+
+    explorer_module = importlib.import_module("%s.maps.explorer" % PACKAGE_NAME)
+    dataset = gpd.GeoDataFrame({"usgs_id": ["<01>", "02", "03"]},
+                               geometry=shapely.points([-85.0, -85.001, 2.0], [38.0, 38.0, 48.0]), crs="epsg:4326")
+    explorer = explorer_module.GagesExplorer(dataset, varname_id="usgs_id", tiles="openstreetmap", min_zoom=2,
+                                             max_zoom=4)
+    with explorer:
+        yield explorer
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read()
+
+
+def test_map(explorer):
+    status, body = _get(explorer.url)
+    assert status == 200
+    assert b"reach/" in body
+
+
+def test_reach(explorer):
+    status, body = _get(explorer.url + "reach/11")
+    assert status == 200
+    assert "hivdi" in json.dumps(json.loads(body))
+    assert _get(explorer.url + "reach/99")[0] == 404
+
+
+@pytest.mark.parametrize("text", ["inf", "nan", "-1", "1e30", "11.0", "abc", "%C2%B2"])
+def test_invalid_reach(explorer, text):
+    status, body = _get(explorer.url + "reach/" + text)
+    assert status == 400
+    assert "error" in json.loads(body)
+
+
+def test_gages_map(gages_explorer):
+    status, body = _get(gages_explorer.url)
+    assert status == 200
+    assert b"clusters/" in body
+    assert b"lt;01" not in body and b"<01>" not in body
+
+
+def test_gages_clusters(gages_explorer):
+    counts = []
+    index = 0
+    while True:
+        status, body = _get(gages_explorer.url + "clusters/2/%i" % index)
+        if status != 200:
+            break
+        counts.append(json.loads(body)["count"])
+        index += 1
+    assert status == 404 and sorted(counts) == [1, 2]
+    status, body = _get(gages_explorer.url + "clusters/12/0")
+    assert status == 404
+    status, body = _get(gages_explorer.url + "clusters/2/-1")
+    assert status == 400 and "error" in json.loads(body)
+    assert _get(gages_explorer.url + "clusters/2")[0] == 400
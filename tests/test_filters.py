@@ -0,0 +1,88 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from conftest import FILL_VALUE, PACKAGE_NAME
+
+
+@pytest.fixture
+def filters():
+    return importlib.import_module("%s.io.filters" % PACKAGE_NAME)
+
+
+@pytest.fixture
+def groups(tmp_path):
+    """Open groups 'reaches' and 'model' of a small file (width has a masked value)
+    """
+    import netCDF4 as nc
+
+    dataset = nc.Dataset(str(tmp_path / "filter.nc"), "w")
+    dataset.createDimension("num_reaches", 5)
+    dataset.createDimension("nt", 3)
+    reaches = dataset.createGroup("reaches")
+    model = dataset.createGroup("model")
+    reaches.createVariable("reach_id", "i8", ("num_reaches",))[:] = [74260000011, 74260000021, 74270000011,
+                                                                     74270000021, 74280000011]
+    reaches.createVariable("width", "f8", ("num_reaches",), fill_value=FILL_VALUE)[:] = \
+        np.ma.masked_invalid([50.0, 150.0, 250.0, np.nan, 120.0])
+    reaches.createVariable("n_good_obs", "i4", ("num_reaches",))[:] = [20, 5, 30, 40, 12]
+    reaches.createVariable("wse", "f8", ("num_reaches", "nt"))[:] = np.zeros((5, 3))
+    model.createVariable("mean_q", "f8", ("num_reaches",))[:] = [10.0, 200.0, 300.0, 400.0, 50.0]
+    yield {"": reaches, "model_": model}
+    dataset.close()
+
+
+def test_parse(filters):
+    expression = filters.FilterExpression("width > 100 and n_good_obs > 10 or not model_mean_q < 5")
+    assert expression.names == ["model_mean_q", "n_good_obs", "width"]
+    assert expression.expression == "width > 100 and n_good_obs > 10 or not model_mean_q < 5"
+
+
+@pytest.mark.parametrize("expression", ["width >", "__import__('os')", "width.real > 1", "[width][0] > 1",
+                                        "width if n_good_obs else 0", "lambda: 1"])
+def test_invalid_expressions(filters, expression):
+    with pytest.raises(ValueError):
+        filters.FilterExpression(expression)
+
+
+def test_evaluate(filters):
+    columns = {"width": np.array([50.0, 150.0, 250.0, np.nan]), "n_good_obs": np.array([20, 5, 30, 40])}
+    evaluate = lambda expression: filters.FilterExpression(expression).evaluate(columns)
+    np.testing.assert_array_equal(evaluate("width > 100"), [False, True, True, False])
+    np.testing.assert_array_equal(evaluate("width > 100 and n_good_obs > 10"), [False, False, True, False])
+    np.testing.assert_array_equal(evaluate("width > 100 or not n_good_obs > 10"), [False, True, True, False])
+    np.testing.assert_array_equal(evaluate("100 < width <= 250"), [False, True, True, False])
+    np.testing.assert_array_equal(evaluate("(width > 100) & ~(n_good_obs // 10 == 3)"), [False, True, False, False])
+    np.testing.assert_array_equal(evaluate("-width < -100"), [False, True, True, False])
+
+
+def test_evaluate_errors(filters):
+    with pytest.raises(ValueError):
+        filters.FilterExpression("width + 1").evaluate({"width": np.ones(3)})
+    with pytest.raises(ValueError):
+        filters.FilterExpression("width > 1").evaluate({"n_good_obs": np.ones(3)})
+
+
+def test_apply_filter_expression(filters, groups):
+    selected = filters.apply_filter_expression("width > 100 and model_mean_q > 100", groups, "num_reaches")
+    np.testing.assert_array_equal(selected, [False, True, True, False, False])
+    selected = filters.apply_filter_expression("reach_id // 10000000 == 7426", groups, "num_reaches")
+    np.testing.assert_array_equal(selected, [True, True, False, False, False])
+
+
+def test_apply_filter_expression_mask(filters, groups):
+    mask = np.array([True, False, True, True, True])
+    selected = filters.apply_filter_expression("width > 100", groups, "num_reaches", mask=mask)
+    np.testing.assert_array_equal(selected, [False, False, True, False, True])
+    selected = filters.apply_filter_expression("width > 100", groups, "num_reaches", mask=np.zeros(5, dtype=bool))
+    assert not np.any(selected)
+
+
+def test_apply_filter_expression_errors(filters, groups):
+    with pytest.raises(ValueError):
+        filters.apply_filter_expression("unknown > 1", groups, "num_reaches")
+    with pytest.raises(ValueError):
+        filters.apply_filter_expression("wse > 1", groups, "num_reaches")
+    with pytest.raises(ValueError):
+        filters.apply_filter_expression("1 > 0", groups, "num_reaches")
@@ -0,0 +1,58 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from conftest import PACKAGE_NAME
+
+
+@pytest.fixture
+def gage_clusters():
+    return importlib.import_module("%s.maps.gage_clusters" % PACKAGE_NAME)
+
+
+@pytest.fixture
+def gauges():
+    """Two groups of close gauges and an isolated gauge
+    """
+    lon = np.array([-85.0, -85.001, -85.002, 2.0, 2.001, 150.0])
+    lat = np.array([38.0, 38.001, 38.0, 48.0, 48.001, -30.0])
+    labels = ["<usgs %i>" % index for index in range(lon.size)]
+    return lon, lat, labels
+
+
+def test_grid_clusters(gage_clusters, gauges):
+    lon, lat, _ = gauges
+    clusters = gage_clusters.grid_clusters(lon, lat, 4)
+    order = np.argsort(clusters["lon"])
+    np.testing.assert_array_equal(clusters["count"][order], [3, 2, 1])
+    np.testing.assert_allclose(clusters["lon"][order], [-85.001, 2.0005, 150.0])
+    assert sorted(clusters["members"].tolist()) == list(range(6))
+    assert gage_clusters.grid_clusters(lon, lat, 18)["count"].size == 6
+
+
+def test_members(gage_clusters, gauges):
+    lon, lat, labels = gauges
+    layer = gage_clusters.GageClustersLayer(lon, lat, labels, min_zoom=2, max_zoom=4, max_listed=2,
+                                            members_url="clusters/")
+    clusters = gage_clusters.grid_clusters(lon, lat, 3)
+    index = int(np.argmax(clusters["count"]))
+    assert layer.members(3, index) == {"count": 3, "labels": ["<usgs 0>", "<usgs 1>"]}
+    with pytest.raises(ValueError):
+        layer.members(5, 0)
+    with pytest.raises(ValueError):
+        layer.members(3, clusters["count"].size)
+
+
+@pytest.mark.parametrize("members_url, embed_labels, embedded", [("clusters/", True, False), (None, False, False),
+                                                                 (None, True, True)])
+def test_page(gage_clusters, gauges, members_url, embed_labels, embedded):
+    import folium
+
+    lon, lat, labels = gauges
+    new_map = folium.Map(tiles="openstreetmap")
+    gage_clusters.GageClustersLayer(lon, lat, labels, members_url=members_url,
+                                    embed_labels=embed_labels).add_to(new_map)
+    page = new_map.get_root().render()
+    assert ("\\u0026lt;usgs 5\\u0026gt;" in page) == embedded
+    assert "usgs 5" not in page.replace("\\u0026lt;usgs 5\\u0026gt;", "")
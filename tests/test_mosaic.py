@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+
+NA_REACHES = [74260000011, 74260000021, 81230000011]
+EU_REACHES = [21100000011, 21100000021]
+
+
+@pytest.fixture
+def sos_fnames(make_sos):
+    return [make_sos(NA_REACHES, name="na_sword_v16_SOS_priors.nc"),
+            make_sos(EU_REACHES, width=[500.0, 600.0], name="eu_sword_v16_SOS_priors.nc")]
+
+
+def test_continent_digits(swotio):
+    np.testing.assert_array_equal(swotio.continent_digits(NA_REACHES + EU_REACHES), [7, 7, 8, 2, 2])
+    np.testing.assert_array_equal(swotio.continent_digits(74260000010011, level="nodes"), [7])
+    with pytest.raises(ValueError):
+        swotio.continent_digits(NA_REACHES, level="basins")
+
+
+def test_routing(swotio, sos_fnames, tmp_path):
+    mosaic = swotio.SosMosaic(str(tmp_path / "*_SOS_priors.nc"), verbose=False)
+    assert mosaic.continents == ["eu", "na"]
+    assert mosaic.get_reach(21100000021)["width"].iloc[0] == 600.0
+    assert mosaic.loaded_continents == ["eu"]
+    assert mosaic.get_reach(81230000011)["model_mean_q"].iloc[0] == 140.0
+    with pytest.raises(RuntimeError):
+        mosaic.get_reach(31100000011)
+    with pytest.raises(ValueError):
+        swotio.SosMosaic({"an": sos_fnames[0]})
+
+    # Continents without requested reaches are not opened
+    mosaic = swotio.SosMosaic(sos_fnames, reaches_list=[74260000021], verbose=False)
+    assert mosaic.continents == ["na"]
+    np.testing.assert_array_equal(mosaic.dataset["reach_id"], [74260000021])
+
+
+def test_concurrent_open(swotio, sos_fnames):
+    mosaic = swotio.SosMosaic(sos_fnames, max_workers=2, verbose=False)
+    mosaic.open()
+    assert sorted(mosaic.loaded_continents) == ["eu", "na"]
+    dataset = mosaic.dataset
+    np.testing.assert_array_equal(np.sort(dataset["reach_id"]), np.sort(NA_REACHES + EU_REACHES))
+
+    # Objects loaded in worker processes can read the file again
+    continent = mosaic.get_continent("eu")
+    np.testing.assert_array_equal(continent.get_nc_variable("width", "reaches")[:], [500.0, 600.0])
+
+
+def test_summarize(swotio, sos_fnames):
+    mosaic = swotio.SosMosaic(sos_fnames, verbose=False)
+    summary = mosaic.summarize(lambda dataset: dataset[["width"]].max())
+    assert summary.loc[("eu", "width")] == 600.0 and summary.loc[("na", "width")] == 70.0
+    assert mosaic.loaded_continents == []
+    list(mosaic.iter_continents(keep=True))
+    assert sorted(mosaic.loaded_continents) == ["eu", "na"]
+    mosaic.close()
+    assert mosaic.loaded_continents == []
+
+
+def test_results(swotio, make_results):
+    discharge = {("hivdi", "Q"): [[1.0, 2.0, np.nan], [np.nan, np.nan, np.nan], [3.0, 5.0, 4.0]]}
+    fnames = [make_results(NA_REACHES, discharge, {"hivdi": [0.0, 1.0, 2.0]}, name="na_results.nc"),
+              make_results(EU_REACHES, {("hivdi", "Q"): [[10.0], [20.0]]}, name="eu_results.nc")]
+    mosaic = swotio.SosMosaic(fnames, loader=swotio.ResultsNetCDF, max_workers=2)
+    mosaic.open()
+    dataset = mosaic.dataset.set_index("reach_id")
+    np.testing.assert_array_equal(dataset.loc[NA_REACHES, "hivdi_n_valid"], [2, 0, 3])
+    np.testing.assert_allclose(dataset.loc[EU_REACHES, "hivdi_mean"], [10.0, 20.0])
+    assert mosaic.get_reach(81230000011)["hivdi_max"].iloc[0] == 5.0
+
+    results = swotio.ResultsNetCDF(fnames[0], reaches_list=[81230000011, 74260000011])
+    np.testing.assert_array_equal(results.dataset["reach_id"], [74260000011, 81230000011])
+    discharge = results.discharge("hivdi")
+    np.testing.assert_array_equal(discharge.ids, [74260000011, 81230000011])
+    np.testing.assert_array_equal(discharge.reduce("sum"), [3.0, 12.0])
+    with pytest.raises(RuntimeError):
+        results.get_reach(74260000021)
+    with pytest.raises(ValueError):
+        swotio.ResultsNetCDF(fnames[0], level="nodes")
@@ -0,0 +1,146 @@
+import importlib
+import os
+
+import numpy as np
+import pytest
+
+from conftest import PACKAGE_NAME
+
+
+@pytest.fixture
+def pool_module():
+    return importlib.import_module("%s.io.pool" % PACKAGE_NAME)
+
+
+@pytest.fixture
+def shared_pool(pool_module):
+    """Shared pool with a cap of 4 handles (the default cap is restored afterwards)
+    """
+    pool = pool_module.get_pool()
+    pool.close_all()
+    max_handles = pool.max_handles
+    pool.max_handles = 4
+    yield pool
+    pool.max_handles = max_handles
+
+
+def _refcount(pool, fname):
+    return pool._handles[os.path.abspath(fname)][1] if os.path.abspath(fname) in pool._handles else 0
+
+
+def test_lru_eviction(pool_module, make_results):
+    pool = pool_module.NetCDFHandlePool(max_handles=2)
+    fnames = [make_results([11], {("hivdi", "Q"): [[1.0]]}, name="%i.nc" % index) for index in range(3)]
+    for fname in fnames[:2]:
+        with pool.dataset(fname):
+            pass
+    with pool.dataset(fnames[0]):
+        pass
+    with pool.dataset(fnames[2]):
+        pass
+    assert pool.stats == {"open_handles": 2, "hits": 1, "misses": 3, "evictions": 1}
+    assert os.path.abspath(fnames[1]) not in pool._handles
+    with pytest.raises(ValueError):
+        pool.max_handles = 0
+    pool.max_handles = 1
+    assert list(pool._handles.keys()) == [os.path.abspath(fnames[2])]
+    pool.close_all()
+
+
+def test_refcount(pool_module, make_results):
+    pool = pool_module.NetCDFHandlePool(max_handles=1)
+    fnames = [make_results([11], {("hivdi", "Q"): [[1.0]]}, name="%i.nc" % index) for index in range(3)]
+
+    # Handles in use are not evicted, the cap is restored once they are released
+    first = pool.acquire(fnames[0])
+    assert pool.acquire(fnames[0]) is first
+    second = pool.acquire(fnames[1])
+    assert pool.open_handles == 2 and first.isopen() and second.isopen()
+    assert _refcount(pool, fnames[0]) == 2
+    pool.release(fnames[0])
+    assert pool.open_handles == 2
+    pool.release(fnames[0])
+    assert pool.open_handles == 1 and not first.isopen()
+    pool.release(fnames[1])
+    pool.release(fnames[1])
+    assert _refcount(pool, fnames[1]) == 0
+    pool.close_all()
+    assert pool.open_handles == 0
+
+
+def test_discard(pool_module, make_results):
+    pool = pool_module.NetCDFHandlePool()
+    fname = make_results([11], {("hivdi", "Q"): [[1.0]]})
+    dataset = pool.acquire(fname)
+    with pytest.raises(RuntimeError):
+        pool.discard(fname)
+    pool.close_all()
+    assert dataset.isopen()
+    pool.release(fname)
+    pool.discard(fname)
+    assert not dataset.isopen() and pool.open_handles == 0
+    pool.discard(fname)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+def test_reset_after_fork(pool_module, make_results):
+    pool = pool_module.get_pool()
+    fname = make_results([11], {("hivdi", "Q"): [[1.0]]})
+    dataset = pool.acquire(fname)
+    pid = os.fork()
+    if pid == 0:
+        # Child process: the inherited handles are dropped and the file is opened again
+        status = 1
+        try:
+            if pool.open_handles == 0 and pool.acquire(fname) is not dataset and pool.open_handles == 1:
+                status = 0
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert pool.open_handles == 1 and dataset.isopen()
+    pool.release(fname)
+
+
+def test_check_process(pool_module, make_results):
+    pool = pool_module.NetCDFHandlePool()
+    fname = make_results([11], {("hivdi", "Q"): [[1.0]]})
+    dataset = pool.acquire(fname)
+    pool._pid = -1
+    assert pool.acquire(fname) is not dataset
+    assert pool.stats["misses"] == 2 and pool.open_handles == 1
+    dataset.close()
+    pool.release(fname)
+    pool.close_all()
+
+
+def test_loaders_release_on_failure(swotio, shared_pool, make_sos, make_sword):
+    sos_fname = make_sos([11, 21])
+    with pytest.raises(ValueError):
+        swotio.SosNetCDF(sos_fname, filter_expr="unknown > 1", verbose=False)
+    assert _refcount(shared_pool, sos_fname) == 0
+    with pytest.raises(KeyError):
+        swotio.SosNetCDF(sos_fname, level="nodes", verbose=False)
+    assert _refcount(shared_pool, sos_fname) == 0
+
+    sword_fname = make_sword([11, 21])
+    with pytest.raises(KeyError):
+        swotio.SwordNetCDF(sword_fname, "nodes")
+    assert _refcount(shared_pool, sword_fname) == 0
+    shared_pool.discard(sos_fname)
+    shared_pool.discard(sword_fname)
+
+
+def test_cap_across_loaders(swotio, shared_pool, make_sos):
+    evictions = shared_pool.stats["evictions"]
+    loaders = [swotio.SosNetCDF(make_sos([11, 21], name="sos_%i.nc" % index), verbose=False)
+               for index in range(10)]
+    assert shared_pool.open_handles <= 4
+    assert shared_pool.stats["evictions"] - evictions >= 6
+
+    # The handle is acquired again for direct accesses
+    np.testing.assert_array_equal(loaders[0].get_nc_variable("width", "reaches")[:], [50.0, 60.0])
+    np.testing.assert_array_equal(loaders[0].get_nc_variable("logA0", ["gbpriors", "reach"])[:],
+                                  np.log([50.0, 60.0]))
+    assert shared_pool.open_handles <= 4
+    assert all(entry[1] == 0 for entry in shared_pool._handles.values())
@@ -0,0 +1,56 @@
+import logging
+
+import numpy as np
+import pytest
+
+from conftest import FILL_VALUE
+
+
+@pytest.fixture
+def node_group(tmp_path):
+    """Open group 'node' with the quality variables of the default node filter, except dark_frac
+    """
+    import netCDF4 as nc
+
+    dataset = nc.Dataset(str(tmp_path / "quality.nc"), "w")
+    dataset.createDimension("nx", 4)
+    dataset.createDimension("nt", 3)
+    group = dataset.createGroup("node")
+    group.createVariable("node_q", "i4", ("nx", "nt"), fill_value=-999)[:] = \
+        np.ma.masked_equal([[0, 1, 2], [3, 0, -999], [0, 0, 0], [1, 1, 1]], -999)
+    for varname in ["xovr_cal_q", "ice_clim_f", "ice_dyn_f"]:
+        group.createVariable(varname, "i4", ("nx", "nt"))[:] = np.zeros((4, 3))
+    group.createVariable("wse", "f8", ("nx", "nt"), fill_value=FILL_VALUE)[:] = np.ones((4, 3))
+    yield group
+    dataset.close()
+
+
+def test_rules(swotio):
+    with pytest.raises(ValueError):
+        swotio.QualityFilter({"reach_q": ("<>", 1)})
+    with pytest.raises(ValueError):
+        swotio.QualityFilter.default("basin")
+    assert swotio.QualityFilter.default("node").variables[0] == "node_q"
+
+
+def test_evaluate(swotio, node_group):
+    quality_filter = swotio.QualityFilter({"node_q": ("<=", 1), "ice_clim_f": ("in", [0, 2])})
+    expected = [[True, True, False], [False, True, False], [True, True, True], [True, True, True]]
+    np.testing.assert_array_equal(quality_filter.evaluate(node_group), expected)
+    np.testing.assert_array_equal(quality_filter.evaluate(node_group, slice(1, 3)), expected[1:3])
+    assert swotio.QualityFilter({"unknown": ("==", 0)}).evaluate(node_group) is None
+
+
+def test_missing_variable_warned_once(swotio, node_group, caplog):
+    quality_filter = swotio.QualityFilter.default("node")
+    with caplog.at_level(logging.WARNING, logger="swotviz"):
+        for start in range(0, 4):
+            quality_filter.evaluate(node_group, slice(start, start + 1))
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages == ["Quality variable dark_frac not found, rule ignored"]
+
+    # Another filter warns again
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="swotviz"):
+        swotio.QualityFilter.default("node").evaluate(node_group)
+    assert len(caplog.records) == 1
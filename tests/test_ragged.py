@@ -0,0 +1,82 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from conftest import PACKAGE_NAME
+
+
+REDUCTIONS = {"count": lambda values: values.size,
+              "sum": np.sum,
+              "mean": np.mean,
+              "std": np.std,
+              "min": np.min,
+              "max": np.max,
+              "first": lambda values: values[0],
+              "last": lambda values: values[-1]}
+
+
+@pytest.fixture
+def values_list():
+    """Rows with NaN values, an empty row and a row without valid values
+    """
+    rng = np.random.default_rng(0)
+    values_list = [rng.random(size) * 100.0 - 20.0 for size in [6, 1, 0, 3, 9, 4]]
+    values_list[0][[0, 4]] = np.nan
+    values_list[3][:] = np.nan
+    values_list[4][-1] = np.nan
+    return values_list
+
+
+def _expected(values_list, how):
+    expected = []
+    for values in values_list:
+        valid = values[np.isfinite(values)]
+        if how == "count":
+            expected.append(valid.size)
+        else:
+            expected.append(REDUCTIONS[how](valid) if valid.size > 0 else np.nan)
+    return np.array(expected)
+
+
+@pytest.mark.parametrize("how", sorted(REDUCTIONS.keys()))
+def test_reduce(swotio, values_list, how):
+    ragged = swotio.RaggedArray.from_lists(values_list)
+    reduced = ragged.reduce(how)
+    assert reduced.shape == (len(values_list),)
+    np.testing.assert_allclose(reduced, _expected(values_list, how))
+    if how == "count":
+        assert reduced.dtype == np.int64
+
+
+def test_reduce_shortcuts(swotio, values_list):
+    ragged = swotio.RaggedArray.from_lists(values_list)
+    np.testing.assert_array_equal(ragged.count(), ragged.reduce("count"))
+    np.testing.assert_array_equal(ragged.mean(), ragged.reduce("mean"))
+    np.testing.assert_array_equal(ragged.min(), ragged.reduce("min"))
+    np.testing.assert_array_equal(ragged.max(), ragged.reduce("max"))
+
+
+def test_reduce_empty(swotio):
+    ragged = swotio.RaggedArray.from_lists([])
+    assert ragged.reduce("sum").shape == (0,)
+    ragged = swotio.RaggedArray.from_lists([np.zeros(0), np.zeros(0)])
+    np.testing.assert_array_equal(ragged.reduce("count"), [0, 0])
+    np.testing.assert_array_equal(ragged.reduce("sum"), [np.nan, np.nan])
+    np.testing.assert_array_equal(ragged.reduce("max"), [np.nan, np.nan])
+
+
+def test_reduce_unknown(swotio, values_list):
+    with pytest.raises(ValueError):
+        swotio.RaggedArray.from_lists(values_list).reduce("median")
+
+
+def test_reduce_discharge(make_results):
+    results_summary = importlib.import_module("%s.io.results_summary" % PACKAGE_NAME)
+    discharge = np.array([[10.0, np.nan, 30.0], [np.nan, np.nan, np.nan], [-1.0, 5.0, 7.0]])
+    fname = make_results([11, 21, 31], {("hivdi", "Q"): discharge}, {"hivdi": [0.0, 1.0, 2.0]})
+    ragged = results_summary.read_discharge(fname, "hivdi")
+    np.testing.assert_array_equal(ragged.ids, [11, 21, 31])
+    np.testing.assert_array_equal(ragged.reduce("count"), [2, 0, 2])
+    np.testing.assert_array_equal(ragged.reduce("sum"), [40.0, np.nan, 12.0])
+    np.testing.assert_array_equal(ragged.reduce("first"), [10.0, np.nan, 5.0])
@@ -0,0 +1,98 @@
+import importlib
+import os
+
+import numpy as np
+import pytest
+
+from conftest import PACKAGE_NAME
+
+
+@pytest.fixture
+def sidecar_fname():
+    return importlib.import_module("%s.io.results_summary" % PACKAGE_NAME).default_sidecar_fname
+
+
+@pytest.fixture
+def discharge():
+    rng = np.random.default_rng(0)
+    hivdi = rng.random((7, 9)) * 100.0 + 1.0
+    hivdi[0] = np.nan
+    hivdi[1, :4] = np.nan
+    hivdi[2, 3] = -5.0
+    sad = rng.random((7, 4)) * 10.0 + 1.0
+    sad[3] = 0.0
+    return {("hivdi", "Q"): hivdi, ("sad", "Qa"): sad}
+
+
+@pytest.fixture
+def results_fname(make_results, discharge):
+    return make_results(np.arange(7) * 10 + 74260000011, discharge)
+
+
+def test_build_round_trip(swotio, sidecar_fname, results_fname, discharge):
+    summary = swotio.ResultsSummary.build(results_fname, percentiles=(2.5, 50, 97.5), chunk_size=3)
+    assert os.path.isfile(sidecar_fname(results_fname))
+    assert sorted(summary.algorithms) == ["hivdi", "sad"]
+
+    # Reloading the sidecar file gives the same table
+    reloaded = swotio.ResultsSummary(sidecar_fname(results_fname))
+    assert list(reloaded.dataset.columns) == list(summary.dataset.columns)
+    np.testing.assert_array_equal(reloaded.dataset.index, np.arange(7) * 10 + 74260000011)
+    np.testing.assert_array_equal(reloaded.dataset.to_numpy(), summary.dataset.to_numpy())
+
+    # Statistics of the valid values (finite and strictly positive)
+    for (algorithm, _), values in discharge.items():
+        for row in range(values.shape[0]):
+            valid = values[row][np.isfinite(values[row]) & (values[row] > 0)]
+            statistics = reloaded.dataset.iloc[row]
+            assert statistics["%s_n_valid" % algorithm] == valid.size
+            assert statistics["%s_available" % algorithm] == int(valid.size > 0)
+            if valid.size == 0:
+                assert np.isnan(statistics["%s_mean" % algorithm])
+                assert np.isnan(statistics["%s_p2_5" % algorithm])
+                continue
+            np.testing.assert_allclose(statistics["%s_mean" % algorithm], valid.mean(), rtol=1e-6)
+            np.testing.assert_allclose(statistics["%s_min" % algorithm], valid.min(), rtol=1e-6)
+            np.testing.assert_allclose(statistics["%s_max" % algorithm], valid.max(), rtol=1e-6)
+            for percentile, name in [(2.5, "p2_5"), (50, "p50"), (97.5, "p97_5")]:
+                np.testing.assert_allclose(statistics["%s_%s" % (algorithm, name)],
+                                           np.percentile(valid, percentile), rtol=1e-6)
+
+
+def test_build_chunk_size(swotio, tmp_path, results_fname):
+    first = swotio.ResultsSummary.build(results_fname, str(tmp_path / "first.nc"), chunk_size=2)
+    second = swotio.ResultsSummary.build(results_fname, str(tmp_path / "second.nc"), chunk_size=100)
+    np.testing.assert_array_equal(first.dataset.to_numpy(), second.dataset.to_numpy())
+
+
+def test_build_duplicated_percentiles(swotio, results_fname):
+    with pytest.raises(ValueError):
+        swotio.ResultsSummary.build(results_fname, percentiles=(2.5, 2.5))
+
+
+def test_availability(swotio, results_fname):
+    summary = swotio.ResultsSummary.build(results_fname, algorithms={"hivdi": "Q"})
+    assert summary.algorithms == ["hivdi"]
+    availability = summary.availability()
+    np.testing.assert_array_equal(availability["hivdi"], [0, 1, 1, 1, 1, 1, 1])
+    np.testing.assert_array_equal(availability["n_algorithms"], availability["hivdi"])
+    np.testing.assert_array_equal(summary.get_statistic("n_valid")["hivdi"], [0, 5, 8, 9, 9, 9, 9])
+
+
+def test_open_stale(swotio, sidecar_fname, make_results, results_fname, discharge):
+    summary = swotio.ResultsSummary.open(results_fname)
+    assert not summary.is_stale()
+    sidecar_mtime = os.stat(sidecar_fname(results_fname)).st_mtime_ns
+
+    # Up to date: the sidecar file is reused
+    assert not swotio.ResultsSummary.open(results_fname).is_stale()
+    assert os.stat(sidecar_fname(results_fname)).st_mtime_ns == sidecar_mtime
+
+    # Results file rewritten with one more time step: the sidecar file is rebuilt
+    swotio.get_pool().close_all()
+    hivdi = np.concatenate([discharge[("hivdi", "Q")], np.full((7, 1), 1000.0)], axis=1)
+    make_results(np.arange(7) * 10 + 74260000011, {("hivdi", "Q"): hivdi, ("sad", "Qa"): discharge[("sad", "Qa")]})
+    assert summary.is_stale()
+    rebuilt = swotio.ResultsSummary.open(results_fname)
+    assert not rebuilt.is_stale()
+    np.testing.assert_array_equal(rebuilt.get_statistic("max")["hivdi"].iloc[1:], 1000.0)
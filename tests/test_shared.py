@@ -0,0 +1,85 @@
+import importlib
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import PACKAGE_NAME
+
+
+@pytest.fixture
+def shared():
+    return importlib.import_module("%s.io.shared" % PACKAGE_NAME)
+
+
+@pytest.fixture
+def dataset():
+    """Dataset with unsorted reach identifiers, a nullable column and a non numeric column
+    """
+    return pd.DataFrame({"reach_id": np.array([74260000031, 74260000011, 74260000021], dtype=np.int64),
+                         "width": [150.0, 50.0, 250.0],
+                         "n_good_obs": pd.array([3, None, 7], dtype="Int64"),
+                         "river_name": ["a", "b", "c"]})
+
+
+def _worker(handle, reach_id, queue):
+    module = importlib.import_module("%s.io.shared" % PACKAGE_NAME)
+    with module.SharedDataset.attach(handle) as attached:
+        queue.put(float(attached.get_reach(reach_id)["width"]))
+
+
+@pytest.mark.parametrize("backend", ["shm", "memmap"])
+def test_publish_attach(shared, dataset, tmp_path, backend):
+    path = str(tmp_path / "dataset.bin") if backend == "memmap" else None
+    published = shared.SharedDataset.publish(dataset, path=path)
+    try:
+        assert published.handle["backend"] == backend
+        assert published.columns == ["reach_id", "width", "n_good_obs"]
+        with shared.SharedDataset.attach(published.handle) as attached:
+            np.testing.assert_array_equal(attached["width"], dataset["width"])
+            np.testing.assert_array_equal(attached.indices([74260000021, 1, 74260000031]), [2, -1, 0])
+            reach = attached.get_reach(74260000011)
+            assert reach["width"] == 50.0 and np.isnan(reach["n_good_obs"])
+            with pytest.raises(RuntimeError):
+                attached.get_reach(1)
+            with pytest.raises(ValueError):
+                attached["width"][0] = 0.0
+            pd.testing.assert_frame_equal(attached.to_dataframe(["reach_id", "width"]), dataset[["reach_id", "width"]])
+            with pytest.raises(RuntimeError):
+                attached.unlink()
+
+        # Attach from another process
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        process = context.Process(target=_worker, args=(published.handle, 74260000021, queue))
+        process.start()
+        assert queue.get(timeout=60) == 250.0
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    finally:
+        published.unlink()
+    if backend == "memmap":
+        assert not (tmp_path / "dataset.bin").exists()
+
+
+def test_publish_columns(shared, dataset):
+    published = shared.SharedDataset.publish(dataset, columns=["reach_id", "n_good_obs"])
+    try:
+        np.testing.assert_array_equal(published["n_good_obs"], [3.0, np.nan, 7.0])
+        assert published["n_good_obs"].dtype == np.float64
+        assert all(offset % 64 == 0 for _, _, offset, _ in published.handle["layout"])
+    finally:
+        published.unlink()
+    with pytest.raises(ValueError):
+        shared.SharedDataset.publish(dataset, columns=["reach_id", "river_name"])
+    with pytest.raises(ValueError):
+        shared.SharedDataset.publish(dataset.astype({"river_name": "category"}), columns=["reach_id", "river_name"])
+    with pytest.raises(ValueError):
+        shared.SharedDataset.publish(dataset, columns=["width"])
+    published = shared.SharedDataset.publish(dataset, columns=["width"], index=None)
+    try:
+        with pytest.raises(RuntimeError):
+            published.indices(74260000011)
+    finally:
+        published.unlink()
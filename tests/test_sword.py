@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def sword_fname(tmp_path):
+    """SWORD file with 3 reaches of 2 nodes each and their centerlines
+    """
+    import netCDF4 as nc
+
+    fname = str(tmp_path / "sword.nc")
+    with nc.Dataset(fname, "w") as dataset:
+        dataset.createDimension("num_reaches", 3)
+        dataset.createDimension("num_nodes", 6)
+        dataset.createDimension("num_points", 9)
+        dataset.createDimension("two", 2)
+        reaches = dataset.createGroup("reaches")
+        reaches.createVariable("reach_id", "i8", ("num_reaches",))[:] = [74260000011, 74260000021, 74270000011]
+        reaches.createVariable("width", "f8", ("num_reaches",))[:] = [50.0, 150.0, 250.0]
+        reaches.createVariable("cl_ids", "i8", ("two", "num_reaches"))[:] = [[0, 3, 6], [2, 5, 8]]
+        nodes = dataset.createGroup("nodes")
+        nodes.createVariable("node_id", "i8", ("num_nodes",))[:] = np.arange(6) + 74260000010011
+        nodes.createVariable("reach_id", "i8", ("num_nodes",))[:] = np.repeat([74260000011, 74260000021,
+                                                                               74270000011], 2)
+        nodes.createVariable("width", "f8", ("num_nodes",))[:] = [40.0, 60.0, 140.0, 160.0, 240.0, 260.0]
+        nodes.createVariable("cl_ids", "i8", ("two", "num_nodes"))[:] = [[0, 1, 3, 4, 6, 7], [1, 2, 4, 5, 7, 8]]
+        centerlines = dataset.createGroup("centerlines")
+        centerlines.createVariable("cl_id", "i8", ("num_points",))[:] = np.arange(9)
+        centerlines.createVariable("x", "f8", ("num_points",))[:] = np.arange(9) * 0.01 - 85.0
+        centerlines.createVariable("y", "f8", ("num_points",))[:] = np.full(9, 38.0)
+    return fname
+
+
+@pytest.mark.parametrize("level, expected", [("reaches", [74260000021, 74270000011]),
+                                             ("nodes", [74260000021, 74260000021, 74270000011, 74270000011])])
+def test_filter_expression(swotio, sword_fname, level, expected):
+    sword = swotio.SwordNetCDF(sword_fname, level, filter_expr="width > 100", load_geometry=True)
+    np.testing.assert_array_equal(sword.dataset["reach_id"], expected)
+    assert np.all(sword.dataset["width"] > 100)
+    assert sword.dataset.geometry.iloc[0].coords[0] == (-85.0 + 0.03, 38.0)
+
+
+def test_filter_expression_reaches_list(swotio, sword_fname):
+    sword = swotio.SwordNetCDF(sword_fname, "nodes", reaches_list=[74260000011, 74260000021],
+                               filter_expr="width < 150")
+    np.testing.assert_array_equal(sword.dataset["width"], [40.0, 60.0, 140.0])
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+
+# Network: 11 and 21 flow into 31, 31 into 41, 41 bifurcates into 51 and 61
+REACH_ID = [11, 21, 31, 41, 51, 61]
+RCH_ID_DN = [[31, 31, 41, 51, 0, 0],
+             [0, 0, 0, 61, 0, 0],
+             [0, 0, 0, 0, 0, 0],
+             [0, 0, 0, 0, 0, 0]]
+RCH_ID_UP = [[0, 0, 11, 31, 41, 41],
+             [0, 0, 21, 0, 0, 0],
+             [0, 0, 0, 0, 0, 0],
+             [0, 0, 0, 0, 0, 0]]
+DIST_OUT = [5000.0, 5000.0, 4000.0, 3000.0, 2000.0, 2000.0]
+
+
+@pytest.fixture
+def topology(swotio, make_sword):
+    return swotio.SwordTopology.from_netcdf(make_sword(REACH_ID, RCH_ID_UP, RCH_ID_DN, DIST_OUT))
+
+
+def test_from_netcdf(topology):
+    assert topology.num_reaches == 6
+    assert topology.num_edges == 5
+    np.testing.assert_array_equal(topology.reach_id, REACH_ID)
+    np.testing.assert_array_equal(topology.dist_out, DIST_OUT)
+
+
+@pytest.mark.parametrize("direction", ["up", "dn"])
+def test_single_direction(swotio, make_sword, topology, direction):
+    if direction == "up":
+        fname = make_sword(REACH_ID, rch_id_up=RCH_ID_UP, name="up.nc")
+    else:
+        fname = make_sword(REACH_ID, rch_id_dn=RCH_ID_DN, name="dn.nc")
+    single = swotio.SwordTopology.from_netcdf(fname)
+    for expected, actual in zip(topology.downstream_csr + topology.upstream_csr,
+                                single.downstream_csr + single.upstream_csr):
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_indices(topology):
+    np.testing.assert_array_equal(topology.indices([41, 11]), [3, 0])
+    np.testing.assert_array_equal(topology.indices([41, 99], missing="ignore"), [3, -1])
+    with pytest.raises(RuntimeError):
+        topology.indices([99])
+
+
+def test_upstream_downstream_reaches(topology):
+    np.testing.assert_array_equal(topology.upstream_reaches(41), [11, 21, 31, 41])
+    np.testing.assert_array_equal(topology.upstream_reaches(41, include_self=False), [11, 21, 31])
+    np.testing.assert_array_equal(topology.downstream_reaches(21), [21, 31, 41, 51, 61])
+    np.testing.assert_array_equal(topology.downstream_reaches([51, 61]), [51, 61])
+
+
+def test_main_stem_path(topology):
+    np.testing.assert_array_equal(topology.main_stem_path(11, 51), [11, 31, 41, 51])
+    np.testing.assert_array_equal(topology.main_stem_path(51, 11), [11, 31, 41, 51])
+    with pytest.raises(RuntimeError):
+        topology.main_stem_path(11, 21)
+
+
+def test_topological_levels(topology):
+    levels = [list(level) for level in topology.topological_levels()]
+    assert levels == [[0, 1], [2], [3], [4, 5]]
+
+
+def test_accumulate(topology):
+    np.testing.assert_allclose(topology.accumulate(np.ones(6)), [1, 1, 3, 4, 3, 3])
+    np.testing.assert_allclose(topology.accumulate(np.ones(6), split="all"), [1, 1, 3, 4, 5, 5])
+    with pytest.raises(ValueError):
+        topology.accumulate(np.ones(5))
+
+
+def test_accumulate_cycle(swotio):
+    # 11 -> 21 -> 31 -> 21: the cycle is not propagated
+    topology = swotio.SwordTopology([11, 21, 31], rch_id_dn=[[21, 31, 21]])
+    accumulated = topology.accumulate(np.ones(3))
+    assert accumulated[0] == 1
+    assert len(np.concatenate(topology.topological_levels())) == 1